@@ -7,6 +7,7 @@ and search capabilities.
 """
 
 from django.contrib import admin
+from . import search
 from .models import Asset
 
 
@@ -18,9 +19,17 @@ class AssetAdmin(admin.ModelAdmin):
     """
     list_display = ('name', 'asset_type', 'owner', 'project', 'is_rendered', 'created_at')
     list_filter = ('asset_type', 'is_rendered', 'created_at')  # Allows filtering by these fields
-    search_fields = ('name', 'owner__username', 'project__name')  # Enables search on these fields
+    # Enables search on these fields; names, descriptions and comments are searched
+    # through the full-text index (see get_search_results)
+    search_fields = ('owner__username', 'project__name')
     date_hierarchy = 'created_at'  # Adds navigation by upload date
     ordering = ('-created_at',)  # Orders assets by upload date (descending)
 
     # Ensures users can view inline metadata for debugging/render tracking
     readonly_fields = ('rendered_image', 'thumbnail', 'categories', 'ai_enhanced')
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return results, may_have_duplicates
+        return results | search.filter_queryset(queryset, search_term), may_have_duplicates
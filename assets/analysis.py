@@ -0,0 +1,219 @@
+""" Batched, vectorized content analysis of image assets.
+
+Images are decoded straight to small ANALYSIS_SIZE x ANALYSIS_SIZE RGB
+arrays (JPEGs in draft mode, so only a fraction of the DCT is decoded), in
+a process pool for the analyze_assets command and in the worker process
+itself for Celery tasks, which Celery already runs one per core. The features of a whole batch are then computed at once
+with NumPy on one (N, size, size, 3) array:
+
+- brightness and contrast: mean and standard deviation of the luminance
+- saturation: mean HSV saturation
+- histogram: joint RGB histogram, HISTOGRAM_BINS levels per channel
+- dominant_colors: centres of the most populated histogram bins
+- orientation: landscape / portrait / square, from the source size
+- embedding: unit vector of the histogram, a coarse colour layout and a
+  coarse texture map, compared by cosine similarity (see embeddings.py)
+
+and written back with one bulk_update; embeddings are appended to the
+project's vector store. Non-image assets only get their type as category.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from stratopipe import response_cache
+from versions.models import Version
+from versions.storage import blob_storage
+
+from . import embeddings
+from .models import Asset
+
+# Edge of the arrays features are computed on, in pixels
+ANALYSIS_SIZE = 64
+# Levels per channel of the colour histogram (HISTOGRAM_BINS ** 3 bins)
+HISTOGRAM_BINS = 4
+DOMINANT_COLORS = 3
+# Cells per side of the colour layout and texture parts of the embedding
+EMBEDDING_GRID = 4
+EMBEDDING_DIM = HISTOGRAM_BINS ** 3 + EMBEDDING_GRID ** 2 * 4
+# Default number of assets per analyze_assets_batch task
+BATCH_SIZE = 500
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def decode(source_path, size=ANALYSIS_SIZE):
+    """
+    Return (width, height, uint8 array of shape (size, size, 3)) for an
+    image, or None if it cannot be read. Runs in pool workers.
+    """
+    try:
+        with Image.open(source_path) as img:
+            img.draft('RGB', (size * 2, size * 2))
+            img = ImageOps.exif_transpose(img)
+            # Source size, up to the draft scale: only the ratio is used
+            width, height = img.size
+            pixels = img.convert('RGB').resize((size, size), Image.BILINEAR, reducing_gap=2.0)
+            return width, height, np.asarray(pixels, dtype=np.uint8)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _grid_means(values, grid):
+    n, h, w = values.shape[:3]
+    return values.reshape(n, grid, h // grid, grid, w // grid, *values.shape[3:]).mean(axis=(2, 4)).reshape(n, -1)
+
+
+def features(pixels, sizes):
+    """
+    Compute the features of a batch: pixels is a (N, H, W, 3) uint8 array,
+    sizes a (N, 2) array of source (width, height). Returns a dict of
+    arrays, one row per image.
+    """
+    n = len(pixels)
+    flat = pixels.reshape(n, -1, 3)
+    rgb = flat.astype(np.float32) / 255
+
+    luma = rgb @ _LUMA
+    high, low = rgb.max(axis=2), rgb.min(axis=2)
+    saturation = np.divide(high - low, high, out=np.zeros_like(high), where=high > 0)
+
+    # Joint histogram of all images in one bincount, offsetting each image's bins
+    levels = (flat // (256 // HISTOGRAM_BINS)).astype(np.int64)
+    bins = (levels[..., 0] * HISTOGRAM_BINS + levels[..., 1]) * HISTOGRAM_BINS + levels[..., 2]
+    nbins = HISTOGRAM_BINS ** 3
+    counts = np.bincount((bins + np.arange(n)[:, None] * nbins).ravel(), minlength=n * nbins)
+    histogram = counts.reshape(n, nbins) / flat.shape[1]
+
+    top = np.argsort(-histogram, axis=1, kind='stable')[:, :DOMINANT_COLORS]
+    step = 256 // HISTOGRAM_BINS
+    centres = np.stack([top // HISTOGRAM_BINS ** 2, top // HISTOGRAM_BINS % HISTOGRAM_BINS, top % HISTOGRAM_BINS],
+                       axis=-1) * step + step // 2
+
+    # Embedding: each part normalized, so none dominates the cosine similarity
+    grey = luma.reshape(pixels.shape[:3])
+    texture = (np.abs(np.diff(grey, axis=1, append=grey[:, -1:])) +
+               np.abs(np.diff(grey, axis=2, append=grey[:, :, -1:])))
+    layout = _grid_means(rgb.reshape(pixels.shape), EMBEDDING_GRID)
+    embedding = _unit(np.hstack([
+        _unit(np.sqrt(histogram)),
+        _unit(layout - layout.mean(axis=1, keepdims=True)),
+        _unit(_grid_means(texture, EMBEDDING_GRID)),
+    ])).astype(np.float32)
+
+    ratio = sizes[:, 0] / np.maximum(sizes[:, 1], 1)
+    return {
+        'brightness': luma.mean(axis=1),
+        'contrast': luma.std(axis=1),
+        'saturation': saturation.mean(axis=1),
+        'histogram': histogram,
+        'dominant_colors': centres,
+        'dominant_shares': np.take_along_axis(histogram, top, axis=1),
+        'orientation': np.select([ratio > 1.1, ratio < 0.9], ['landscape', 'portrait'], 'square'),
+        'embedding': embedding,
+    }
+
+
+def categorize(batch, i):
+    """ Return (categories, ai_data measures) of image i of a features() batch. """
+    brightness, saturation = float(batch['brightness'][i]), float(batch['saturation'][i])
+    categories = [str(batch['orientation'][i])]
+    categories.append('dark' if brightness < 0.3 else 'bright' if brightness > 0.7 else 'midtone')
+    categories.append('colorful' if saturation > 0.35 else 'muted')
+    return categories, {
+        'brightness': round(brightness, 3),
+        'contrast': round(float(batch['contrast'][i]), 3),
+        'saturation': round(saturation, 3),
+        'dominant_colors': [
+            {'color': '#%02x%02x%02x' % tuple(int(c) for c in color), 'share': round(float(share), 3)}
+            for color, share in zip(batch['dominant_colors'][i], batch['dominant_shares'][i]) if share > 0
+        ],
+        'histogram': [round(float(v), 4) for v in batch['histogram'][i]],
+    }
+
+
+def analyze_paths(paths, workers=None):
+    """ Decode and analyze image files; returns (categories, measures, embedding) or None per path. """
+    workers = min(workers or _pool_size(), len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            decoded = list(pool.map(decode, paths, chunksize=max(1, len(paths) // (workers * 4))))
+    else:
+        decoded = [decode(path) for path in paths]
+
+    ok = [i for i, d in enumerate(decoded) if d is not None]
+    results = [None] * len(paths)
+    if ok:
+        batch = features(
+            np.stack([decoded[i][2] for i in ok]),
+            np.array([decoded[i][:2] for i in ok], dtype=np.float64),
+        )
+        for row, i in enumerate(ok):
+            results[i] = (*categorize(batch, row), batch['embedding'][row])
+    return results
+
+
+def _pool_size():
+    return int(getattr(settings, 'ANALYSIS_WORKERS', 0) or os.cpu_count() or 1)
+
+
+def _source_path(asset):
+    if asset.latest_file:
+        return blob_storage.path(asset.latest_file)
+    return asset.file.path if asset.file else None
+
+
+def analyze_assets(asset_ids, workers=None):
+    """
+    Analyze the latest version (else the file) of many assets and store the
+    results in ai_data and categories with one bulk_update. Unreadable
+    images are skipped. Returns the number of assets updated.
+    """
+    latest = Version.objects.filter(asset=OuterRef('pk')).order_by('-number')
+    assets = list(Asset.objects.filter(pk__in=asset_ids).annotate(
+        latest_file=Subquery(latest.values('file')[:1]),
+        latest_number=Subquery(latest.values('number')[:1]),
+    ))
+    images = [(a, _source_path(a)) for a in assets if a.asset_type == 'image']
+    images = [(a, path) for a, path in images if path]
+    analyzed = analyze_paths([path for _, path in images], workers) if images else []
+
+    now = timezone.now()
+    updated = []
+    vectors = {}
+    results = {a.pk: result for (a, _), result in zip(images, analyzed)}
+    for asset in assets:
+        if asset.asset_type == 'image':
+            if results.get(asset.pk) is None:
+                continue
+            categories, measures, embedding = results[asset.pk]
+            vectors.setdefault(asset.project_id, []).append((asset.pk, asset.owner_id, embedding))
+        else:
+            categories, measures = [asset.asset_type], {}
+        asset.ai_data = {'categories': categories, 'version': asset.latest_number, **measures}
+        asset.categories = ','.join(categories)
+        asset.ai_enhanced = True
+        # bulk_update skips auto_now
+        asset.updated_at = now
+        updated.append(asset)
+
+    Asset.objects.bulk_update(updated, ['ai_data', 'categories', 'ai_enhanced', 'updated_at'], batch_size=BATCH_SIZE)
+    for project_id, rows in vectors.items():
+        ids, owners, matrix = zip(*rows)
+        embeddings.add(project_id, ids, owners, np.stack(matrix))
+    # bulk_update sends no signals
+    response_cache.bump(*{
+        scope for a in updated for scope in response_cache.asset_scopes(a.owner_id, a.project_id, a.pk)
+    })
+    return len(updated)
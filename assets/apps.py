@@ -3,7 +3,23 @@ It defines the name of the app and can include other configurations.
 """
 
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class AssetsConfig(AppConfig):
     """ Configuration for the assets app. """
     name = 'assets'
+
+    def ready(self):
+        # Invalidate cached list responses on writes
+        from . import signals  # noqa: F401
+
+        # Keep the search index triggers in place (see search.install)
+        post_migrate.connect(install_search_index, sender=self)
+
+
+def install_search_index(using, **kwargs):
+    from django.db import connections
+
+    from . import search
+
+    search.install(connections[using])
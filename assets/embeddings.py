@@ -0,0 +1,191 @@
+""" Per-project store of image embeddings and visual similarity search.
+
+Each project has a directory under EMBEDDINGS_DIR (default:
+MEDIA_ROOT/embeddings) holding:
+
+- vectors.npy: (capacity, dim) float32 unit vectors (see analysis.features)
+- ids.npy, owners.npy: (capacity,) int64 asset and owner ids of each row
+- meta.json: {"count": rows in use, "dim": dim}
+
+The .npy files are memory-mapped, so a search reads the rows straight from
+the page cache and never loads the store into Python objects. Rows are
+appended (or overwritten when an asset is re-analyzed) under a file lock;
+the files grow by doubling, into new files swapped in atomically, and
+meta.json is written last, so readers only ever see complete rows.
+
+A search scores blocks of rows with one matrix-vector product (cosine
+similarity of unit vectors), masks the rows of other owners, and keeps the
+top k of each block with argpartition: O(n) with no full sort.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in one process only
+    fcntl = None
+
+INITIAL_CAPACITY = 1024
+# Rows scored per matrix-vector product
+BLOCK_ROWS = 32768
+
+_FILES = {'vectors': np.float32, 'ids': np.int64, 'owners': np.int64}
+
+_write_lock = threading.Lock()
+# project id -> (meta stat, {'ids', 'owners', 'vectors'} memmaps sliced to count)
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def project_dir(project_id):
+    root = getattr(settings, 'EMBEDDINGS_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'embeddings')
+    return os.path.join(root, str(project_id))
+
+
+def _path(directory, name):
+    return os.path.join(directory, 'meta.json' if name == 'meta' else f'{name}.npy')
+
+
+def _read_meta(directory):
+    try:
+        with open(_path(directory, 'meta'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(directory, meta):
+    tmp = _path(directory, 'meta') + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, _path(directory, 'meta'))
+
+
+@contextmanager
+def _locked(directory):
+    os.makedirs(directory, exist_ok=True)
+    with _write_lock, open(os.path.join(directory, 'lock'), 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _shape(name, capacity, dim):
+    return (capacity, dim) if name == 'vectors' else (capacity,)
+
+
+def _grow(directory, count, capacity, dim):
+    """ Copy the first count rows into new files of the given capacity, swapped in atomically. """
+    for name, dtype in _FILES.items():
+        tmp = _path(directory, name) + '.tmp'
+        grown = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=_shape(name, capacity, dim))
+        if count:
+            grown[:count] = np.load(_path(directory, name), mmap_mode='r')[:count]
+        grown.flush()
+        del grown
+        os.replace(tmp, _path(directory, name))
+
+
+def add(project_id, asset_ids, owner_ids, vectors):
+    """ Store the embeddings of assets (one row of vectors each), replacing previous ones. """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    directory = project_dir(project_id)
+    with _locked(directory):
+        meta = _read_meta(directory) or {'count': 0, 'dim': vectors.shape[1]}
+        count, dim = meta['count'], meta['dim']
+        if vectors.shape[1] != dim:
+            raise ValueError(f'expected {dim}-dimensional embeddings, got {vectors.shape[1]}')
+
+        capacity = 0
+        if count or os.path.exists(_path(directory, 'ids')):
+            capacity = len(np.load(_path(directory, 'ids'), mmap_mode='r'))
+        rows = {}
+        if count:
+            existing = np.load(_path(directory, 'ids'), mmap_mode='r')[:count]
+            matched = np.flatnonzero(np.isin(existing, np.asarray(asset_ids, dtype=np.int64)))
+            rows = {int(existing[row]): int(row) for row in matched}
+        positions = []
+        for pk in asset_ids:
+            if int(pk) not in rows:
+                rows[int(pk)] = count
+                count += 1
+            positions.append(rows[int(pk)])
+
+        if count > capacity:
+            _grow(directory, meta['count'], max(INITIAL_CAPACITY, capacity * 2, count), dim)
+        columns = {'vectors': vectors, 'ids': np.asarray(asset_ids), 'owners': np.asarray(owner_ids)}
+        for name, values in columns.items():
+            stored = np.load(_path(directory, name), mmap_mode='r+')
+            stored[positions] = values
+            stored.flush()
+            del stored
+        _write_meta(directory, {'count': count, 'dim': dim})
+
+
+def load(project_id):
+    """ Return the project's {'ids', 'owners', 'vectors'} as read-only memmaps, or None. """
+    directory = project_dir(project_id)
+    try:
+        stat = os.stat(_path(directory, 'meta'))
+    except FileNotFoundError:
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _readers_lock:
+        cached = _readers.get(project_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    count = _read_meta(directory)['count']
+    arrays = {name: np.load(_path(directory, name), mmap_mode='r')[:count] for name in _FILES}
+    with _readers_lock:
+        _readers[project_id] = (version, arrays)
+    return arrays
+
+
+def vector(project_id, asset_id):
+    """ Return the stored embedding of an asset, or None. """
+    arrays = load(project_id)
+    if arrays is None:
+        return None
+    rows = np.flatnonzero(arrays['ids'] == asset_id)
+    return np.array(arrays['vectors'][rows[-1]]) if len(rows) else None
+
+
+def search(project_id, query, owner_id, k=20, exclude=()):
+    """
+    Return up to k (similarity, asset id) of owner_id's images most similar
+    to the query embedding, most similar first.
+    """
+    arrays = load(project_id)
+    if arrays is None or not len(arrays['ids']) or k < 1:
+        return []
+    query = np.asarray(query, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1)
+    exclude = np.asarray(list(exclude), dtype=np.int64)
+
+    candidates, scores = [], []
+    for start in range(0, len(arrays['ids']), BLOCK_ROWS):
+        block = slice(start, start + BLOCK_ROWS)
+        ids = arrays['ids'][block]
+        similarity = arrays['vectors'][block] @ query
+        similarity[(arrays['owners'][block] != owner_id) | np.isin(ids, exclude)] = -np.inf
+        if len(similarity) > k:
+            top = np.argpartition(-similarity, k - 1)[:k]
+        else:
+            top = np.arange(len(similarity))
+        top = top[np.isfinite(similarity[top])]
+        candidates.append(ids[top])
+        scores.append(similarity[top])
+
+    candidates, scores = np.concatenate(candidates), np.concatenate(scores)
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        candidates, scores = candidates[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return [(float(scores[i]), int(candidates[i])) for i in order]
@@ -0,0 +1,333 @@
+""" Bulk ingest of a directory tree (delivery drives) into a project.
+
+The tree is walked lazily in sorted order. Each file is classified into one
+of Asset.ASSET_TYPES by extension, falling back to its leading bytes, and is
+hashed and copied into the blob store in a single read by a thread pool (the
+work is I/O bound and hashlib releases the GIL). The copies of the next
+batch run while the main thread writes the current one: assets are resolved
+with one query, new ones and every Version are written with bulk_create, and
+version numbers and blob references are allocated in bulk, all in one
+transaction per batch.
+
+Ingest is restartable: content already referenced by a version of the
+project (or seen earlier in the run) is skipped, so after an interruption
+only the uncommitted batch is redone. As the walk order is fixed, the files
+a previous run committed come first: files are hashed before being copied,
+and not copied at all when their content is already stored, until a batch
+holds new content; from then on they are hashed and copied in one read.
+Copies are published only after their blob references are taken (see
+Blob.adopt), and the copies of skipped content are dropped.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.db import transaction
+
+from stratopipe import response_cache
+from versions.models import Blob, Version
+from versions.storage import READ_BLOCK_SIZE, blob_name, blob_storage
+
+from . import processing
+from .models import Asset
+
+BATCH_SIZE = 500
+
+EXTENSIONS = {
+    'image': {'jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tif', 'tiff', 'tga', 'exr', 'hdr', 'psd', 'dpx'},
+    'video': {'mp4', 'm4v', 'mov', 'avi', 'mkv', 'webm', 'mxf', 'mpg', 'mpeg', 'wmv'},
+    'geometry': {'obj', 'fbx', 'gltf', 'glb', 'usd', 'usda', 'usdc', 'usdz', 'abc', 'stl', 'ply', 'blend',
+                 'ma', 'mb', '3ds', 'dae'},
+    'document': {'pdf', 'txt', 'md', 'doc', 'docx', 'odt', 'rtf', 'csv', 'xls', 'xlsx', 'json', 'xml'},
+}
+_BY_EXTENSION = {ext: asset_type for asset_type, exts in EXTENSIONS.items() for ext in exts}
+
+# Leading bytes of common formats, for files without a known extension
+MAGIC = [
+    (0, b'\x89PNG\r\n\x1a\n', 'image'),
+    (0, b'\xff\xd8\xff', 'image'),
+    (0, b'GIF8', 'image'),
+    (0, b'II*\x00', 'image'),
+    (0, b'MM\x00*', 'image'),
+    (0, b'BM', 'image'),
+    (0, b'v/1\x01', 'image'),  # OpenEXR
+    (0, b'8BPS', 'image'),
+    (8, b'WEBP', 'image'),
+    (4, b'ftyp', 'video'),
+    (8, b'AVI ', 'video'),
+    (0, b'\x1aE\xdf\xa3', 'video'),  # Matroska / WebM
+    (0, b'glTF', 'geometry'),
+    (0, b'Kaydara FBX Binary', 'geometry'),
+    (0, b'PXR-USDC', 'geometry'),
+    (0, b'ply\n', 'geometry'),
+    (0, b'%PDF', 'document'),
+]
+MAGIC_BYTES = 32
+DEFAULT_TYPE = 'document'
+
+NAMING_RULES = ('stem', 'path', 'parent')
+NAME_MAX_LENGTH = Asset._meta.get_field('name').max_length
+
+
+def classify(path, head):
+    """ Return the asset type of a file from its extension, else its leading bytes (head). """
+    extension = os.path.splitext(path)[1][1:].lower()
+    if extension in _BY_EXTENSION:
+        return _BY_EXTENSION[extension]
+    for offset, magic, asset_type in MAGIC:
+        if head[offset:offset + len(magic)] == magic:
+            return asset_type
+    return DEFAULT_TYPE
+
+
+def asset_name(relpath, rule='stem', pattern=None):
+    """
+    Map a path relative to the ingest root to an asset name, or None to
+    leave the file out. pattern (a regex searched in the relative path, with
+    a "name" group or else the whole match) takes precedence over rule:
+      - stem: the file name without its extension (the batch upload rule)
+      - path: the relative path without the extension ("shots/sh010/plate")
+      - parent: the directory name, so the files of a folder become
+        versions of one asset (files at the root use their stem)
+    """
+    posix = PurePosixPath(relpath)
+    if pattern is not None:
+        match = pattern.search(str(posix))
+        if match is None:
+            return None
+        name = match.group('name') if 'name' in pattern.groupindex else match.group(0)
+    elif rule == 'path':
+        name = str(posix.with_suffix(''))
+    elif rule == 'parent' and len(posix.parts) > 1:
+        name = posix.parent.name
+    else:
+        name = posix.stem
+    name = name.strip()
+    return name or None
+
+
+def walk(root, include_hidden=False):
+    """ Yield the paths of the regular files under root, relative to it, in sorted order. """
+    for directory, dirnames, filenames in os.walk(root):
+        if not include_hidden:
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            filenames = [f for f in filenames if not f.startswith('.')]
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path) and not os.path.islink(path):
+                yield os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def _read(path, target=None):
+    """ Hash a file, writing it to target if given; returns (sha256, size, leading bytes). """
+    hasher = hashlib.sha256()
+    size = 0
+    head = b''
+    with open(path, 'rb') as source:
+        while block := source.read(READ_BLOCK_SIZE):
+            if not size:
+                head = block[:MAGIC_BYTES]
+            hasher.update(block)
+            if target is not None:
+                target.write(block)
+            size += len(block)
+    return hasher.hexdigest(), size, head
+
+
+def copy_file(path, probe=False):
+    """
+    Hash and copy a file to the blob store's temporary directory in one read.
+    With probe, hash it first and copy it (in a second read) only if its
+    content is not stored yet. Returns (temporary path, or None when not
+    copied, sha256, size, asset type); _write_batch publishes the copy.
+    Runs in pool threads.
+    """
+    if probe:
+        digest, size, head = _read(path)
+        if blob_storage.exists(blob_name(digest)):
+            return None, digest, size, classify(path, head)
+    fd, tmp_path = tempfile.mkstemp(dir=blob_storage.temp_dir(), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            digest, size, head = _read(path, target)
+    except BaseException:
+        blob_storage.discard(tmp_path)
+        raise
+    return tmp_path, digest, size, classify(path, head)
+
+
+class Report:
+    """ Counters of an ingest run. """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.versions = 0
+        self.assets = 0
+        self.skipped = 0
+        self.unnamed = 0
+        self.errors = []
+
+
+def _write_batch(project, user, entries, status, seen, report, process):
+    """ Publish a batch of copied files and create their assets and versions, in one transaction. """
+    try:
+        return _create_versions(project, user, entries, status, seen, report, process)
+    finally:
+        # Skipped copies, or all of them if the transaction failed
+        for entry in entries:
+            if entry['staged'] is not None:
+                blob_storage.discard(entry['staged'])
+
+
+def _create_versions(project, user, entries, status, seen, report, process):
+    digests = {e['sha256'] for e in entries}
+    files = [blob_name(d) for d in digests - seen]
+    ingested = {
+        name.rsplit('/', 1)[-1]
+        for name in Version.objects.filter(asset__project=project, file__in=files).values_list('file', flat=True)
+    }
+    fresh = []
+    for entry in entries:
+        if entry['sha256'] in seen or entry['sha256'] in ingested:
+            report.skipped += 1
+            continue
+        seen.add(entry['sha256'])
+        fresh.append(entry)
+    if not fresh:
+        return []
+
+    with transaction.atomic():
+        # References first: a concurrent release of the last one cannot delete the file we rely on
+        Blob.acquire_many(Counter(e['sha256'] for e in fresh), {e['sha256']: e['size'] for e in fresh})
+        for entry in fresh:
+            if entry['staged'] is None and not blob_storage.exists(blob_name(entry['sha256'])):
+                # Not copied as it was stored, but released and collected since: copy it now
+                entry['staged'], digest, _, _ = copy_file(entry['source'])
+                if digest != entry['sha256']:
+                    raise OSError(f"{entry['path']} changed while being ingested")
+            if entry['staged'] is not None:
+                blob_storage.adopt(entry['staged'], entry['sha256'])
+
+        names = {e['name'] for e in fresh}
+        assets = {a.name: a for a in Asset.objects.filter(project=project, name__in=names)}
+        new_assets = {}
+        for entry in fresh:
+            if entry['name'] not in assets and entry['name'] not in new_assets:
+                new_assets[entry['name']] = Asset(
+                    project=project,
+                    name=entry['name'],
+                    asset_type=entry['asset_type'],
+                    owner=user,
+                )
+        if new_assets:
+            Asset.objects.bulk_create(new_assets.values())
+            # Re-read to get primary keys on every backend
+            assets.update((a.name, a) for a in Asset.objects.filter(project=project, name__in=new_assets))
+
+        next_numbers = Asset.objects.allocate_version_numbers(Counter(assets[e['name']].pk for e in fresh))
+        versions = []
+        for entry in fresh:
+            asset = assets[entry['name']]
+            number = next_numbers[asset.pk]
+            next_numbers[asset.pk] = number + 1
+            versions.append(Version(
+                asset=asset,
+                number=number,
+                file=blob_name(entry['sha256']),
+                original_name=PurePosixPath(entry['path']).name,
+                description=f"ingested from {entry['path']}",
+                user=user,
+                status=status,
+            ))
+        Version.objects.bulk_create(versions)
+
+        # bulk_create sends no signals: invalidate the listings here
+        response_cache.bump(*{
+            scope for a in assets.values()
+            for scope in response_cache.asset_scopes(a.owner_id, a.project_id, a.pk)
+        })
+        if process:
+            processing.enqueue(versions)
+
+    report.assets += len(new_assets)
+    report.versions += len(versions)
+    return versions
+
+
+def ingest(root, project, user, rule='stem', pattern=None, workers=None, batch_size=BATCH_SIZE,
+           status='placeholder', process=True, include_hidden=False, on_batch=None):
+    """
+    Ingest every file under root into project as versions of assets named by
+    rule/pattern (see asset_name). Returns a Report. on_batch(report) is
+    called after each committed batch.
+    """
+    report = Report()
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    batch_size = max(1, batch_size)
+    seen = set()
+    # Hash before copying while the files are those of an earlier run
+    probe = True
+
+    def named_paths():
+        for relpath in walk(root, include_hidden):
+            name = asset_name(relpath, rule, pattern)
+            if name is None:
+                report.unnamed += 1
+            elif len(name) > NAME_MAX_LENGTH:
+                report.errors.append((relpath, f'asset name longer than {NAME_MAX_LENGTH} characters'))
+            else:
+                yield relpath, name
+
+    def submit(pool, paths):
+        batch = []
+        for relpath, name in paths:
+            source = os.path.join(root, relpath)
+            batch.append(({'path': relpath, 'name': name, 'source': source, 'probe': probe},
+                          pool.submit(copy_file, source, probe)))
+            if len(batch) == batch_size:
+                break
+        return batch
+
+    def collect(batch):
+        nonlocal probe
+        entries = []
+        for entry, future in batch:
+            try:
+                entry['staged'], entry['sha256'], entry['size'], entry['asset_type'] = future.result()
+            except OSError as exc:
+                report.errors.append((entry['path'], str(exc)))
+                continue
+            report.files += 1
+            report.bytes += entry['size']
+            entries.append(entry)
+            if entry['probe'] and entry['staged'] is not None:
+                # New content: copy the remaining files while hashing them
+                probe = False
+        return entries
+
+    paths = named_paths()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batch = submit(pool, paths)
+        while batch:
+            # Copy the next batch while this one is written
+            upcoming = submit(pool, paths)
+            _write_batch(project, user, collect(batch), status, seen, report, process)
+            if on_batch is not None:
+                on_batch(report)
+            batch = upcoming
+    return report
+
+
+def compile_pattern(pattern):
+    """ Compile a naming pattern, raising ValueError with a readable message. """
+    try:
+        return re.compile(pattern)
+    except re.error as exc:
+        raise ValueError(f'invalid naming pattern: {exc}') from exc
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets import analysis
+from assets.models import Asset
+from assets.tasks import analyze_assets_batch
+
+
+class Command(BaseCommand):
+    help = ('(Re)analyze assets in batches (colour histograms, dominant colours, brightness, '
+            'contrast, orientation): queued as analyze_assets_batch tasks, or run here with --sync')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help='Only the assets of this project')
+        parser.add_argument('--batch-size', type=int, default=analysis.BATCH_SIZE, help='Assets per task')
+        parser.add_argument('--sync', action='store_true', help='Analyze in this process instead of queueing')
+        parser.add_argument('--workers', type=int, help='Decoding processes with --sync (default: all cores)')
+
+    def handle(self, *args, **options):
+        assets = Asset.objects.order_by('pk')
+        if options['project']:
+            assets = assets.filter(project_id=options['project'])
+        ids = list(assets.values_list('pk', flat=True))
+        size = max(1, options['batch_size'])
+        batches = [ids[i:i + size] for i in range(0, len(ids), size)]
+
+        if not options['sync']:
+            for batch in batches:
+                analyze_assets_batch.delay(batch)
+            self.stdout.write(f'Queued {len(batches)} batches ({len(ids)} assets)')
+            return
+
+        started = time.perf_counter()
+        updated = sum(analysis.analyze_assets(batch, workers=options['workers']) for batch in batches)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Analyzed {updated} of {len(ids)} assets in {elapsed:.2f}s '
+                          f'({len(ids) / elapsed if elapsed else 0:.0f} assets/s)')
@@ -0,0 +1,115 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from assets.models import Asset
+from projects.models import Project
+from versions.models import Version
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    """ Raised to roll the seeded dataset back once measured. """
+
+
+class Command(BaseCommand):
+    help = ('Seed a large asset dataset (rolled back afterwards) and record the query plan '
+            'and timing of the hot asset/version queries')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=20000, help='Assets to seed')
+        parser.add_argument('--projects', type=int, default=20, help='Projects to spread them over')
+        parser.add_argument('--versions', type=int, default=3, help='Versions per asset')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--check', action='store_true',
+                            help='Fail if a query plan scans a table or sorts instead of using an index')
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                user, project = self._seed(options)
+                for label, queryset in self._queries(user, project):
+                    results.append(self._measure(label, queryset, options['repeat']))
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        for result in results:
+            self.stdout.write(f"{result['query']}: median {result['median_ms']:.3f} ms, "
+                              f"p95 {result['p95_ms']:.3f} ms")
+            for line in result['plan']:
+                self.stdout.write(f'    {line}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['check']:
+            slow = [r['query'] for r in results if r['full_scan'] or r['sorts']]
+            if slow:
+                raise CommandError(f"Query not served by an index: {', '.join(slow)}")
+
+    def _seed(self, options):
+        user = User.objects.create_user(username='benchmark-user', password=None)
+        projects = Project.objects.bulk_create([
+            Project(owner=user, name=f'benchmark {i}') for i in range(max(options['projects'], 1))
+        ])
+        types = [t for t, _ in Asset.ASSET_TYPES]
+        assets = Asset.objects.bulk_create([
+            Asset(owner=user, project=projects[i % len(projects)], name=f'asset {i:07d}',
+                  asset_type=types[i % len(types)], version_counter=options['versions'])
+            for i in range(options['assets'])
+        ], batch_size=1000)
+        Version.objects.bulk_create([
+            Version(asset=asset, number=number, user=user, file=f'benchmark/{asset.name}_{number}')
+            for asset in assets for number in range(1, options['versions'] + 1)
+        ], batch_size=1000)
+        # Give the planner statistics for the seeded tables
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        return user, projects[0]
+
+    def _queries(self, user, project):
+        """ (label, queryset) of the query shape behind each endpoint. """
+        first = Asset.objects.filter(project=project).order_by('id').first()
+        return [
+            ('list_project_images page',
+             Asset.objects.filter(project=project, owner=user, asset_type='image').order_by('name', 'id')[:101]),
+            ('AssetListView page',
+             Asset.objects.filter(owner=user).order_by('name', 'id')[:101]),
+            ('AssetListView ?project= page',
+             Asset.objects.filter(owner=user, project=project).order_by('name', 'id')[:101]),
+            ('upload_asset get_or_create lookup',
+             Asset.objects.filter(project=project, name=first.name)),
+            ('asset versions by number',
+             Version.objects.filter(asset=first).order_by('-number')),
+        ]
+
+    def _measure(self, label, queryset, repeat):
+        plan = queryset.explain().splitlines()
+        timings = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            'query': label,
+            'sql': str(queryset.query),
+            'plan': plan,
+            # SQLite reports "SCAN <table>" for full scans and "USING INDEX" for ordered index walks
+            'full_scan': any(' SCAN ' in f' {line} ' and 'INDEX' not in line for line in plan),
+            # ORDER BY not satisfied by the index order
+            'sorts': any('TEMP B-TREE' in line for line in plan),
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        }
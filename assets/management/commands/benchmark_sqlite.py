@@ -0,0 +1,108 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from stratopipe import sqlite as sqlite_profile
+
+# Django's default SQLite connection timeout (seconds)
+DEFAULT_TIMEOUT = 5
+
+
+class Command(BaseCommand):
+    help = ('Compare concurrent read/write throughput of the default SQLite configuration '
+            'with the production profile (stratopipe/sqlite.py) on a scratch database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads (version creation)')
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (version listing)')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile')
+        parser.add_argument('--assets', type=int, default=1000, help='Assets in the scratch database')
+
+    def handle(self, *args, **options):
+        for profile in ('default', 'production'):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'benchmark.sqlite3')
+                self._seed(path, options['assets'])
+                stats = self._run(path, profile, options)
+            duration = options['duration']
+            self.stdout.write(
+                f"{profile}: {stats['writes'] / duration:.0f} writes/s, "
+                f"{stats['reads'] / duration:.0f} reads/s, "
+                f"{stats['locked']} 'database is locked' errors"
+            )
+
+    def _connect(self, path, profile):
+        conn = sqlite3.connect(path, timeout=DEFAULT_TIMEOUT, isolation_level=None,
+                               check_same_thread=False)
+        if profile == 'production':
+            for name, value in sqlite_profile.PRAGMAS:
+                conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def _seed(self, path, assets):
+        conn = sqlite3.connect(path)
+        conn.executescript('''
+            CREATE TABLE asset (id INTEGER PRIMARY KEY, version_counter INTEGER NOT NULL);
+            CREATE TABLE version (id INTEGER PRIMARY KEY, asset_id INTEGER NOT NULL,
+                                  number INTEGER NOT NULL, status TEXT NOT NULL,
+                                  UNIQUE (asset_id, number));
+        ''')
+        conn.executemany('INSERT INTO asset (id, version_counter) VALUES (?, 0)',
+                         [(i,) for i in range(1, assets + 1)])
+        conn.commit()
+        conn.close()
+
+    def _run(self, path, profile, options):
+        begin = 'BEGIN IMMEDIATE' if profile == 'production' else 'BEGIN'
+        stats = {'writes': 0, 'reads': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def count(key):
+            with lock:
+                stats[key] += 1
+
+        def writer():
+            # Read-then-write transaction, like allocating a version number
+            conn = self._connect(path, profile)
+            while time.monotonic() < deadline:
+                asset_id = random.randint(1, options['assets'])
+                try:
+                    conn.execute(begin)
+                    number = conn.execute('SELECT version_counter FROM asset WHERE id = ?',
+                                          (asset_id,)).fetchone()[0] + 1
+                    conn.execute('UPDATE asset SET version_counter = ? WHERE id = ?', (number, asset_id))
+                    conn.execute('INSERT INTO version (asset_id, number, status) VALUES (?, ?, ?)',
+                                 (asset_id, number, 'work_in_progress'))
+                    conn.execute('COMMIT')
+                    count('writes')
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    count('locked')
+            conn.close()
+
+        def reader():
+            conn = self._connect(path, profile)
+            while time.monotonic() < deadline:
+                asset_id = random.randint(1, options['assets'])
+                try:
+                    conn.execute('SELECT id, number, status FROM version WHERE asset_id = ? '
+                                 'ORDER BY number DESC LIMIT 10', (asset_id,)).fetchall()
+                    count('reads')
+                except sqlite3.OperationalError:
+                    count('locked')
+            conn.close()
+
+        threads = ([threading.Thread(target=writer) for _ in range(options['writers'])]
+                   + [threading.Thread(target=reader) for _ in range(options['readers'])])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from assets import uploads
+
+
+class Command(BaseCommand):
+    help = ('Expire chunked upload sessions left idle (neither committed nor aborted) and remove their '
+            'partial files. The expire_upload_sessions Celery task runs the same cleanup every hour.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int,
+                            help='Idle seconds after which a session expires (default: ASSET_UPLOAD_SESSION_TTL, '
+                                 f'or {uploads.DEFAULT_SESSION_TTL})')
+
+    def handle(self, *args, **options):
+        expired = uploads.expire_sessions(options['ttl'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} idle upload sessions'))
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assets import phash, thumbnails
+from assets.models import Asset
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Report clusters of near-duplicate images of a project, by perceptual hash distance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int, help='Project id')
+        parser.add_argument('--distance', type=int, default=phash.DEFAULT_DISTANCE,
+                            help='Largest Hamming distance between near duplicates (bits)')
+        parser.add_argument('--algorithm', choices=phash.ALGORITHMS, default=phash.DEFAULT_ALGORITHM)
+        parser.add_argument('--compute-missing', action='store_true',
+                            help='Hash the images without hashes first (e.g. uploaded before hashing existed)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Hashing processes with --compute-missing')
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(pk=options['project']).first()
+        if project is None:
+            raise CommandError(f"Project {options['project']} does not exist")
+        images = Asset.objects.filter(project=project, asset_type='image')
+
+        if options['compute_missing']:
+            missing = []
+            for asset in images.filter(**{f"{options['algorithm']}__isnull": True}):
+                source = thumbnails.thumbnail_source(asset)
+                if source:
+                    missing.append((asset, source.path))
+            done = phash.hash_assets([a for a, _ in missing], [p for _, p in missing], options['workers'])
+            self.stdout.write(f'Hashed {done} of {len(missing)} images')
+
+        groups = phash.clusters(project.pk, options['distance'], options['algorithm'])
+        names = dict(images.values_list('pk', 'name'))
+        for group in groups:
+            self.stdout.write(f'{len(group)} images: ' + ', '.join(f'{names[pk]} (#{pk})' for pk in group))
+        self.stdout.write(f'{len(groups)} clusters, {sum(len(g) for g in groups)} images '
+                          f'within distance {options["distance"]} ({options["algorithm"]})')
@@ -0,0 +1,86 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from assets import ingest
+from projects.models import Project
+from versions.constants import STATUS_VALUES
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Ingest a directory tree into a project: every file becomes a version of the asset its path '
+            'maps to. Content already in the project is skipped, so an interrupted run can be restarted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Root of the tree to ingest')
+        parser.add_argument('project', type=int, help='Project id')
+        parser.add_argument('--user', type=int, help='User the versions are attributed to (default: project owner)')
+        parser.add_argument('--naming', choices=ingest.NAMING_RULES, default='stem',
+                            help='Asset name of a file: its stem (default), its relative path without '
+                                 'extension, or its parent directory')
+        parser.add_argument('--pattern',
+                            help='Regex searched in the relative path; the "name" group (or the whole match) '
+                                 'is the asset name and files that do not match are left out')
+        parser.add_argument('--status', choices=STATUS_VALUES, default='placeholder', help='Status of the versions')
+        parser.add_argument('--workers', type=int, help='Copy threads (default: 4 per core, at most 32)')
+        parser.add_argument('--batch-size', type=int, default=ingest.BATCH_SIZE,
+                            help='Files written per transaction')
+        parser.add_argument('--no-process', action='store_true',
+                            help='Do not queue the processing pipeline of the new versions')
+        parser.add_argument('--include-hidden', action='store_true', help='Also ingest dot files and directories')
+
+    def handle(self, *args, **options):
+        root = options['directory']
+        if not os.path.isdir(root):
+            raise CommandError(f'{root} is not a directory')
+        project = Project.objects.filter(pk=options['project']).first()
+        if project is None:
+            raise CommandError(f"Project {options['project']} does not exist")
+        user = project.owner
+        if options['user']:
+            user = User.objects.filter(pk=options['user']).first()
+            if user is None:
+                raise CommandError(f"User {options['user']} does not exist")
+        pattern = None
+        if options['pattern']:
+            try:
+                pattern = ingest.compile_pattern(options['pattern'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        started = time.perf_counter()
+
+        def rates(report):
+            elapsed = time.perf_counter() - started
+            return (f'{report.files / elapsed if elapsed else 0:.0f} files/s, '
+                    f'{report.bytes / 1024 ** 2 / elapsed if elapsed else 0:.1f} MB/s')
+
+        def progress(report):
+            self.stdout.write(f'{report.files} files read, {report.versions} versions created, '
+                              f'{report.skipped} already ingested ({rates(report)})')
+
+        report = ingest.ingest(
+            root, project, user,
+            rule=options['naming'],
+            pattern=pattern,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            status=options['status'],
+            process=not options['no_process'],
+            include_hidden=options['include_hidden'],
+            on_batch=progress,
+        )
+
+        for path, error in report.errors:
+            self.stdout.write(self.style.ERROR(f'{path}: {error}'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {report.files} files ({report.bytes / 1024 ** 2:.1f} MB) in {elapsed:.2f}s '
+            f'({rates(report)}): {report.versions} versions, {report.assets} new assets, '
+            f'{report.skipped} already ingested, {report.unnamed} not matching the naming rule, '
+            f'{len(report.errors)} errors'
+        ))
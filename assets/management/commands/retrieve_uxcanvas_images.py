@@ -1,13 +1,161 @@
-import os
+""" Import the UXCanvas generated images into a project.
+
+Downloads run in a bounded thread pool sharing one pooled HTTP session, and
+each body is streamed to a temporary file that the storage then moves into
+place. Names already in the project are read with a single query up front,
+and the assets are written with bulk_create in batches from the main
+thread, so the worker threads never touch the database. Transient failures
+(connection errors, timeouts, 429 and 5xx) are retried with exponential
+backoff.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
-from django.core.management.base import BaseCommand
-from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
-from projects.models import Project
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from requests.adapters import HTTPAdapter
+
+from assets import thumbnails
 from assets.models import Asset
+from projects.models import Project
+from stratopipe import response_cache
 
 User = get_user_model()
 
+BASE_URL = "https://uxcanvas.ai/api/generated-images/d4dc8c64-5e7b-4927-853b-1ce5a65cd255"
+CHUNK_SIZE = 64 * 1024
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# All image IDs found in the codebase
+IMAGE_IDS = [
+    "0512db2b-5daa-41bb-90a0-8e27b8bffda4",
+    "06f886da-acfd-49c5-9760-a2b6a4ca6ba2",
+    "0814ddea-9e48-4cf7-8a42-f5492e25e29e",
+    "10d7be19-25e9-4016-bc21-49e68c58235f",
+    "17cb73a0-39ab-44c4-8e9b-b65251334a1c",
+    "1886799b-8f1b-4f02-a1d5-b440f5b423fd",
+    "29ad8926-c761-4955-a819-a0623dfe5a5f",
+    "2dd9723a-dbe0-4dc2-b6ec-84fc1f997217",
+    "3101fea8-ddec-455e-b08f-60475173808c",
+    "39fc2bcc-f68b-4af6-bab7-0f3b12821587",
+    "3fcbec4c-ad53-46cc-af64-70b407a807ef",
+    "49440c97-cbcd-45cd-acf2-11a20883b0bf",
+    "4c9119c6-1ee5-456c-b3c8-e432554d08c2",
+    "4d9249a6-f789-4e57-ac62-0c1e4e93cd21",
+    "5e96ff52-009e-46da-8be8-d6f4173ee351",
+    "66918ab4-4141-4dbe-ad2a-5d5bbb3d5d4c",
+    "6c2cc018-592b-45f6-9fa0-8c76a58218d0",
+    "77ab4ba2-0910-4565-b16d-f5a31131e46c",
+    "7d9420b6-06ca-444f-b92f-d384af497569",
+    "81637319-b931-485b-ae5c-180e1de4e865",
+    "84d03d96-161a-45af-8fa7-fbbf61cbce83",
+    "8efa7049-fbc0-4bb8-86a7-be949557395c",
+    "947f5f83-17ea-4727-8bcc-8e40fb166ef6",
+    "9cc0411d-5654-4328-b402-47e45b008826",
+    "a0172859-2b18-486c-bb68-413b09816d98",
+    "acb76dcd-8e07-46af-bd09-ff8646e148d1",
+    "b4a093f2-6333-48c3-8174-2abf1b905d7f",
+    "b7e6f3ab-1a4b-4554-9b56-4f31a4ec28bc",
+    "b9405540-c37f-4f64-9e28-7f6076a0ef62",
+    "bc0e4a4a-101f-4d8a-8238-dbedd4fd1662",
+    "c0edf762-08ec-45d7-bb29-62663a067000",
+    "cc5e58cc-e0b6-4fbb-8211-c37a3f742558",
+    "ceefd621-be9f-4105-b053-e14f9e49e546",
+    "cf7f8f23-cdce-4d24-97fc-8979015c691f",
+    "e3ea5a11-f0f9-4541-839e-054ca2a5e97d",
+    "e790c7be-94f3-4fcb-a7d9-a800893c8f9c",
+    "f5269a71-cf2f-46ca-916b-1655f95f2d85"
+]
+
+# Image metadata mapping based on usage patterns
+IMAGE_METADATA = {
+    "0512db2b-5daa-41bb-90a0-8e27b8bffda4": {"name": "Hover Vehicle", "type": "Vehicle", "category": "Transportation"},
+    "06f886da-acfd-49c5-9760-a2b6a4ca6ba2": {"name": "Neon City Environment", "type": "Environment", "category": "Urban"},
+    "0814ddea-9e48-4cf7-8a42-f5492e25e29e": {"name": "Animated Prop", "type": "Prop", "category": "Interactive"},
+    "10d7be19-25e9-4016-bc21-49e68c58235f": {"name": "Ocean Floor Environment", "type": "Environment", "category": "Underwater"},
+    "17cb73a0-39ab-44c4-8e9b-b65251334a1c": {"name": "Space Station Interior", "type": "Environment", "category": "Space"},
+    "1886799b-8f1b-4f02-a1d5-b440f5b423fd": {"name": "Cyberpunk City Scene", "type": "Scene", "category": "Establishing Shot"},
+    "29ad8926-c761-4955-a819-a0623dfe5a5f": {"name": "Generic Prop", "type": "Prop", "category": "General"},
+    "2dd9723a-dbe0-4dc2-b6ec-84fc1f997217": {"name": "Storyboard Frame", "type": "Storyboard", "category": "Previsualization"},
+    "3101fea8-ddec-455e-b08f-60475173808c": {"name": "Space Odyssey Background", "type": "Environment", "category": "Space"},
+    "39fc2bcc-f68b-4af6-bab7-0f3b12821587": {"name": "Deep Space Environment", "type": "Environment", "category": "Space"},
+    "3fcbec4c-ad53-46cc-af64-70b407a807ef": {"name": "Animated Character", "type": "Character", "category": "Animated"},
+    "49440c97-cbcd-45cd-acf2-11a20883b0bf": {"name": "Ocean Depths Background", "type": "Environment", "category": "Underwater"},
+    "4c9119c6-1ee5-456c-b3c8-e432554d08c2": {"name": "Cyber Nexus Background", "type": "Environment", "category": "Cyberpunk"},
+    "4d9249a6-f789-4e57-ac62-0c1e4e93cd21": {"name": "Advanced Prop", "type": "Prop", "category": "Technology"},
+    "5e96ff52-009e-46da-8be8-d6f4173ee351": {"name": "Animated Environment", "type": "Environment", "category": "Animated"},
+    "66918ab4-4141-4dbe-ad2a-5d5bbb3d5d4c": {"name": "Animated Weapon", "type": "Prop", "category": "Weapon"},
+    "6c2cc018-592b-45f6-9fa0-8c76a58218d0": {"name": "Futuristic Prop", "type": "Prop", "category": "Technology"},
+    "77ab4ba2-0910-4565-b16d-f5a31131e46c": {"name": "Character Portrait", "type": "Character", "category": "Portrait"},
+    "7d9420b6-06ca-444f-b92f-d384af497569": {"name": "Animated Vehicle", "type": "Vehicle", "category": "Animated"},
+    "81637319-b931-485b-ae5c-180e1de4e865": {"name": "Cyber Character", "type": "Character", "category": "Cyberpunk"},
+    "84d03d96-161a-45af-8fa7-fbbf61cbce83": {"name": "Space Character", "type": "Character", "category": "Space"},
+    "8efa7049-fbc0-4bb8-86a7-be949557395c": {"name": "Ocean Character", "type": "Character", "category": "Underwater"},
+    "947f5f83-17ea-4727-8bcc-8e40fb166ef6": {"name": "Generic Character", "type": "Character", "category": "General"},
+    "9cc0411d-5654-4328-b402-47e45b008826": {"name": "Advanced Character", "type": "Character", "category": "Technology"},
+    "a0172859-2b18-486c-bb68-413b09816d98": {"name": "Generic Environment", "type": "Environment", "category": "General"},
+    "acb76dcd-8e07-46af-bd09-ff8646e148d1": {"name": "Specialized Prop", "type": "Prop", "category": "Specialized"},
+    "b4a093f2-6333-48c3-8174-2abf1b905d7f": {"name": "Laser Weapon", "type": "Prop", "category": "Weapon"},
+    "b7e6f3ab-1a4b-4554-9b56-4f31a4ec28bc": {"name": "Animated Environment", "type": "Environment", "category": "Animated"},
+    "b9405540-c37f-4f64-9e28-7f6076a0ef62": {"name": "Specialized Character", "type": "Character", "category": "Specialized"},
+    "bc0e4a4a-101f-4d8a-8238-dbedd4fd1662": {"name": "Advanced Vehicle", "type": "Vehicle", "category": "Technology"},
+    "c0edf762-08ec-45d7-bb29-62663a067000": {"name": "Futuristic Vehicle", "type": "Vehicle", "category": "Technology"},
+    "cc5e58cc-e0b6-4fbb-8211-c37a3f742558": {"name": "Cyber Suit Character", "type": "Character", "category": "Cyberpunk"},
+    "ceefd621-be9f-4105-b053-e14f9e49e546": {"name": "Unique Prop", "type": "Prop", "category": "Unique"},
+    "cf7f8f23-cdce-4d24-97fc-8979015c691f": {"name": "Animated Character", "type": "Character", "category": "Animated"},
+    "e3ea5a11-f0f9-4541-839e-054ca2a5e97d": {"name": "Energy Shield", "type": "Prop", "category": "Defense"},
+    "e790c7be-94f3-4fcb-a7d9-a800893c8f9c": {"name": "Space Prop", "type": "Prop", "category": "Space"},
+    "f5269a71-cf2f-46ca-916b-1655f95f2d85": {"name": "Advanced Prop", "type": "Prop", "category": "Technology"}
+}
+
+
+class DownloadError(Exception):
+    pass
+
+
+def make_session(concurrency):
+    """ One session for every worker, with a connection pool as large as the worker pool. """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def download(session, url, filename, retries=3, backoff=0.5, timeout=30):
+    """
+    Stream url into a temporary upload file, retrying transient failures
+    with exponential backoff. Returns the TemporaryUploadedFile; raises
+    DownloadError once the attempts are used up or on a permanent error.
+    """
+    for attempt in range(retries + 1):
+        upload = TemporaryUploadedFile(filename, 'image/jpeg', 0, None)
+        try:
+            with session.get(url, stream=True, timeout=timeout) as response:
+                if response.status_code in RETRY_STATUSES:
+                    raise requests.HTTPError(f'{response.status_code} {response.reason}', response=response)
+                if response.status_code >= 400:
+                    raise DownloadError(f'{response.status_code} {response.reason}')
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    upload.write(chunk)
+            upload.size = upload.tell()
+            upload.seek(0)
+            return upload
+        except DownloadError:
+            upload.close()
+            raise
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+                requests.exceptions.ChunkedEncodingError) as exc:
+            upload.close()
+            if attempt == retries:
+                raise DownloadError(f'{exc} (after {attempt + 1} attempts)') from exc
+            time.sleep(backoff * 2 ** attempt)
+
+
 class Command(BaseCommand):
     help = 'Retrieve and store all UXCanvas images from the project'
 
@@ -24,181 +172,133 @@ class Command(BaseCommand):
             default=1,
             help='User ID to associate images with'
         )
+        parser.add_argument('--base-url', default=BASE_URL, help='URL the image IDs are appended to')
+        parser.add_argument('--concurrency', type=int, default=8, help='Parallel downloads (default: 8)')
+        parser.add_argument('--retries', type=int, default=3,
+                            help='Retries of a failed download, with exponential backoff (default: 3)')
+        parser.add_argument('--backoff', type=float, default=0.5,
+                            help='Delay before the first retry in seconds, doubled each time (default: 0.5)')
+        parser.add_argument('--timeout', type=float, default=30, help='Connect/read timeout in seconds (default: 30)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Assets written per bulk insert (default: 100)')
 
     def handle(self, *args, **options):
         project_id = options['project_id']
         user_id = options['user_id']
-        
-        # Get or create project and user
+
+        try:
+            user = User.objects.get(id=user_id)
+        except User.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f"User with ID {user_id} does not exist"))
+            return
+
         try:
             project = Project.objects.get(name=project_id)
         except Project.DoesNotExist:
             project = Project.objects.create(
                 name=project_id,
                 description=f"Project for {project_id}",
-                owner_id=user_id
+                owner=user
             )
             self.stdout.write(f"Created project: {project.name}")
-        
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            self.stdout.write(self.style.ERROR(f"User with ID {user_id} does not exist"))
-            return
 
-        # List of all image IDs found in the codebase
-        image_ids = [
-            "0512db2b-5daa-41bb-90a0-8e27b8bffda4",
-            "06f886da-acfd-49c5-9760-a2b6a4ca6ba2",
-            "0814ddea-9e48-4cf7-8a42-f5492e25e29e",
-            "10d7be19-25e9-4016-bc21-49e68c58235f",
-            "17cb73a0-39ab-44c4-8e9b-b65251334a1c",
-            "1886799b-8f1b-4f02-a1d5-b440f5b423fd",
-            "29ad8926-c761-4955-a819-a0623dfe5a5f",
-            "2dd9723a-dbe0-4dc2-b6ec-84fc1f997217",
-            "3101fea8-ddec-455e-b08f-60475173808c",
-            "39fc2bcc-f68b-4af6-bab7-0f3b12821587",
-            "3fcbec4c-ad53-46cc-af64-70b407a807ef",
-            "49440c97-cbcd-45cd-acf2-11a20883b0bf",
-            "4c9119c6-1ee5-456c-b3c8-e432554d08c2",
-            "4d9249a6-f789-4e57-ac62-0c1e4e93cd21",
-            "5e96ff52-009e-46da-8be8-d6f4173ee351",
-            "66918ab4-4141-4dbe-ad2a-5d5bbb3d5d4c",
-            "6c2cc018-592b-45f6-9fa0-8c76a58218d0",
-            "77ab4ba2-0910-4565-b16d-f5a31131e46c",
-            "7d9420b6-06ca-444f-b92f-d384af497569",
-            "81637319-b931-485b-ae5c-180e1de4e865",
-            "84d03d96-161a-45af-8fa7-fbbf61cbce83",
-            "8efa7049-fbc0-4bb8-86a7-be949557395c",
-            "947f5f83-17ea-4727-8bcc-8e40fb166ef6",
-            "9cc0411d-5654-4328-b402-47e45b008826",
-            "a0172859-2b18-486c-bb68-413b09816d98",
-            "acb76dcd-8e07-46af-bd09-ff8646e148d1",
-            "b4a093f2-6333-48c3-8174-2abf1b905d7f",
-            "b7e6f3ab-1a4b-4554-9b56-4f31a4ec28bc",
-            "b9405540-c37f-4f64-9e28-7f6076a0ef62",
-            "bc0e4a4a-101f-4d8a-8238-dbedd4fd1662",
-            "c0edf762-08ec-45d7-bb29-62663a067000",
-            "cc5e58cc-e0b6-4fbb-8211-c37a3f742558",
-            "ceefd621-be9f-4105-b053-e14f9e49e546",
-            "cf7f8f23-cdce-4d24-97fc-8979015c691f",
-            "e3ea5a11-f0f9-4541-839e-054ca2a5e97d",
-            "e790c7be-94f3-4fcb-a7d9-a800893c8f9c",
-            "f5269a71-cf2f-46ca-916b-1655f95f2d85"
-        ]
+        # One query for what is already imported; the first image of a repeated name wins
+        names = {IMAGE_METADATA[image_id]["name"] for image_id in IMAGE_IDS}
+        taken = set(Asset.objects.filter(project=project, name__in=names).values_list('name', flat=True))
+        pending = []
+        skipped = 0
+        for image_id in IMAGE_IDS:
+            name = IMAGE_METADATA[image_id]["name"]
+            if name in taken:
+                skipped += 1
+                self.stdout.write(f"Skipping existing asset: {name}")
+                continue
+            taken.add(name)
+            pending.append(image_id)
 
-        # Image metadata mapping based on usage patterns
-        image_metadata = {
-            "0512db2b-5daa-41bb-90a0-8e27b8bffda4": {"name": "Hover Vehicle", "type": "Vehicle", "category": "Transportation"},
-            "06f886da-acfd-49c5-9760-a2b6a4ca6ba2": {"name": "Neon City Environment", "type": "Environment", "category": "Urban"},
-            "0814ddea-9e48-4cf7-8a42-f5492e25e29e": {"name": "Animated Prop", "type": "Prop", "category": "Interactive"},
-            "10d7be19-25e9-4016-bc21-49e68c58235f": {"name": "Ocean Floor Environment", "type": "Environment", "category": "Underwater"},
-            "17cb73a0-39ab-44c4-8e9b-b65251334a1c": {"name": "Space Station Interior", "type": "Environment", "category": "Space"},
-            "1886799b-8f1b-4f02-a1d5-b440f5b423fd": {"name": "Cyberpunk City Scene", "type": "Scene", "category": "Establishing Shot"},
-            "29ad8926-c761-4955-a819-a0623dfe5a5f": {"name": "Generic Prop", "type": "Prop", "category": "General"},
-            "2dd9723a-dbe0-4dc2-b6ec-84fc1f997217": {"name": "Storyboard Frame", "type": "Storyboard", "category": "Previsualization"},
-            "3101fea8-ddec-455e-b08f-60475173808c": {"name": "Space Odyssey Background", "type": "Environment", "category": "Space"},
-            "39fc2bcc-f68b-4af6-bab7-0f3b12821587": {"name": "Deep Space Environment", "type": "Environment", "category": "Space"},
-            "3fcbec4c-ad53-46cc-af64-70b407a807ef": {"name": "Animated Character", "type": "Character", "category": "Animated"},
-            "49440c97-cbcd-45cd-acf2-11a20883b0bf": {"name": "Ocean Depths Background", "type": "Environment", "category": "Underwater"},
-            "4c9119c6-1ee5-456c-b3c8-e432554d08c2": {"name": "Cyber Nexus Background", "type": "Environment", "category": "Cyberpunk"},
-            "4d9249a6-f789-4e57-ac62-0c1e4e93cd21": {"name": "Advanced Prop", "type": "Prop", "category": "Technology"},
-            "5e96ff52-009e-46da-8be8-d6f4173ee351": {"name": "Animated Environment", "type": "Environment", "category": "Animated"},
-            "66918ab4-4141-4dbe-ad2a-5d5bbb3d5d4c": {"name": "Animated Weapon", "type": "Prop", "category": "Weapon"},
-            "6c2cc018-592b-45f6-9fa0-8c76a58218d0": {"name": "Futuristic Prop", "type": "Prop", "category": "Technology"},
-            "77ab4ba2-0910-4565-b16d-f5a31131e46c": {"name": "Character Portrait", "type": "Character", "category": "Portrait"},
-            "7d9420b6-06ca-444f-b92f-d384af497569": {"name": "Animated Vehicle", "type": "Vehicle", "category": "Animated"},
-            "81637319-b931-485b-ae5c-180e1de4e865": {"name": "Cyber Character", "type": "Character", "category": "Cyberpunk"},
-            "84d03d96-161a-45af-8fa7-fbbf61cbce83": {"name": "Space Character", "type": "Character", "category": "Space"},
-            "8efa7049-fbc0-4bb8-86a7-be949557395c": {"name": "Ocean Character", "type": "Character", "category": "Underwater"},
-            "947f5f83-17ea-4727-8bcc-8e40fb166ef6": {"name": "Generic Character", "type": "Character", "category": "General"},
-            "9cc0411d-5654-4328-b402-47e45b008826": {"name": "Advanced Character", "type": "Character", "category": "Technology"},
-            "a0172859-2b18-486c-bb68-413b09816d98": {"name": "Generic Environment", "type": "Environment", "category": "General"},
-            "acb76dcd-8e07-46af-bd09-ff8646e148d1": {"name": "Specialized Prop", "type": "Prop", "category": "Specialized"},
-            "b4a093f2-6333-48c3-8174-2abf1b905d7f": {"name": "Laser Weapon", "type": "Prop", "category": "Weapon"},
-            "b7e6f3ab-1a4b-4554-9b56-4f31a4ec28bc": {"name": "Animated Environment", "type": "Environment", "category": "Animated"},
-            "b9405540-c37f-4f64-9e28-7f6076a0ef62": {"name": "Specialized Character", "type": "Character", "category": "Specialized"},
-            "bc0e4a4a-101f-4d8a-8238-dbedd4fd1662": {"name": "Advanced Vehicle", "type": "Vehicle", "category": "Technology"},
-            "c0edf762-08ec-45d7-bb29-62663a067000": {"name": "Futuristic Vehicle", "type": "Vehicle", "category": "Technology"},
-            "cc5e58cc-e0b6-4fbb-8211-c37a3f742558": {"name": "Cyber Suit Character", "type": "Character", "category": "Cyberpunk"},
-            "ceefd621-be9f-4105-b053-e14f9e49e546": {"name": "Unique Prop", "type": "Prop", "category": "Unique"},
-            "cf7f8f23-cdce-4d24-97fc-8979015c691f": {"name": "Animated Character", "type": "Character", "category": "Animated"},
-            "e3ea5a11-f0f9-4541-839e-054ca2a5e97d": {"name": "Energy Shield", "type": "Prop", "category": "Defense"},
-            "e790c7be-94f3-4fcb-a7d9-a800893c8f9c": {"name": "Space Prop", "type": "Prop", "category": "Space"},
-            "f5269a71-cf2f-46ca-916b-1655f95f2d85": {"name": "Advanced Prop", "type": "Prop", "category": "Technology"}
-        }
-
-        base_url = "https://uxcanvas.ai/api/generated-images/d4dc8c64-5e7b-4927-853b-1ce5a65cd255"
-        
-        success_count = 0
-        error_count = 0
-        
-        for image_id in image_ids:
-            try:
-                # Check if asset already exists
-                existing_asset = Asset.objects.filter(
-                    name=image_metadata[image_id]["name"],
-                    project=project
-                ).first()
-                
-                if existing_asset:
-                    self.stdout.write(f"Skipping existing asset: {image_metadata[image_id]['name']}")
+        started = time.monotonic()
+        self.created_assets = []
+        self.received_bytes = 0
+        errors = 0
+        batch = []
+        base_url = options['base_url'].rstrip('/')
+        concurrency = max(1, options['concurrency'])
+        with make_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {
+                pool.submit(download, session, f"{base_url}/{image_id}", f"{image_id}.jpg",
+                            options['retries'], options['backoff'], options['timeout']): image_id
+                for image_id in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                image_id = futures[future]
+                try:
+                    upload = future.result()
+                except DownloadError as e:
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(f"[{done}/{len(pending)}] Failed to download {image_id}: {e}"))
                     continue
-                
-                # Download image
-                image_url = f"{base_url}/{image_id}"
-                response = requests.get(image_url, timeout=30)
-                response.raise_for_status()
-                
-                # Create asset
-                asset = Asset.objects.create(
-                    name=image_metadata[image_id]["name"],
-                    description=f"UXCanvas generated image: {image_metadata[image_id]['name']}",
-                    asset_type='image',
-                    status='completed',
-                    owner=user,
-                    project=project,
-                    categories=image_metadata[image_id]["category"],
-                    ai_enhanced=True
-                )
-                
-                # Save the image file
-                image_content = ContentFile(response.content)
-                asset.file.save(
-                    f"{image_id}.jpg",
-                    image_content,
-                    save=True
-                )
-                
-                # Create thumbnail (same as main image for now)
-                asset.thumbnail.save(
-                    f"{image_id}_thumb.jpg",
-                    image_content,
-                    save=True
-                )
-                
-                asset.is_rendered = True
-                asset.save()
-                
-                success_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f"Successfully created asset: {asset.name}")
-                )
-                
-            except requests.RequestException as e:
-                error_count += 1
-                self.stdout.write(
-                    self.style.ERROR(f"Failed to download {image_id}: {str(e)}")
-                )
-            except Exception as e:
-                error_count += 1
-                self.stdout.write(
-                    self.style.ERROR(f"Failed to create asset for {image_id}: {str(e)}")
-                )
-        
+                self.received_bytes += upload.size
+                batch.append((image_id, upload))
+                self.stdout.write(f"[{done}/{len(pending)}] Downloaded {IMAGE_METADATA[image_id]['name']} "
+                                  f"({upload.size} bytes)")
+                if len(batch) >= options['batch_size']:
+                    errors += self.create_assets(batch, project, user)
+                    batch = []
+        errors += self.create_assets(batch, project, user)
+
+        # Thumbnails for the whole batch, decoded in a process pool
+        thumbnailed = thumbnails.generate_for_assets(self.created_assets)
+        self.stdout.write(f"Generated thumbnails for {thumbnailed} images")
+
+        elapsed = time.monotonic() - started
+        megabytes = self.received_bytes / 1024 ** 2
         self.stdout.write(
             self.style.SUCCESS(
-                f"\nCompleted! Successfully processed {success_count} images, "
-                f"{error_count} errors occurred."
+                f"\nCompleted! Successfully processed {len(self.created_assets)} images, "
+                f"{skipped} skipped, {errors} errors occurred. "
+                f"Downloaded {megabytes:.1f} MB in {elapsed:.1f}s ({megabytes / max(elapsed, 1e-6):.1f} MB/s)."
             )
         )
+
+    def create_assets(self, batch, project, user):
+        """ Move a batch of downloads into storage and insert their assets at once. Returns the error count. """
+        if not batch:
+            return 0
+        field = Asset._meta.get_field('file')
+        stored = []
+        for image_id, upload in batch:
+            # The storage moves the temporary file into place instead of copying it
+            stored.append((image_id, field.storage.save(field.generate_filename(None, upload.name), upload)))
+            upload.close()
+
+        assets = [
+            Asset(
+                name=IMAGE_METADATA[image_id]["name"],
+                description=f"UXCanvas generated image: {IMAGE_METADATA[image_id]['name']}",
+                asset_type='image',
+                status='completed',
+                owner=user,
+                project=project,
+                categories=IMAGE_METADATA[image_id]["category"],
+                ai_enhanced=True,
+                is_rendered=True,
+                file=name,
+            )
+            for image_id, name in stored
+        ]
+        try:
+            with transaction.atomic():
+                Asset.objects.bulk_create(assets)
+                # bulk_create sends no post_save, so invalidate the cached listings here
+                response_cache.bump(*response_cache.asset_scopes(user.pk, project.pk, None))
+        except Exception as e:
+            for _, name in stored:
+                field.storage.delete(name)
+            self.stdout.write(self.style.ERROR(f"Failed to create {len(assets)} assets: {e}"))
+            return len(assets)
+
+        # Re-read to get primary keys on every backend
+        created = list(Asset.objects.filter(project=project, name__in=[a.name for a in assets]))
+        self.created_assets.extend(created)
+        for asset in created:
+            self.stdout.write(self.style.SUCCESS(f"Successfully created asset: {asset.name}"))
+        return 0
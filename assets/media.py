@@ -0,0 +1,173 @@
+""" Streaming file responses for asset media.
+
+Files are never read whole into memory: full responses use FileResponse,
+which the WSGI server can turn into sendfile(), and byte ranges are
+streamed in blocks with a 206 response. With ASSET_MEDIA_ACCEL set, the
+transfer is handed off to the front proxy once the view has checked
+ownership:
+
+    ASSET_MEDIA_ACCEL = 'nginx'      # X-Accel-Redirect: <ASSET_MEDIA_ACCEL_PREFIX><name>
+    ASSET_MEDIA_ACCEL = 'sendfile'   # X-Sendfile: <absolute path> (Apache, lighttpd)
+
+Every response carries a strong ETag (the content hash for blob-store
+files, size + mtime otherwise) and Last-Modified, both taken from a stat
+of the file, so If-None-Match / If-Modified-Since are answered with 304
+without opening it. URLs whose content can never change (version files,
+or asset media URLs carrying the asset's current ``v`` token, checked by
+the view) are marked immutable.
+"""
+
+import mimetypes
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+from versions.storage import digest_from_name
+
+BLOCK_SIZE = 64 * 1024
+# Cache-Control for URLs whose content never changes
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+# Cache-Control for URLs that may serve new content later: revalidate each time
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """ Raised for a Range header that selects no byte of the file. """
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single-range Range header, or None
+    when the whole file should be sent (no header, multiple ranges or a
+    syntax we do not handle, as RFC 9110 allows).
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def file_validators(field_file):
+    """ Return (size, last-modified timestamp, strong ETag) from a stat of field_file. """
+    storage = field_file.storage
+    size = storage.size(field_file.name)
+    mtime = storage.get_modified_time(field_file.name).timestamp()
+    digest = digest_from_name(field_file.name)
+    if digest:
+        etag = f'"{digest}"'
+    else:
+        etag = f'"{size:x}-{int(mtime * 1_000_000):x}"'
+    return size, int(mtime), etag
+
+
+def _range_applies(request, etag, modified):
+    """ Honour If-Range: only serve a partial response for an unchanged file. """
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return if_range == http_date(modified)
+
+
+def _iter_range(f, start, length):
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        f.close()
+
+
+def _accel_response(field_file, content_type):
+    mode = getattr(settings, 'ASSET_MEDIA_ACCEL', None)
+    if mode == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'ASSET_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + field_file.name.lstrip('/')
+        return response
+    if mode == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+        return response
+    return None
+
+
+def serve_file(request, field_file, filename, default_content_type='application/octet-stream',
+               immutable=False):
+    """
+    Return a streaming response for field_file (a FieldFile), honouring
+    conditional requests and a single byte Range. filename is used for
+    Content-Disposition and to guess the content type. Pass immutable=True
+    when the URL always designates the same content.
+    """
+    if not field_file:
+        raise Http404("File not found")
+    try:
+        size, modified, etag = file_validators(field_file)
+    except FileNotFoundError:
+        raise Http404("File not found")
+
+    response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is None:
+        response = _file_response(request, field_file, filename, default_content_type, size, modified, etag)
+
+    if response.status_code != 416:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    return response
+
+
+def _file_response(request, field_file, filename, default_content_type, size, modified, etag):
+    content_type = (mimetypes.guess_type(field_file.name)[0]
+                    or mimetypes.guess_type(filename)[0]
+                    or default_content_type)
+
+    response = _accel_response(field_file, content_type)
+    if response is None:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None and not _range_applies(request, etag, modified):
+            byte_range = None
+
+        f = field_file.storage.open(field_file.name, 'rb')
+        if byte_range is None:
+            response = FileResponse(f, content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_iter_range(f, start, end - start + 1),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    return response
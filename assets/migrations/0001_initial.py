@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Asset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('asset_type', models.CharField(choices=[('image', 'Image'), ('video', 'Video'), ('document', 'Document'), ('geometry', 'Geometry')], default='image', max_length=20)),
+                ('file', models.FileField(blank=True, null=True, upload_to='assets/')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rendered_image', models.ImageField(blank=True, null=True, upload_to='rendered_images/')),
+                ('thumbnail', models.ImageField(blank=True, null=True, upload_to='thumbnails/')),
+                ('is_rendered', models.BooleanField(default=False)),
+                ('categories', models.CharField(blank=True, max_length=255)),
+                ('ai_enhanced', models.BooleanField(default=False)),
+                ('render_result', models.FileField(blank=True, null=True, upload_to='renders/')),
+                ('ai_data', models.JSONField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploaded_assets', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assets', to='projects.project')),
+            ],
+        ),
+    ]
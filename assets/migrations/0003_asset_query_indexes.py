@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_names(apps, schema_editor):
+    """ Suffix later duplicates of a (project, name) pair with their id so the constraint applies. """
+    Asset = apps.get_model('assets', 'Asset')
+    duplicates = (Asset.objects.values('project_id', 'name')
+                  .annotate(n=Count('id')).filter(n__gt=1))
+    for dup in duplicates:
+        assets = Asset.objects.filter(project_id=dup['project_id'], name=dup['name']).order_by('id')
+        for asset in assets[1:]:
+            suffix = f' ({asset.id})'
+            asset.name = asset.name[:100 - len(suffix)] + suffix
+            asset.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0002_asset_uploads_and_versioning'),
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['owner', 'project', 'asset_type', 'name'], name='asset_owner_proj_type_name'),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['owner', 'project', 'name'], name='asset_owner_proj_name'),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['owner', 'name'], name='asset_owner_name'),
+        ),
+        migrations.RunPython(rename_duplicate_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='asset',
+            constraint=models.UniqueConstraint(fields=('project', 'name'), name='asset_unique_project_name'),
+        ),
+    ]
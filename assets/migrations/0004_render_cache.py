@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0003_asset_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderCacheEntry',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('renderer', models.CharField(max_length=100)),
+                ('source_sha256', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('rendering', 'Rendering'), ('ready', 'Ready')], default='rendering', max_length=16)),
+                ('file', models.FileField(blank=True, upload_to='render_cache/')),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('renders', models.PositiveIntegerField(default=0)),
+                ('last_used', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'last_used'], name='render_cache_status_lru')],
+            },
+        ),
+    ]
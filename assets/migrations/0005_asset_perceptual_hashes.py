@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0004_render_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='ahash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='dhash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='phash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
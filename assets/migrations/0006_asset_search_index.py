@@ -0,0 +1,26 @@
+# SQLite FTS5 search index over assets, versions and comments (see assets/search.py)
+
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from assets import search
+
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from assets import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('assets', '0005_asset_perceptual_hashes'),
+        ('versions', '0003_version_processing'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0006_asset_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('committed', 'Committed'), ('aborted', 'Aborted'), ('expired', 'Expired')], default='active', max_length=20),
+        ),
+    ]
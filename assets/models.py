@@ -1,6 +1,11 @@
+import uuid
+
 from django.db import models
+from django.db.models import Case, F, Max, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.conf import settings  # For referencing the custom user model
 from projects.models import Project  # To establish a relationship with the Project model
+from versions.models import Version
 
 
 try:
@@ -12,6 +17,39 @@ except AttributeError:
     JSONField = None
 
 
+class AssetManager(models.Manager):
+    """ Manager for Asset, with atomic allocation of version numbers. """
+
+    def allocate_version_numbers(self, counts):
+        """
+        Reserve counts[asset_id] consecutive version numbers for each asset and
+        return {asset_id: first number}, with one UPDATE and one SELECT.
+
+        Call inside transaction.atomic() together with the Version inserts: the
+        UPDATE locks the counter rows until commit, so concurrent uploads to the
+        same asset queue up instead of colliding, and a failed insert rolls the
+        counter back (no gaps).
+        """
+        if not counts:
+            return {}
+        # A counter of 0 is either a new asset or one with versions created
+        # before the counter existed: start from its highest version number.
+        latest = Version.objects.filter(asset=OuterRef('pk')).values('asset').annotate(n=Max('number')).values('n')
+        counter = models.PositiveIntegerField()
+        current = Case(
+            When(version_counter=0, then=Coalesce(Subquery(latest), Value(0), output_field=counter)),
+            default=F('version_counter'),
+            output_field=counter,
+        )
+        self.filter(pk__in=counts).update(version_counter=Case(
+            *[When(pk=asset_id, then=current + Value(n)) for asset_id, n in counts.items()],
+            default=F('version_counter'),
+            output_field=counter,
+        ))
+        allocated = self.filter(pk__in=counts).values_list('pk', 'version_counter')
+        return {asset_id: last - counts[asset_id] + 1 for asset_id, last in allocated}
+
+
 class Asset(models.Model):
     """ Choices for asset type """
     ASSET_TYPES = [
@@ -53,6 +91,9 @@ class Asset(models.Model):
         default='pending',
     )
 
+    # Highest version number allocated so far (see AssetManager.allocate_version_numbers)
+    version_counter = models.PositiveIntegerField(default=0)
+
     # Relationships
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -75,6 +116,11 @@ class Asset(models.Model):
     rendered_image = models.ImageField(upload_to='rendered_images/', null=True, blank=True)
     # Stores thumbnail
     thumbnail = models.ImageField(upload_to='thumbnails/', null=True, blank=True)
+    # Every generated thumbnail: {"<size>": {"width": .., "height": .., "jpg"|"png"|"webp": name}}
+    if JSONField is not None:
+        thumbnails = JSONField(null=True, blank=True)
+    else:
+        thumbnails = models.TextField(null=True, blank=True)
     # Tracks whether rendering is complete
     is_rendered = models.BooleanField(default=False)
     # AI-determined categories for the asset
@@ -93,8 +139,117 @@ class Asset(models.Model):
         # Fallback to TextField if JSONField is unavailable
         ai_data = models.TextField(null=True, blank=True)
 
+    # Perceptual hashes of images, as signed 64-bit integers (see assets/phash.py)
+    ahash = models.BigIntegerField(null=True, blank=True)
+    dhash = models.BigIntegerField(null=True, blank=True)
+    phash = models.BigIntegerField(null=True, blank=True)
+
+    objects = AssetManager()
+
+    class Meta:
+        """ Meta class """
+        constraints = [
+            # Backs the (project, name) lookup of get_or_create and makes it race-safe
+            models.UniqueConstraint(fields=['project', 'name'], name='asset_unique_project_name'),
+        ]
+        indexes = [
+            # list_project_images and sprite pages: owner + project + type, by name
+            models.Index(fields=['owner', 'project', 'asset_type', 'name'], name='asset_owner_proj_type_name'),
+            # AssetListView: owner (+ project), by name
+            models.Index(fields=['owner', 'project', 'name'], name='asset_owner_proj_name'),
+            models.Index(fields=['owner', 'name'], name='asset_owner_name'),
+        ]
 
     # Representation
     def __str__(self):
         """ Returns the asset's name when printed or displayed """
         return str(self.name)
+
+
+class UploadSession(models.Model):
+    """ A chunked upload in progress; it becomes a Version on commit. """
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('committed', 'Committed'),
+        ('aborted', 'Aborted'),
+        ('expired', 'Expired'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    # Set for a version-up; otherwise the asset is found/created by name on commit
+    asset = models.ForeignKey(
+        Asset,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='upload_sessions'
+    )
+
+    # Asset fields used when the asset is created on commit
+    name = models.CharField(max_length=100, blank=True)
+    asset_type = models.CharField(max_length=20, blank=True)
+    description = models.TextField(blank=True)
+
+    # Version fields applied on commit
+    version_description = models.TextField(blank=True)
+    version_status = models.CharField(max_length=32, blank=True)
+
+    # Original file name and expected size (optional) announced at init
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField(null=True, blank=True)
+    # Number of bytes acknowledged so far; clients resume from here
+    offset = models.PositiveBigIntegerField(default=0)
+    # SHA-256 of the file, set on commit
+    checksum = models.CharField(max_length=64, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset} bytes)"
+
+
+class RenderCacheEntry(models.Model):
+    """
+    A render result stored once per (source content, renderer, parameters);
+    see assets/render_cache.py. A 'rendering' row is the claim of the worker
+    producing it, so concurrent renders of the same key run once.
+    """
+    STATUS_CHOICES = [
+        ('rendering', 'Rendering'),
+        ('ready', 'Ready'),
+    ]
+
+    # sha256 of (source sha256, renderer id, parameter hash)
+    key = models.CharField(max_length=64, primary_key=True)
+    renderer = models.CharField(max_length=100)
+    source_sha256 = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='rendering')
+    file = models.FileField(upload_to='render_cache/', blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    # Lookups served from this entry, and renders that produced it
+    hits = models.PositiveIntegerField(default=0)
+    renders = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """ Meta class """
+        indexes = [
+            # LRU eviction walks ready entries by last use
+            models.Index(fields=['status', 'last_used'], name='render_cache_status_lru'),
+        ]
+
+    def __str__(self):
+        return f"{self.renderer} {self.key[:12]}"
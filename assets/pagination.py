@@ -0,0 +1,122 @@
+""" Keyset (cursor) pagination for asset listings.
+
+Pages are selected with a WHERE on the ordering keys of the last row seen
+instead of an OFFSET, so a deep page costs the same as the first one, and
+no COUNT(*) is issued. Cursors are opaque base64-encoded JSON.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique ordering (the last key should be the pk).
+    Query parameters: cursor (opaque) and page_size (capped at max_page_size).
+    """
+    ordering = ('name', 'id')
+    page_size = 100
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values, reverse = data['v'], bool(data.get('r'))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, values, reverse):
+        data = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(data.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _key(self, item):
+        values = []
+        for field in self.ordering:
+            value = item[field.lstrip('-')] if isinstance(item, dict) else getattr(item, field.lstrip('-'))
+            values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+        return values
+
+    def _after(self, values, reverse):
+        """ Q selecting rows strictly after values in the (possibly reversed) ordering. """
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            equal = {f.lstrip('-'): v for f, v in zip(self.ordering[:i], values[:i])}
+            equal[f"{name}__{'lt' if descending else 'gt'}"] = values[i]
+            clauses.append(Q(**equal))
+        return reduce(or_, clauses)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+
+        order = [(f[1:] if f.startswith('-') else '-' + f) if reverse else f for f in self.ordering]
+        queryset = queryset.order_by(*order)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+
+        # One extra row tells whether there is a further page
+        rows = list(queryset[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+
+        # Walking backwards, the page we came from is always there; walking
+        # forwards, so is the one before, unless this is the first page
+        has_next = has_more if not reverse else values is not None
+        has_previous = has_more if reverse else values is not None
+
+        self.base_url = remove_query_param(self.base_url, self.cursor_query_param)
+        self.next_link = self.previous_link = None
+        if rows and has_next:
+            self.next_link = self.encode_cursor(self._key(rows[-1]), False)
+        if rows and has_previous:
+            self.previous_link = self.encode_cursor(self._key(rows[0]), True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_link,
+            'previous': self.previous_link,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,207 @@
+""" Perceptual hashes and near-duplicate search for image assets.
+
+Three 64-bit hashes are computed per image (see compute):
+
+- ahash: 8x8 greyscale thumbnail, bit set where brighter than the mean
+- dhash: 9x8 thumbnail, bit set where brighter than the right neighbour
+- phash: low 8x8 frequencies of the DCT of a 32x32 thumbnail, bit set where
+  above their median; the most robust to scaling, compression and grading
+
+They are stored on Asset as signed 64-bit integers (to_signed). Near
+duplicates are images whose hashes differ in few bits (Hamming distance).
+Each process keeps a BK-tree per (project, algorithm), which answers
+"everything within distance k" by visiting only the subtrees the triangle
+inequality allows instead of every image. The trees are rebuilt when the
+project's hash generation, kept in the shared response cache and bumped
+only when hashes are written (store, hash_assets), changes.
+"""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from stratopipe import response_cache
+
+from .models import Asset
+
+ALGORITHMS = ('ahash', 'dhash', 'phash')
+DEFAULT_ALGORITHM = 'phash'
+HASH_BITS = 64
+# Hamming distance up to which two images are reported as near duplicates
+DEFAULT_DISTANCE = 6
+
+_DCT_SIZE = 32
+# DCT-II basis: dct(x) = _DCT @ x @ _DCT.T
+_DCT = np.cos(np.pi * np.outer(np.arange(_DCT_SIZE), 2 * np.arange(_DCT_SIZE) + 1) / (2 * _DCT_SIZE))
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def _grey(img, size):
+    return np.asarray(img.resize(size, Image.LANCZOS), dtype=np.float64)
+
+
+def compute(source_path):
+    """ Return {'ahash', 'dhash', 'phash'} of an image as unsigned 64-bit integers. """
+    with Image.open(source_path) as img:
+        img.draft('L', (_DCT_SIZE * 2, _DCT_SIZE * 2))
+        img = ImageOps.exif_transpose(img).convert('L')
+        small = _grey(img, (8, 8))
+        wide = _grey(img, (9, 8))
+        dct = _DCT @ _grey(img, (_DCT_SIZE, _DCT_SIZE)) @ _DCT.T
+    low = dct[:8, :8]
+    # The DC term only carries the average brightness
+    median = np.median(low.ravel()[1:])
+    return {
+        'ahash': _bits_to_int(small > small.mean()),
+        'dhash': _bits_to_int(wide[:, :-1] > wide[:, 1:]),
+        'phash': _bits_to_int(low > median),
+    }
+
+
+def _compute_or_none(source_path):
+    try:
+        return compute(source_path)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def to_signed(value):
+    """ Map an unsigned 64-bit hash to the range of a BigIntegerField. """
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """ Burkhard-Keller tree of unsigned hashes under the Hamming distance. """
+
+    def __init__(self):
+        # node: [hash, items with that hash, {distance: child node}]
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = distance(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, k):
+        """ Return [(distance, item)] of every item within distance k, closest first. """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = distance(value, node[0])
+            if d <= k:
+                found.extend((d, item) for item in node[1])
+            # Triangle inequality: matches can only be under children at d-k..d+k
+            stack.extend(child for edge, child in node[2].items() if d - k <= edge <= d + k)
+        return sorted(found, key=lambda match: match[0])
+
+
+# (project id, algorithm) -> (hash generation, BKTree)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_scope(project_id):
+    """ Response cache scope whose generation changes when hashes of the project are written. """
+    return ('phash', project_id)
+
+
+def project_index(project_id, algorithm=DEFAULT_ALGORITHM):
+    """ Return the BK-tree of a project's hashed images, item = asset id. """
+    (generation,) = response_cache.generations([index_scope(project_id)])
+    key = (project_id, algorithm)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    tree = BKTree()
+    hashes = Asset.objects.filter(
+        project_id=project_id, asset_type='image', **{f'{algorithm}__isnull': False},
+    ).values_list('pk', algorithm)
+    for pk, value in hashes.iterator():
+        tree.add(to_unsigned(value), pk)
+    with _indexes_lock:
+        _indexes[key] = (generation, tree)
+    return tree
+
+
+def clusters(project_id, k=DEFAULT_DISTANCE, algorithm=DEFAULT_ALGORITHM):
+    """ Return the groups of near-duplicate asset ids of a project (single linkage), largest first. """
+    tree = project_index(project_id, algorithm)
+    hashes = dict(Asset.objects.filter(project_id=project_id, asset_type='image', **{
+        f'{algorithm}__isnull': False,
+    }).values_list('pk', algorithm))
+    parent = {pk: pk for pk in hashes}
+
+    def root(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    for pk, value in hashes.items():
+        for _, other in tree.search(to_unsigned(value), k):
+            if other in parent:
+                parent[root(other)] = root(pk)
+
+    groups = {}
+    for pk in hashes:
+        groups.setdefault(root(pk), []).append(pk)
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
+
+
+def _save(asset, hashes):
+    for algorithm in ALGORITHMS:
+        setattr(asset, algorithm, to_signed(hashes[algorithm]))
+    # Not updated_at: the hashes do not change what clients display
+    asset.save(update_fields=list(ALGORITHMS))
+
+
+def store(asset, hashes):
+    """ Save unsigned hashes (see compute) on asset. """
+    _save(asset, hashes)
+    response_cache.bump(index_scope(asset.project_id))
+
+
+def hash_assets(assets, paths, workers=1):
+    """ Hash many image assets (paths: their source files) in a process pool; returns the number hashed. """
+    workers = min(workers, len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            computed = list(pool.map(_compute_or_none, paths, chunksize=max(1, len(paths) // (workers * 4))))
+    else:
+        computed = [_compute_or_none(path) for path in paths]
+    projects = set()
+    for asset, hashes in zip(assets, computed):
+        if hashes is not None:
+            _save(asset, hashes)
+            projects.add(asset.project_id)
+    response_cache.bump(*(index_scope(project_id) for project_id in projects))
+    return sum(hashes is not None for hashes in computed)
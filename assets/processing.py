@@ -0,0 +1,170 @@
+""" Processing pipeline run on every new asset version.
+
+Processors are registered per asset type (see Asset.ASSET_TYPES) and per
+stage. The processors of a stage run in parallel (a Celery chord) and the
+stages run one after the other, so e.g. thumbnails and metadata are
+extracted together before the classification that may use them:
+
+    @register('thumbnail', ['image'], stage=0)
+    def make_thumbnails(version): ...
+
+A processor receives the Version and returns a JSON-serializable result
+(or None), stored under its name in Version.processing_results. A processor
+that raises is recorded as {'error': ...} and marks the version 'failed'
+without stopping the other processors. All writes use update_fields (or
+QuerySet.update), so concurrent processors never overwrite each other.
+"""
+
+import logging
+import mimetypes
+
+from celery import chain, chord
+from django.db import transaction
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from PIL import Image
+
+from . import analysis, embeddings, phash, progress, render_cache, thumbnails
+from .models import Asset
+
+logger = logging.getLogger(__name__)
+
+ALL_TYPES = [asset_type for asset_type, _ in Asset.ASSET_TYPES]
+
+# name -> processor function
+_processors = {}
+# asset type -> {stage: [processor names]}
+_stages = {}
+
+
+def register(name, asset_types=ALL_TYPES, stage=0):
+    """ Decorator registering a processor for asset_types at stage. """
+    def decorator(func):
+        _processors[name] = func
+        for asset_type in asset_types:
+            names = _stages.setdefault(asset_type, {}).setdefault(stage, [])
+            if name not in names:
+                names.append(name)
+        return func
+    return decorator
+
+
+def get_processor(name):
+    return _processors[name]
+
+
+def stages_for(asset_type):
+    """ Return the processor names to run for asset_type, as a list of stages. """
+    stages = _stages.get(asset_type, {})
+    return [stages[stage] for stage in sorted(stages) if stages[stage]]
+
+
+def pipeline(version):
+    """ Return the Celery canvas processing version. """
+    from .tasks import finish_processing, record_stage, run_processor, start_processing
+
+    stages = stages_for(version.asset.asset_type)
+    total = sum(len(names) for names in stages)
+    done = 0
+    steps = [start_processing.si(str(version.pk))]
+    for names in stages:
+        done += len(names)
+        header = [run_processor.si(str(version.pk), name) for name in names]
+        # done/total lets the callback report the progress of the pipeline
+        steps.append(chord(header, record_stage.s(str(version.pk), done, total)))
+    steps.append(finish_processing.si(str(version.pk)))
+    return chain(*steps)
+
+
+def enqueue(versions):
+    """
+    Start the pipeline of each version once the current transaction commits,
+    so workers see the rows. A broker or result backend outage leaves the
+    versions 'pending' rather than failing the upload.
+    """
+    canvases = [(version, pipeline(version)) for version in versions]
+
+    def send():
+        for version, canvas in canvases:
+            # Announced first: a worker may start (even finish) before apply_async returns
+            progress.publish_state(version, 'queued')
+            try:
+                canvas.apply_async()
+            except (OperationalError, RuntimeError):
+                logger.exception("Could not queue the processing pipeline")
+
+    if canvases:
+        transaction.on_commit(send)
+
+
+# Processors
+
+@register('thumbnail', ['image'], stage=0)
+def make_thumbnails(version):
+    asset = version.asset
+    if not thumbnails.generate_for_assets([asset], workers=1):
+        return None
+    return {'sizes': sorted(int(size) for size in asset.thumbnails)}
+
+
+@register('phash', ['image'], stage=0)
+def perceptual_hashes(version):
+    hashes = phash.compute(version.file.path)
+    phash.store(version.asset, hashes)
+    return {algorithm: f'{value:016x}' for algorithm, value in hashes.items()}
+
+
+@register('metadata', stage=0)
+def extract_metadata(version):
+    name = version.original_name or version.file.name
+    metadata = {
+        'size': version.file.size,
+        'content_type': mimetypes.guess_type(name)[0],
+        'processed_at': timezone.now().isoformat(),
+    }
+    if version.asset.asset_type == 'image':
+        # Only the header is read
+        with Image.open(version.file.path) as img:
+            metadata.update(width=img.width, height=img.height, format=img.format, mode=img.mode)
+    return metadata
+
+
+@register('classify', stage=1)
+def classify(version):
+    asset = version.asset
+    if asset.asset_type == 'image':
+        (analyzed,) = analysis.analyze_paths([version.file.path], workers=1)
+        if analyzed is None:
+            raise ValueError('unreadable image')
+        categories, measures, embedding = analyzed
+        embeddings.add(asset.project_id, [asset.pk], [asset.owner_id], embedding[None])
+    else:
+        categories, measures = [asset.asset_type], {}
+    asset.ai_data = {'categories': categories, 'version': version.number, **measures}
+    asset.categories = ','.join(categories)
+    asset.ai_enhanced = True
+    asset.save(update_fields=['ai_data', 'categories', 'ai_enhanced', 'updated_at'])
+    return asset.ai_data
+
+
+# Bump when the renderer output changes, so cached renders are not reused
+RENDERER_ID = 'placeholder-1'
+DEFAULT_RENDER_PARAMS = {'format': 'txt'}
+
+
+@register('render', ['geometry'], stage=1)
+def render(version, params=None):
+    asset = version.asset
+    params = {**DEFAULT_RENDER_PARAMS, **(params or {})}
+    digest = render_cache.source_digest(version.file)
+
+    def render_file():
+        # Placeholder render until a renderer is wired in; depends only on the cache key inputs
+        return f'Render of {digest} with {params}\n'.encode()
+
+    entry = render_cache.get_or_render(digest, RENDERER_ID, params, render_file, extension=params['format'])
+    # The asset points at the cached file, shared by every asset with the same source
+    asset.render_result.name = entry.file.name
+    asset.is_rendered = True
+    asset.save(update_fields=['render_result', 'is_rendered', 'updated_at'])
+    return {'render_result': asset.render_result.name, 'cache_key': entry.key}
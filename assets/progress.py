@@ -0,0 +1,135 @@
+""" Processing progress pushed to WebSocket clients through the channel layer.
+
+Each asset has a group (group_name) joined by AssetProgressConsumer
+(collaboration/consumers.py). Celery tasks publish state transitions
+(queued, processing, completed, failed) and progress percentages to it.
+
+State transitions are always sent. Progress updates of a version are
+rate-limited to one per PROGRESS_INTERVAL seconds and coalesced: an update
+arriving sooner is held back, replacing any held one, and a timer thread
+sends it once the interval is over, unless flush() sent it or a state
+transition superseded it first. A chatty processor therefore costs the
+channel layer at most a few messages a second per version.
+
+The throttle state lives in the memory of the publishing process: each
+Celery worker process limits its own messages, so a version processed by
+several workers at once may exceed the rate by that factor. Only the
+'processing' state and progress updates create entries, and entries idle
+for an interval are swept on later writes, so the state stays bounded
+even when another process publishes the terminal state.
+"""
+
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two progress messages of one version (per process)
+PROGRESS_INTERVAL = 0.5
+
+STATES = ('queued', 'processing', 'completed', 'failed')
+
+# version id -> (monotonic time of the last progress message, pending coalesced payload)
+_throttle = {}
+_throttle_lock = threading.Lock()
+# Monotonic time of the last sweep of idle _throttle entries
+_last_prune = 0.0
+
+
+def group_name(asset_id):
+    return f'asset-progress-{asset_id}'
+
+
+def payload(version, state, progress=None):
+    return {
+        'asset': version.asset_id,
+        'version': str(version.pk),
+        'number': version.number,
+        'state': state,
+        'progress': progress,
+    }
+
+
+def _send(message):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(group_name(message['asset']), {
+            'type': 'asset.progress',
+            'payload': message,
+        })
+    except Exception:
+        # Progress is best effort: never fail the task publishing it
+        logger.exception("Could not publish processing progress")
+
+
+def _prune(now):
+    """
+    Drop the entries idle for a whole interval, at most once per interval:
+    the next update of their version is let through anyway. Called with
+    _throttle_lock held, on every write, so versions whose terminal state
+    is published by another process do not accumulate.
+    """
+    global _last_prune
+    if now - _last_prune < PROGRESS_INTERVAL:
+        return
+    _last_prune = now
+    for key in [k for k, (last, pending) in _throttle.items() if pending is None and now - last >= PROGRESS_INTERVAL]:
+        del _throttle[key]
+
+
+def publish_state(version, state, progress=None):
+    """ Send a state transition of version immediately, superseding pending progress. """
+    now = time.monotonic()
+    with _throttle_lock:
+        _prune(now)
+        if state == 'processing':
+            _throttle[str(version.pk)] = (now, None)
+        else:
+            # 'queued' is published once, by the web process: nothing to throttle after it
+            _throttle.pop(str(version.pk), None)
+    _send(payload(version, state, progress))
+
+
+def publish_progress(version, percent):
+    """ Send the progress of a processing version, rate-limited and coalesced. """
+    key = str(version.pk)
+    message = payload(version, 'processing', int(percent))
+    now = time.monotonic()
+    with _throttle_lock:
+        _prune(now)
+        last, pending = _throttle.get(key, (None, None))
+        if last is not None and now - last < PROGRESS_INTERVAL:
+            # Too soon: keep only the latest update, sent when the interval is over
+            _throttle[key] = (last, message)
+            if pending is None:
+                _schedule_flush(key, PROGRESS_INTERVAL - (now - last))
+            return False
+        _throttle[key] = (now, None)
+    _send(message)
+    return True
+
+
+def _flush(key):
+    with _throttle_lock:
+        last, pending = _throttle.get(key, (None, None))
+        if pending is None:
+            return
+        _throttle[key] = (time.monotonic(), None)
+    _send(pending)
+
+
+def _schedule_flush(key, delay):
+    timer = threading.Timer(delay, _flush, (key,))
+    timer.daemon = True
+    timer.start()
+
+
+def flush(version):
+    """ Send the coalesced progress update of version now, if any. """
+    _flush(str(version.pk))
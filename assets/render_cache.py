@@ -0,0 +1,162 @@
+""" Render result cache keyed by source content, renderer and parameters.
+
+A render is identified by the sha256 of the source bytes, the renderer id
+(bumped when its output changes) and a hash of the render parameters, so
+re-publishing the same bytes or retrying a task reuses the stored result.
+
+The RenderCacheEntry row doubles as the claim of the worker rendering a
+key: the first worker inserts it as 'rendering', the others wait for it
+to become 'ready' (or take over a claim older than CLAIM_TIMEOUT, left by
+a crashed worker), so concurrent requests for one key render it once.
+
+Entries are evicted least recently used first once the cache holds more
+than RENDER_CACHE_MAX_BYTES, except those still used as an asset's
+render_result.
+"""
+
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from versions.storage import digest_from_name
+
+from .models import Asset, RenderCacheEntry
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+# Seconds after which a 'rendering' claim is considered abandoned
+CLAIM_TIMEOUT = 600
+# Seconds between two checks of a claim held by another worker
+POLL_INTERVAL = 0.5
+
+
+class RenderInProgress(Exception):
+    """ Raised when another worker still renders the key after the wait. """
+
+
+def source_digest(field_file):
+    """ Return the sha256 of a file: its blob name, or a streamed hash for other files. """
+    digest = digest_from_name(field_file.name)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    with field_file.storage.open(field_file.name, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def cache_key(source_sha256, renderer, params):
+    params_hash = hashlib.sha256(json.dumps(params or {}, sort_keys=True).encode()).hexdigest()
+    return hashlib.sha256(f'{source_sha256}:{renderer}:{params_hash}'.encode()).hexdigest()
+
+
+def _max_bytes():
+    return int(getattr(settings, 'RENDER_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def _ready(key):
+    entry = RenderCacheEntry.objects.filter(pk=key, status='ready').first()
+    if entry is not None and entry.file and entry.file.storage.exists(entry.file.name):
+        return entry
+    return None
+
+
+def _claim(key, renderer, source_sha256):
+    """ Claim key for rendering; returns the entry, or None if another worker holds it. """
+    try:
+        with transaction.atomic():
+            return RenderCacheEntry.objects.create(key=key, renderer=renderer, source_sha256=source_sha256)
+    except IntegrityError:
+        pass
+    # Take over a stale claim, or a ready entry whose file is gone
+    stale = timezone.now() - timedelta(seconds=CLAIM_TIMEOUT)
+    taken = RenderCacheEntry.objects.filter(pk=key).filter(
+        status='rendering', last_used__lt=stale,
+    ).update(last_used=timezone.now())
+    if not taken and _ready(key) is None:
+        taken = RenderCacheEntry.objects.filter(pk=key, status='ready').update(
+            status='rendering', last_used=timezone.now(),
+        )
+    return RenderCacheEntry.objects.filter(pk=key).first() if taken else None
+
+
+def get_or_render(source_sha256, renderer, params, render, extension='bin', wait=CLAIM_TIMEOUT):
+    """
+    Return the ready RenderCacheEntry for (source_sha256, renderer, params),
+    calling render() -> bytes only when no worker has rendered it yet.
+    Waits up to wait seconds for a render in progress elsewhere.
+    """
+    key = cache_key(source_sha256, renderer, params)
+    deadline = time.monotonic() + wait
+    while True:
+        entry = _ready(key)
+        if entry is not None:
+            RenderCacheEntry.objects.filter(pk=key).update(hits=F('hits') + 1, last_used=timezone.now())
+            return entry
+        entry = _claim(key, renderer, source_sha256)
+        if entry is not None:
+            break
+        if time.monotonic() >= deadline:
+            raise RenderInProgress(key)
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        content = render()
+    except Exception:
+        # Release the claim so the next request retries the render
+        RenderCacheEntry.objects.filter(pk=key, status='rendering').delete()
+        raise
+    if entry.file:
+        entry.file.storage.delete(entry.file.name)
+    entry.file.save(f'{key[:2]}/{key}.{extension}', ContentFile(content), save=False)
+    entry.size = len(content)
+    entry.status = 'ready'
+    entry.renders += 1
+    entry.save(update_fields=['file', 'size', 'status', 'renders', 'last_used'])
+    evict()
+    return entry
+
+
+def evict(max_bytes=None):
+    """ Delete least recently used ready entries until the cache fits in max_bytes. """
+    max_bytes = _max_bytes() if max_bytes is None else max_bytes
+    ready = RenderCacheEntry.objects.filter(status='ready')
+    total = ready.aggregate(total=Sum('size'))['total'] or 0
+    if total <= max_bytes:
+        return 0
+    in_use = set(Asset.objects.exclude(render_result='').exclude(render_result__isnull=True)
+                 .values_list('render_result', flat=True))
+    evicted = 0
+    for entry in ready.order_by('last_used').iterator():
+        if total <= max_bytes:
+            break
+        if entry.file.name in in_use:
+            continue
+        # Only if unchanged since read: a concurrent hit or re-render keeps the entry and its file
+        if RenderCacheEntry.objects.filter(pk=entry.pk, status='ready', last_used=entry.last_used).delete()[0]:
+            entry.file.storage.delete(entry.file.name)
+            total -= entry.size
+            evicted += 1
+    return evicted
+
+
+def stats():
+    """ Return hits, renders (misses), hit ratio and size of the render cache. """
+    totals = RenderCacheEntry.objects.filter(status='ready').aggregate(
+        hits=Sum('hits'), renders=Sum('renders'), size=Sum('size'),
+    )
+    hits, renders = totals['hits'] or 0, totals['renders'] or 0
+    return {
+        'hits': hits,
+        'misses': renders,
+        'hit_rate': round(hits / (hits + renders), 4) if hits + renders else None,
+        'entries': RenderCacheEntry.objects.filter(status='ready').count(),
+        'size': totals['size'] or 0,
+    }
@@ -0,0 +1,178 @@
+""" Full-text search over assets, their version descriptions and comments.
+
+On SQLite, an FTS5 table (assets_search) holds one document per asset, with
+rowid = asset id and the columns name, description, categories, versions
+(every version description) and comments (every comment). Triggers on the
+asset, version and comment tables rebuild an asset's document whenever one
+of them changes, so the index stays in sync with bulk_create and
+QuerySet.update too, which send no signals.
+
+Queries match every word as a prefix ("chai" finds "chair") and are ranked
+by BM25, with matches in the name weighted highest. Both the lookup and
+the ranking only touch the index entries of the query terms, so latency
+depends on the number of matches, not on the size of the catalogue.
+
+install() (re)creates the table and triggers and reindexes when they
+change; it runs in the migration and after every migrate, since altering a
+table on SQLite drops its triggers and the comment table of the
+collaboration app is created by --run-syncdb. Other databases fall back to
+LIKE queries.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Asset
+
+TABLE = 'assets_search'
+# BM25 weights of name, description, categories, versions, comments
+WEIGHTS = (10.0, 2.0, 4.0, 1.0, 1.0)
+COMMENT_TABLE = 'collaboration_comment'
+
+_CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "name, description, categories, versions, comments, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+
+def _versions_sql(asset_id):
+    return f"(SELECT group_concat(description, ' ') FROM versions_version WHERE asset_id = {asset_id})"
+
+
+def _comments_sql(asset_id):
+    return f"(SELECT group_concat(content, ' ') FROM {COMMENT_TABLE} WHERE asset_id = {asset_id})"
+
+
+def _triggers(with_comments):
+    """
+    CREATE TRIGGER statements by name. Each trigger only reads its own table:
+    Django rebuilds a table to alter it on SQLite, and renaming the rebuilt
+    table fails while a trigger elsewhere refers to it.
+    """
+    versions = f"UPDATE {TABLE} SET versions = {{}} WHERE rowid = {{}};"
+    comments = f"UPDATE {TABLE} SET comments = {{}} WHERE rowid = {{}};"
+    triggers = {
+        'asset_insert': (
+            f"AFTER INSERT ON assets_asset BEGIN "
+            f"INSERT INTO {TABLE} (rowid, name, description, categories, versions, comments) "
+            f"VALUES (NEW.id, NEW.name, NEW.description, NEW.categories, '', ''); END"
+        ),
+        'asset_update': (
+            f"AFTER UPDATE OF name, description, categories ON assets_asset BEGIN "
+            f"UPDATE {TABLE} SET name = NEW.name, description = NEW.description, "
+            f"categories = NEW.categories WHERE rowid = NEW.id; END"
+        ),
+        'asset_delete': f"AFTER DELETE ON assets_asset BEGIN DELETE FROM {TABLE} WHERE rowid = OLD.id; END",
+    }
+    for event, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+        of = ' OF description' if event == 'update' else ''
+        triggers[f'version_{event}'] = (
+            f"AFTER {event.upper()}{of} ON versions_version BEGIN "
+            f"{versions.format(_versions_sql(f'{row}.asset_id'), f'{row}.asset_id')} END"
+        )
+        if with_comments:
+            of = ' OF content' if event == 'update' else ''
+            triggers[f'comment_{event}'] = (
+                f"AFTER {event.upper()}{of} ON {COMMENT_TABLE} BEGIN "
+                f"{comments.format(_comments_sql(f'{row}.asset_id'), f'{row}.asset_id')} END"
+            )
+    return {f'{TABLE}_{name}': f'CREATE TRIGGER {TABLE}_{name} {body}' for name, body in triggers.items()}
+
+
+def _rebuild_sql(with_comments):
+    return (
+        f"INSERT INTO {TABLE} (rowid, name, description, categories, versions, comments) "
+        f"SELECT a.id, a.name, a.description, a.categories, {_versions_sql('a.id')}, "
+        f"{_comments_sql('a.id') if with_comments else 'NULL'} FROM assets_asset a"
+    )
+
+
+def enabled(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection):
+    """
+    Create the index and its triggers if missing or outdated, reindexing
+    everything when the triggers change. Returns True if it reindexed.
+    """
+    if not enabled(using):
+        return False
+    with using.cursor() as cursor:
+        tables = set(using.introspection.table_names(cursor))
+        if 'assets_asset' not in tables or 'versions_version' not in tables:
+            return False
+        wanted = _triggers(COMMENT_TABLE in tables)
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                       [f'{TABLE}_%'])
+        existing = dict(cursor.fetchall())
+        if TABLE in tables and existing == wanted:
+            return False
+
+        cursor.execute(_CREATE_TABLE)
+        for name in existing:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        for sql in wanted.values():
+            cursor.execute(sql)
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(_rebuild_sql(COMMENT_TABLE in tables))
+    return True
+
+
+def match_expression(query):
+    """ Turn user input into an FTS5 query: every word, as a prefix, must match. """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(user, query, limit=20):
+    """
+    Return up to limit [(asset id, rank, snippet)] of the assets of user's
+    projects matching query, best first (rank: lower is better).
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if not enabled():
+        assets = Asset.objects.filter(project__owner=user).filter(
+            Q(name__icontains=query) | Q(description__icontains=query) | Q(categories__icontains=query)
+            | Q(versions__description__icontains=query) | Q(comments__content__icontains=query)
+        ).distinct().order_by('name').values_list('pk', flat=True)[:limit]
+        return [(pk, None, None) for pk in assets]
+
+    weights = ', '.join(str(w) for w in WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT s.rowid, bm25({TABLE}, {weights}) AS score, "
+            f"snippet({TABLE}, -1, '[', ']', '…', 10) "
+            f"FROM {TABLE} s JOIN assets_asset a ON a.id = s.rowid "
+            f"JOIN projects_project p ON p.id = a.project_id "
+            f"WHERE {TABLE} MATCH %s AND p.owner_id = %s ORDER BY score LIMIT %s",
+            [expression, user.pk, limit],
+        )
+        return [(pk, round(score, 4), snippet) for pk, score, snippet in cursor.fetchall()]
+
+
+def uninstall(using=connection):
+    """ Drop the index and its triggers. """
+    if not enabled(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{TABLE}_%'])
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def filter_queryset(queryset, query):
+    """ Restrict an Asset queryset to the assets matching query, unranked (admin search). """
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not enabled():
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s", [expression]))
@@ -5,9 +5,20 @@ from versions.models import Version
 class VersionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Version
-        fields = ['id', 'number', 'file', 'description', 'user', 'created_at', 'status']
+        fields = ['id', 'number', 'file', 'description', 'user', 'created_at', 'status',
+                  'processing_status', 'processing_results']
 
-class AssetSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    """ Keep only the fields named in the 'fields' keyword argument, when given. """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class AssetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     versions = VersionSerializer(many=True, read_only=True)
     """ Serializer for the Asset model """
     # Expose "uploaded_by" in the API, but map it to the model field "owner"
@@ -25,6 +36,7 @@ class AssetSerializer(serializers.ModelSerializer):
             'ai_data',
             'render_result',
             'thumbnail',
+            'thumbnails',
             'status',
             'created_at',
             'updated_at',
@@ -34,6 +46,7 @@ class AssetSerializer(serializers.ModelSerializer):
             'id',
             'uploaded_by',
             'thumbnail',
+            'thumbnails',
             'render_result',
             'status',
             'created_at',
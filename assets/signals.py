@@ -0,0 +1,43 @@
+""" Signal handlers bumping the response cache generations on writes.
+
+Bulk writes (bulk_create, QuerySet.update) send no signals; the views doing
+them call response_cache.bump themselves.
+"""
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from projects.models import Project
+from stratopipe import response_cache
+from versions.models import Version
+
+from .models import Asset
+
+
+@receiver([post_save, post_delete], sender=Asset)
+def bump_asset(sender, instance, **kwargs):
+    response_cache.bump(*response_cache.asset_scopes(instance.owner_id, instance.project_id, instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Version)
+@receiver([post_save, post_delete], sender='collaboration.Comment')
+def bump_asset_child(sender, instance, **kwargs):
+    try:
+        asset = instance.asset
+    except Asset.DoesNotExist:
+        # Deleted along with its asset, which bumped the scopes itself
+        return
+    response_cache.bump(*response_cache.asset_scopes(asset.owner_id, asset.project_id, asset.pk))
+
+
+@receiver([post_save, post_delete], sender=Project)
+def bump_project(sender, instance, **kwargs):
+    response_cache.bump(('projects', instance.owner_id), ('project', instance.pk))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_user(sender, instance, **kwargs):
+    # Listings show the username; a new user also never sees responses
+    # cached for a deleted user with the same id
+    response_cache.bump(('user', instance.pk), ('projects', instance.pk))
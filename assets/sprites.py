@@ -0,0 +1,162 @@
+""" Sprite sheets (contact sheets) of project image thumbnails.
+
+A sheet packs the thumbnails of one page of a project's images into a
+single JPEG, with a JSON map giving each asset's rectangle in it. Pages
+follow the keyset cursors of list_project_images (see pagination.py), and
+both files are named after a key made of the page's first asset, the tile
+size and a digest of the members' identity (id, latest version number, last
+update and thumbnail). A sheet therefore stays valid until a member
+changes and never needs explicit invalidation; building a page's new sheet
+deletes the ones it supersedes, along with sheets older than SHEET_MAX_AGE
+(left behind by pages that now start elsewhere).
+"""
+
+import hashlib
+import io
+import json
+import math
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+
+from . import thumbnails
+from .models import Asset
+
+DEFAULT_TILE_SIZE = 128
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+BACKGROUND = (32, 32, 32)
+JPEG_QUALITY = 85
+# Seconds after which a sheet of a page that no longer starts there is deleted
+SHEET_MAX_AGE = 7 * 24 * 3600
+
+
+def images(project, owner):
+    """ Return the image assets of the project as dicts, with their latest version number. """
+    return (
+        Asset.objects.filter(project=project, owner=owner, asset_type='image')
+        .values('id', 'name', 'thumbnail', 'updated_at', 'version_counter')
+    )
+
+
+def sheet_key(members, tile):
+    """ Return the cache key of the sheet built from members at tile pixels. """
+    identity = [
+        (m['id'], m['version_counter'], m['updated_at'].isoformat(), m['thumbnail'] or '')
+        for m in members
+    ]
+    digest = hashlib.sha256(json.dumps([tile, identity]).encode()).hexdigest()[:32]
+    first = members[0]['id'] if members else 0
+    return f'{first}-{tile}-{digest}'
+
+
+def _page_prefix(key):
+    """ The part of key naming the page and tile, shared by every sheet of that page. """
+    return key.rsplit('-', 1)[0] + '-'
+
+
+def sprites_dir(project_id):
+    return f'sprites/{project_id}'
+
+
+def sheet_name(project_id, key):
+    return f'{sprites_dir(project_id)}/{key}.jpg'
+
+
+def map_name(project_id, key):
+    return f'{sprites_dir(project_id)}/{key}.json'
+
+
+def build_lock_key(key):
+    """ Cache key held while a sheet is being built, so it is queued once. """
+    return f'sprite-build:{key}'
+
+
+def load_map(project_id, key):
+    """ Return the offset map of a built sheet, or None while it is not built. """
+    name = map_name(project_id, key)
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name, 'rb') as f:
+        return json.load(f)
+
+
+def build_sheet(project_id, key, asset_ids, tile=DEFAULT_TILE_SIZE):
+    """
+    Render the sheet for asset_ids (in that order) and store it with its map.
+    Assets without a readable thumbnail get no rectangle.
+    """
+    assets = {a.id: a for a in Asset.objects.filter(id__in=asset_ids).only('id', 'thumbnail', 'thumbnails')}
+    columns = max(1, math.ceil(math.sqrt(len(asset_ids))))
+    rows = max(1, math.ceil(len(asset_ids) / columns))
+    sheet = Image.new('RGB', (columns * tile, rows * tile), BACKGROUND)
+
+    tiles = []
+    for index, asset_id in enumerate(asset_ids):
+        asset = assets.get(asset_id)
+        if asset is None or not asset.thumbnail:
+            continue
+        name = thumbnails.pick_thumbnail(asset, size=tile)
+        try:
+            with asset.thumbnail.storage.open(name, 'rb') as f, Image.open(f) as img:
+                img.draft('RGB', (tile, tile))
+                img = img.convert('RGB')
+                img.thumbnail((tile, tile), Image.LANCZOS)
+        except (OSError, ValueError):
+            continue
+        # Centre the image in its cell
+        x = (index % columns) * tile + (tile - img.width) // 2
+        y = (index // columns) * tile + (tile - img.height) // 2
+        sheet.paste(img, (x, y))
+        tiles.append({'id': asset_id, 'x': x, 'y': y, 'w': img.width, 'h': img.height})
+
+    buf = io.BytesIO()
+    sheet.save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    for name in (sheet_name(project_id, key), map_name(project_id, key)):
+        default_storage.delete(name)
+    default_storage.save(sheet_name(project_id, key), ContentFile(buf.getvalue()))
+
+    sprite_map = {
+        'key': key,
+        'tile': tile,
+        'columns': columns,
+        'width': sheet.width,
+        'height': sheet.height,
+        'tiles': tiles,
+    }
+    # The map is written last: its presence means the sheet is complete
+    default_storage.save(map_name(project_id, key), ContentFile(json.dumps(sprite_map).encode()))
+    remove_stale_sheets(project_id, key)
+    return sprite_map
+
+
+def remove_stale_sheets(project_id, key, max_age=SHEET_MAX_AGE):
+    """
+    Delete the sheets (image and map) of project_id superseded by key, i.e.
+    of the same page and tile, and those older than max_age seconds.
+    Returns the number of files deleted.
+    """
+    directory = sprites_dir(project_id)
+    try:
+        _, filenames = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    prefix = _page_prefix(key)
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    removed = 0
+    for filename in filenames:
+        stem, _, extension = filename.rpartition('.')
+        if stem == key or extension not in ('jpg', 'json'):
+            continue
+        name = f'{directory}/{filename}'
+        try:
+            if stem.startswith(prefix) or default_storage.get_modified_time(name) < cutoff:
+                default_storage.delete(name)
+                removed += 1
+        except FileNotFoundError:
+            # Deleted by a concurrent build
+            continue
+    return removed
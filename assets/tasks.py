@@ -1,63 +1,128 @@
 """ Celery tasks for asset processing.
 
 This module defines asynchronous tasks for processing assets,
-including rendering, thumbnail generation, and AI-based enhancements.
+including rendering, thumbnail generation, and AI-based enhancements,
+and the steps of the per-version processing pipeline (see processing.py).
 
 """
 
 
-import time
+import logging
+
 from celery import shared_task
-from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.db import transaction
+from versions.models import Version
+from . import analysis, processing, progress, sprites, thumbnails, uploads
 from .models import Asset
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def render_asset(asset_id):
-    """Simulate asset rendering and update render_result field."""
-    try:
-        asset = Asset.objects.get(id=asset_id)
-        asset.status = 'processing'
-        asset.save()
-
-        # Simulate rendering process (replace with actual rendering logic)
-        time.sleep(5)
-        rendered_content = b'This is the rendered file content.'
-        asset.render_result.save(f"render_{asset.id}.txt", ContentFile(rendered_content))
 
-        asset.status = 'completed'
-        asset.save()
-    except Asset.DoesNotExist:
-        # Asset not found; optionally log the error
-        pass
+@shared_task
+def render_asset(asset_id, params=None):
+    """Render the latest version of an asset (reusing a cached render) and update its render_result field."""
+    version = _latest_version(asset_id)
+    if version is not None:
+        processing.get_processor('render')(version, params)
 
 
 @shared_task
 def generate_thumbnail(asset_id):
-    """Simulate thumbnail generation for the asset."""
+    """Generate the JPEG/PNG and WebP thumbnails of an image asset, in every size."""
     try:
         asset = Asset.objects.get(id=asset_id)
-        # Simulate thumbnail generation (replace with logic to create an image thumbnail)
-        time.sleep(2)
-        thumbnail_content = b'Thumbnail image bytes'
-        asset.thumbnail.save(f"thumb_{asset.id}.png", ContentFile(thumbnail_content))
-        asset.save()
+        thumbnails.generate_for_assets([asset], workers=1)
     except Asset.DoesNotExist:
         pass
 
 
+@shared_task
+def generate_thumbnails_batch(asset_ids):
+    """Generate thumbnails for many assets, decoding them in a process pool."""
+    return thumbnails.generate_for_assets(Asset.objects.filter(id__in=asset_ids))
+
+
+@shared_task
+def build_sprite_sheet(project_id, key, asset_ids, tile):
+    """Pack the thumbnails of a page of project images into one sprite sheet."""
+    try:
+        sprites.build_sheet(project_id, key, asset_ids, tile)
+    finally:
+        cache.delete(sprites.build_lock_key(key))
+
+
+@shared_task
+def analyze_assets_batch(asset_ids):
+    """Analyze hundreds of assets at once (see analysis.py) and store the results in ai_data."""
+    # In the worker process: Celery's own concurrency spreads the batches over the cores
+    return analysis.analyze_assets(asset_ids, workers=1)
+
+
 @shared_task
 def process_asset_ai(asset_id):
-    """Simulate AI processing (analysis, classification) for the asset."""
+    """Analyze one asset; prefer analyze_assets_batch for many."""
+    return analysis.analyze_assets([asset_id], workers=1)
+
+
+def _latest_version(asset_id):
+    return Version.objects.select_related('asset').filter(asset_id=asset_id).order_by('-number').first()
+
+
+# Processing pipeline (see processing.pipeline)
+
+@shared_task
+def start_processing(version_id):
+    """Mark a version as being processed."""
+    version = Version.objects.filter(pk=version_id).first()
+    if version is not None:
+        version.processing_status = 'processing'
+        version.processing_results = {}
+        version.save(update_fields=['processing_status', 'processing_results'])
+        progress.publish_state(version, 'processing', 0)
+
+
+@shared_task
+def run_processor(version_id, name):
+    """Run one processor on a version; returns (name, result or {'error': ...})."""
     try:
-        asset = Asset.objects.get(id=asset_id)
-        # Simulate AI processing (replace with your model inference code)
-        time.sleep(3)
-        ai_result = {
-            'analysis': 'This asset has been classified successfully.',
-            'confidence': 0.95
-        }
-        asset.ai_data = ai_result
-        asset.save()
-    except Asset.DoesNotExist:
-        pass
+        version = Version.objects.select_related('asset').get(pk=version_id)
+    except Version.DoesNotExist:
+        return name, {'error': 'version deleted'}
+    try:
+        return name, processing.get_processor(name)(version)
+    except Exception as exc:
+        logger.exception("Processor %s failed on version %s", name, version_id)
+        return name, {'error': f'{type(exc).__name__}: {exc}'}
+
+
+@shared_task
+def record_stage(results, version_id, done, total):
+    """Chord callback: merge the results of a stage into the version; done of total processors ran."""
+    with transaction.atomic():
+        version = Version.objects.select_for_update().filter(pk=version_id).first()
+        if version is None:
+            return
+        merged = dict(version.processing_results or {})
+        merged.update((name, result) for name, result in results)
+        version.processing_results = merged
+        version.save(update_fields=['processing_results'])
+    progress.publish_progress(version, 100 * done / total)
+
+
+@shared_task
+def finish_processing(version_id):
+    """Mark a version completed, or failed if a processor raised."""
+    version = Version.objects.filter(pk=version_id).first()
+    if version is None:
+        return
+    failed = any(isinstance(r, dict) and 'error' in r for r in (version.processing_results or {}).values())
+    version.processing_status = 'failed' if failed else 'completed'
+    version.save(update_fields=['processing_status'])
+    progress.publish_state(version, version.processing_status, 100 if not failed else None)
+
+
+@shared_task
+def expire_upload_sessions():
+    """Expire idle upload sessions and remove their partial files (see uploads.expire_sessions)."""
+    return uploads.expire_sessions()
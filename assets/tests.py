@@ -1,13 +1,53 @@
 """ Tests for the assets app. """
 
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from collaboration.models import Comment
 from projects.models import Project
-from .models import Asset
+from stratopipe import response_cache
+from stratopipe.celery import app as celery_app
+from stratopipe.testing import IN_PROCESS_BACKENDS
+from versions.models import Blob, Version
+from versions.storage import blob_name, blob_storage
+from . import (
+    analysis, embeddings, ingest, phash, processing, progress, render_cache, search, sprites, thumbnails, uploads,
+)
+from .models import Asset, RenderCacheEntry, UploadSession
+from .tasks import generate_thumbnail
 
 User = get_user_model()
 
+@override_settings(**IN_PROCESS_BACKENDS)
 class AssetModelTest(TestCase):
     """ Test the Asset model """
     def setUp(self):
@@ -24,3 +64,1263 @@ class AssetModelTest(TestCase):
     def test_asset_creation(self):
         self.assertEqual(self.asset.name, 'Test Asset')
         self.assertEqual(self.asset.status, 'pending')
+
+
+class TempMediaMixin:
+    """ Run each test with MEDIA_ROOT (blobs, thumbnails, embeddings...) in a fresh temporary directory """
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+
+@override_settings(ASSET_UPLOAD_CHUNK_SIZE=16, **IN_PROCESS_BACKENDS)
+class ChunkedUploadTests(TempMediaMixin, APITestCase):
+    """ Test the init / append / commit upload protocol """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='chunky', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Chunk Project')
+        self.client.force_authenticate(user=self.user)
+
+    def _init(self, **data):
+        data.setdefault('filename', 'plate.exr')
+        response = self.client.post('/api/assets/uploads/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def _put(self, session_id, offset, body):
+        return self.client.generic(
+            'PUT', f'/api/assets/uploads/{session_id}/', body,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunks_commit_into_version(self):
+        payload = b'0123456789abcdef' * 2 + b'tail'
+        session_id = self._init(project=self.project.id, name='Plate', size=len(payload))
+
+        for offset in range(0, len(payload), 16):
+            response = self._put(session_id, offset, payload[offset:offset + 16])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['offset'], len(payload))
+
+        response = self.client.post(f'/api/assets/uploads/{session_id}/commit/',
+                                    {'sha256': hashlib.sha256(payload).hexdigest()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        version = Version.objects.get(pk=response.data['version']['id'])
+        self.assertEqual(version.number, 1)
+        self.assertEqual(version.asset.name, 'Plate')
+        with open(Path(self.media_root) / version.file.name, 'rb') as f:
+            self.assertEqual(f.read(), payload)
+
+    def test_resume_from_acknowledged_offset(self):
+        session_id = self._init(project=self.project.id, name='Plate', size=24)
+        self._put(session_id, 0, b'a' * 16)
+
+        # A replayed chunk is rejected with the offset to resume from
+        response = self._put(session_id, 0, b'a' * 16)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 16)
+
+        # Committing early is refused
+        response = self.client.post(f'/api/assets/uploads/{session_id}/commit/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self.assertEqual(self.client.get(f'/api/assets/uploads/{session_id}/').data['offset'], 16)
+        self._put(session_id, 16, b'b' * 8)
+        response = self.client.post(f'/api/assets/uploads/{session_id}/commit/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(b'a' * 16 + b'b' * 8).hexdigest())
+
+    def test_idle_sessions_expire(self):
+        idle = self._init(project=self.project.id, name='Idle', size=24)
+        self._put(idle, 0, b'a' * 16)
+        fresh = self._init(project=self.project.id, name='Fresh', size=24)
+        UploadSession.objects.filter(pk=idle).update(updated_at=timezone.now() - timedelta(days=2))
+
+        out = io.StringIO()
+        call_command('expire_upload_sessions', stdout=out)
+        self.assertIn('Expired 1 idle upload sessions', out.getvalue())
+        self.assertFalse(os.path.exists(uploads.part_path(UploadSession.objects.get(pk=idle))))
+        self.assertNotIn(UploadSession.objects.get(pk=idle).pk, uploads._hashers)
+        self.assertEqual(self.client.get(f'/api/assets/uploads/{fresh}/').data['status'], 'active')
+
+        response = self._put(idle, 16, b'b' * 8)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.post(f'/api/assets/uploads/{idle}/commit/').status_code,
+                         status.HTTP_409_CONFLICT)
+
+    @mock.patch.object(uploads, 'MAX_HASHERS', 1)
+    def test_evicted_digest_is_rebuilt_from_the_part_file(self):
+        first = self._init(project=self.project.id, name='First', size=24)
+        self._put(first, 0, b'a' * 16)
+        self._init(project=self.project.id, name='Second')
+        self.assertEqual(len(uploads._hashers), 1)
+
+        self._put(first, 16, b'b' * 8)
+        response = self.client.post(f'/api/assets/uploads/{first}/commit/')
+        self.assertEqual(response.data['sha256'], hashlib.sha256(b'a' * 16 + b'b' * 8).hexdigest())
+
+    def test_version_up_session_and_chunk_limit(self):
+        asset = Asset.objects.create(project=self.project, owner=self.user, name='Existing')
+        session_id = self._init(asset=asset.id, status='work_in_progress')
+
+        response = self._put(session_id, 0, b'x' * 17)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        self._put(session_id, 0, b'x' * 10)
+        response = self.client.post(f'/api/assets/uploads/{session_id}/commit/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['asset'], asset.id)
+        self.assertEqual(response.data['version']['status'], 'work_in_progress')
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class BlobStoreTests(TempMediaMixin, APITestCase):
+    """ Test content-addressed, deduplicated Version storage """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='dedupe', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Dedupe Project')
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, name, content):
+        return self.client.post('/api/assets/upload/', {
+            'project': self.project.id,
+            'name': name,
+            'file': SimpleUploadedFile('frame.png', content),
+        }, format='multipart')
+
+    def test_identical_uploads_share_one_blob(self):
+        self.assertEqual(self._upload('A', b'same bytes').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._upload('B', b'same bytes').status_code, status.HTTP_201_CREATED)
+
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+        names = set(Version.objects.values_list('file', flat=True))
+        self.assertEqual(names, {blob_name(digest)})
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 2)
+        self.assertEqual(Version.objects.filter(asset__name='A').get().original_name, 'frame.png')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Version.objects.filter(asset__name='A').delete()
+        self.assertTrue(blob_storage.exists(blob_name(digest)))
+        with self.captureOnCommitCallbacks(execute=True):
+            Version.objects.all().delete()
+        self.assertFalse(Blob.objects.filter(pk=digest).exists())
+        self.assertFalse(blob_storage.exists(blob_name(digest)))
+
+    def test_released_content_survives_a_new_reference_or_a_rollback(self):
+        self._upload('A', b'shared bytes')
+        digest = hashlib.sha256(b'shared bytes').hexdigest()
+
+        # The last reference is dropped, then taken again by an upload of the same bytes before commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Version.objects.all().delete()
+            path, staged_digest, size = blob_storage.stage(ContentFile(b'shared bytes'))
+            Blob.adopt(path, staged_digest, size)
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 1)
+        self.assertTrue(blob_storage.exists(blob_name(digest)))
+
+        # A release that is rolled back deletes nothing
+        Blob.objects.filter(pk=digest).update(ref_count=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Blob.release(digest)
+                    raise RuntimeError('rolled back')
+            except RuntimeError:
+                pass
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 1)
+        self.assertTrue(blob_storage.exists(blob_name(digest)))
+
+    def test_known_checksum_skips_transfer(self):
+        self._upload('A', b'already here')
+        response = self.client.post('/api/assets/uploads/', {
+            'project': self.project.id,
+            'name': 'A',
+            'filename': 'frame.png',
+            'sha256': hashlib.sha256(b'already here').hexdigest(),
+        }, format='json')
+        self.assertTrue(response.data['duplicate'])
+
+        response = self.client.post(f"/api/assets/uploads/{response.data['id']}/commit/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['version']['number'], 2)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class MediaServingTests(TempMediaMixin, APITestCase):
+    """ Test streaming and Range support of the media endpoints """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='viewer', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Media Project')
+        self.client.force_authenticate(user=self.user)
+        self.payload = bytes(range(256)) * 4
+        response = self.client.post('/api/assets/upload/', {
+            'project': self.project.id,
+            'name': 'Clip',
+            'file': SimpleUploadedFile('clip.mp4', self.payload),
+        }, format='multipart')
+        self.url = f"/api/assets/{response.data['asset']}/versions/1/file/"
+
+    def test_full_file_is_streamed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.payload)}')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    @override_settings(ASSET_MEDIA_ACCEL='nginx', ASSET_MEDIA_ACCEL_PREFIX='/protected/')
+    def test_proxy_handoff(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected/' + blob_name(hashlib.sha256(self.payload).hexdigest()))
+        self.assertEqual(response.content, b'')
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(etag, '"%s"' % hashlib.sha256(self.payload).hexdigest())
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A stale If-Range turns a range request into a full response
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_thumbnail_revalidates(self):
+        asset = Asset.objects.create(project=self.project, owner=self.user, name='Thumbed')
+        asset.thumbnail.save('thumb.png', ContentFile(b'png bytes'))
+        url = f'/api/assets/{asset.id}/thumbnail/'
+
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Only the current version token makes the URL immutable
+        self.assertEqual(self.client.get(url + '?v=1')['Cache-Control'], 'private, no-cache')
+        token = int(asset.updated_at.timestamp()) * 1_000_000 + asset.updated_at.microsecond
+        self.assertIn('immutable', self.client.get(f'{url}?v={token}')['Cache-Control'])
+
+        # A second save, even within the same second, retires the token
+        asset.save()
+        self.assertEqual(self.client.get(f'{url}?v={token}')['Cache-Control'], 'private, no-cache')
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class ThumbnailTests(TempMediaMixin, APITestCase):
+    """ Test multi-resolution thumbnail generation """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='thumbs', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Thumb Project')
+        self.client.force_authenticate(user=self.user)
+
+    def _upload_jpeg(self, name, size=(2000, 1000)):
+        buf = io.BytesIO()
+        Image.new('RGB', size, (200, 40, 40)).save(buf, 'JPEG')
+        response = self.client.post('/api/assets/upload/', {
+            'project': self.project.id,
+            'name': name,
+            'asset_type': 'image',
+            'file': SimpleUploadedFile(f'{name}.jpg', buf.getvalue()),
+        }, format='multipart')
+        return Asset.objects.get(pk=response.data['asset'])
+
+    def test_generate_thumbnail_records_every_size(self):
+        asset = self._upload_jpeg('Concept')
+        generate_thumbnail(asset.id)
+        asset.refresh_from_db()
+
+        self.assertEqual(sorted(asset.thumbnails, key=int), ['128', '512', '1024'])
+        self.assertEqual((asset.thumbnails['512']['width'], asset.thumbnails['512']['height']), (512, 256))
+        with asset.thumbnail.open('rb') as f, Image.open(f) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (512, 256)))
+
+        response = self.client.get(f'/api/assets/{asset.id}/thumbnail/?size=100&type=webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as img:
+            self.assertEqual(img.size, (128, 64))
+
+    def test_batch_uses_process_pool(self):
+        assets = [self._upload_jpeg(f'Batch {i}', (300, 600)) for i in range(3)]
+        self.assertEqual(thumbnails.generate_for_assets(assets, workers=2), 3)
+        for asset in Asset.objects.filter(pk__in=[a.pk for a in assets]):
+            self.assertEqual(asset.thumbnails['1024']['height'], 600)
+            self.assertEqual(asset.thumbnails['128']['width'], 64)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class ProcessingPipelineTests(TempMediaMixin, APITestCase):
+    """ Test the per-version processing pipeline queued on upload """
+    def setUp(self):
+        super().setUp()
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+        self.user = User.objects.create_user(username='processor', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Pipeline Project')
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, name, content, asset_type='image'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/assets/upload/', {
+                'project': self.project.id,
+                'name': name,
+                'asset_type': asset_type,
+                'file': SimpleUploadedFile(f'{name}.jpg', content),
+            }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Version.objects.select_related('asset').get(pk=response.data['version']['id'])
+
+    def test_image_upload_is_processed(self):
+        buf = io.BytesIO()
+        Image.new('RGB', (400, 200), (250, 250, 250)).save(buf, 'JPEG')
+        version = self._upload('Plate', buf.getvalue())
+
+        self.assertEqual(version.processing_status, 'completed')
+        self.assertEqual(set(version.processing_results), {'thumbnail', 'phash', 'metadata', 'classify'})
+        self.assertEqual(version.processing_results['metadata']['width'], 400)
+        self.assertEqual(version.processing_results['thumbnail']['sizes'], [128, 512, 1024])
+        self.assertEqual(version.asset.categories, 'landscape,bright,muted')
+        self.assertTrue(version.asset.ai_enhanced)
+
+    def test_failing_processor_marks_the_version_failed(self):
+        with self.assertLogs('assets.tasks', 'ERROR'):
+            version = self._upload('Broken', b'not an image')
+        self.assertEqual(version.processing_status, 'failed')
+        self.assertIn('error', version.processing_results['metadata'])
+        self.assertIsNone(version.processing_results['thumbnail'])
+
+    def test_stages_per_asset_type(self):
+        self.assertEqual(processing.stages_for('image'), [['thumbnail', 'phash', 'metadata'], ['classify']])
+        self.assertEqual(processing.stages_for('geometry'), [['metadata'], ['classify', 'render']])
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class AnalysisTests(TempMediaMixin, TestCase):
+    """ Test the batched, vectorized image analysis """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='analyst', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Analysis Project')
+
+    def _asset(self, name, content, asset_type='image'):
+        digest = hashlib.sha256(content).hexdigest()
+        blob_storage.save(blob_name(digest), ContentFile(content))
+        asset = Asset.objects.create(project=self.project, owner=self.user, name=name, asset_type=asset_type)
+        Version.objects.create(asset=asset, number=1, user=self.user, file=blob_name(digest))
+        return asset
+
+    def _png(self, size, color):
+        buf = io.BytesIO()
+        Image.new('RGB', size, color).save(buf, 'PNG')
+        return buf.getvalue()
+
+    def test_features_of_a_batch(self):
+        pixels = np.zeros((2, 4, 4, 3), dtype=np.uint8)
+        pixels[0] = (255, 0, 0)
+        pixels[1, :2] = (255, 255, 255)
+        batch = analysis.features(pixels, np.array([[300, 100], [100, 100]], dtype=np.float64))
+
+        np.testing.assert_allclose(batch['brightness'], [0.299, 0.5], atol=1e-6)
+        np.testing.assert_allclose(batch['contrast'], [0, 0.5], atol=1e-6)
+        np.testing.assert_allclose(batch['saturation'], [1, 0])
+        self.assertEqual(list(batch['orientation']), ['landscape', 'square'])
+        self.assertEqual(batch['histogram'].shape, (2, 64))
+        self.assertEqual(batch['dominant_colors'][0, 0].tolist(), [224, 32, 32])
+        self.assertEqual(batch['dominant_shares'][1, :2].tolist(), [0.5, 0.5])
+
+    def test_analyze_many_assets_with_one_update(self):
+        red = self._asset('Red', self._png((300, 100), (230, 20, 20)))
+        night = self._asset('Night', self._png((100, 300), (15, 15, 15)))
+        broken = self._asset('Broken', b'not an image')
+        mesh = self._asset('Mesh', b'v 0 0 0', asset_type='geometry')
+
+        with CaptureQueriesContext(connection) as queries:
+            updated = analysis.analyze_assets([red.pk, night.pk, broken.pk, mesh.pk], workers=2)
+        self.assertEqual(updated, 3)
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+
+        red.refresh_from_db()
+        self.assertEqual(red.categories, 'landscape,midtone,colorful')
+        self.assertEqual(red.ai_data['dominant_colors'], [{'color': '#e02020', 'share': 1.0}])
+        self.assertEqual(red.ai_data['version'], 1)
+        night.refresh_from_db()
+        self.assertEqual(night.categories, 'portrait,dark,muted')
+        broken.refresh_from_db()
+        self.assertFalse(broken.ai_enhanced)
+        mesh.refresh_from_db()
+        self.assertEqual(mesh.categories, 'geometry')
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class PerceptualHashTests(TempMediaMixin, APITestCase):
+    """ Test perceptual hashes and near-duplicate search """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='deduper', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Concept Art')
+        self.client.force_authenticate(user=self.user)
+
+    def _image(self, seed, size=256, fmt='PNG', gain=1.0):
+        pattern = np.random.RandomState(seed).randint(0, 256, (8, 8, 3)).astype(np.float64) * gain
+        img = Image.fromarray(np.clip(pattern, 0, 255).astype(np.uint8)).resize((size, size), Image.BILINEAR)
+        buf = io.BytesIO()
+        img.save(buf, fmt)
+        return buf.getvalue()
+
+    def _asset(self, name, content, hashed=True):
+        digest = hashlib.sha256(content).hexdigest()
+        blob_storage.save(blob_name(digest), ContentFile(content))
+        asset = Asset.objects.create(project=self.project, owner=self.user, name=name, asset_type='image')
+        version = Version.objects.create(asset=asset, number=1, user=self.user, file=blob_name(digest))
+        if hashed:
+            phash.store(asset, phash.compute(version.file.path))
+        return asset
+
+    def test_bk_tree_matches_brute_force(self):
+        rng = np.random.RandomState(0)
+        values = [int(v) for v in rng.randint(0, 2 ** 63, 500, dtype=np.int64)]
+        tree = phash.BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, i)
+        for query in values[:20]:
+            expected = sorted(i for i, v in enumerate(values) if phash.distance(query, v) <= 24)
+            self.assertEqual(sorted(i for _, i in tree.search(query, 24)), expected)
+
+    def test_similar_images_endpoint(self):
+        original = self._asset('Castle', self._image(1))
+        export = self._asset('Castle export', self._image(1, size=200, fmt='JPEG', gain=0.95))
+        self._asset('Forest', self._image(2))
+
+        response = self.client.get('/api/assets/project-images/similar/', {'asset': original.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in response.data['results']], [export.id])
+        self.assertLessEqual(response.data['results'][0]['distance'], phash.DEFAULT_DISTANCE)
+
+        # Another user's image in the same project is not reported
+        other = User.objects.create_user(username='neighbour', password='testpass')
+        leaked = self._asset('Castle copy', self._image(1))
+        Asset.objects.filter(pk=leaked.pk).update(owner=other)
+        response = self.client.get('/api/assets/project-images/similar/', {'asset': original.id})
+        self.assertEqual([r['id'] for r in response.data['results']], [export.id])
+
+        unhashed = self._asset('Pending', self._image(3), hashed=False)
+        response = self.client.get('/api/assets/project-images/similar/', {'asset': unhashed.id})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_index_is_rebuilt_only_when_hashes_change(self):
+        self._asset('Castle', self._image(1))
+        tree = phash.project_index(self.project.id)
+        # Renaming the project bumps its response cache generation, not the hash one
+        self.project.name = 'Renamed'
+        self.project.save()
+        self.assertIs(phash.project_index(self.project.id), tree)
+
+        self._asset('Forest', self._image(2))
+        self.assertIsNot(phash.project_index(self.project.id), tree)
+
+    def test_duplicate_clusters_command(self):
+        for name in ('A', 'A copy', 'A small'):
+            self._asset(name, self._image(4, size=128 if name == 'A small' else 256), hashed=False)
+        self._asset('B', self._image(5), hashed=False)
+
+        out = io.StringIO()
+        call_command('find_duplicates', self.project.id, '--compute-missing', '--workers', '1', stdout=out)
+        self.assertIn('Hashed 4 of 4 images', out.getvalue())
+        self.assertIn('3 images: A (#', out.getvalue())
+        self.assertIn('1 clusters, 3 images', out.getvalue())
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class EmbeddingSearchTests(TempMediaMixin, APITestCase):
+    """ Test the memory-mapped embedding store and visual similarity search """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='director', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Look Dev')
+        self.client.force_authenticate(user=self.user)
+
+    def test_search_matches_brute_force(self):
+        rng = np.random.RandomState(0)
+        vectors = analysis._unit(rng.standard_normal((3000, 16)).astype(np.float32))
+        owners = np.where(np.arange(3000) % 3, self.user.id, self.user.id + 1)
+        # Appended in chunks, forcing the store to grow
+        for start in range(0, 3000, 700):
+            embeddings.add(self.project.id, range(start, min(start + 700, 3000)), owners[start:start + 700],
+                           vectors[start:start + 700])
+        embeddings.add(self.project.id, [5], [self.user.id], vectors[:1])  # re-analyzed: replaced in place
+
+        with mock.patch.object(embeddings, 'BLOCK_ROWS', 1000):
+            found = embeddings.search(self.project.id, vectors[0], self.user.id, k=10, exclude=[0])
+        scores = vectors @ vectors[0]
+        scores[owners != self.user.id] = -np.inf
+        scores[0] = -np.inf
+        scores[5] = 1.0
+        expected = np.argsort(-scores, kind='stable')[:10]
+        self.assertEqual([pk for _, pk in found], expected.tolist())
+        self.assertEqual(len(embeddings.load(self.project.id)['ids']), 3000)
+
+    def test_visually_similar_endpoint(self):
+        def png(color, band):
+            img = Image.new('RGB', (96, 64), color)
+            img.paste(band, (0, 0, 96, 16))
+            buf = io.BytesIO()
+            img.save(buf, 'PNG')
+            return buf.getvalue()
+
+        ids = {}
+        for name, color, band in [('Sunset', (220, 120, 40), (40, 20, 90)), ('Sunset 2', (210, 110, 50), (50, 30, 90)),
+                                  ('Sea', (20, 60, 160), (240, 240, 240))]:
+            content = png(color, band)
+            digest = hashlib.sha256(content).hexdigest()
+            blob_storage.save(blob_name(digest), ContentFile(content))
+            asset = Asset.objects.create(project=self.project, owner=self.user, name=name, asset_type='image')
+            Version.objects.create(asset=asset, number=1, user=self.user, file=blob_name(digest))
+            ids[name] = asset.id
+        analysis.analyze_assets(list(ids.values()), workers=1)
+
+        response = self.client.get('/api/assets/project-images/visually-similar/', {'asset': ids['Sunset'], 'k': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['name'] for r in response.data['results']], ['Sunset 2', 'Sea'])
+        self.assertGreater(response.data['results'][0]['similarity'], response.data['results'][1]['similarity'])
+
+        other = User.objects.create_user(username='outsider', password='testpass')
+        self.client.force_authenticate(user=other)
+        response = self.client.get('/api/assets/project-images/visually-similar/', {'asset': ids['Sunset']})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class SearchTests(APITestCase):
+    """ Test the full-text search index and endpoint """
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Catalogue')
+        self.client.force_authenticate(user=self.user)
+
+    def _search(self, q):
+        response = self.client.get('/api/assets/search/', {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [r['name'] for r in response.data['results']]
+
+    def test_prefix_ranked_and_scoped(self):
+        chair = Asset.objects.create(project=self.project, owner=self.user, name='Wooden Chair')
+        table = Asset.objects.create(project=self.project, owner=self.user, name='Table',
+                                     description='Goes with the chair set')
+        Comment.objects.create(asset=table, author=self.user, content='Needs a matching chairback')
+        other = User.objects.create_user(username='stranger', password='testpass')
+        Asset.objects.create(project=Project.objects.create(owner=other, name='Theirs'), owner=other,
+                             name='Their Chair')
+
+        self.assertEqual(self._search('chai'), ['Wooden Chair', 'Table'])
+        self.assertEqual(self._search('matching chair'), ['Table'])
+        self.assertEqual(self._search('wood*"'), ['Wooden Chair'])
+
+        chair.name = 'Stool'
+        chair.save()
+        self.assertEqual(self._search('wooden'), [])
+        table.delete()
+        self.assertEqual(self._search('chair'), [])
+
+    def test_bulk_writes_are_indexed(self):
+        asset = Asset.objects.create(project=self.project, owner=self.user, name='Plate')
+        Version.objects.bulk_create([
+            Version(asset=asset, number=n, user=self.user, file=f'legacy/p{n}.exr', description=d)
+            for n, d in [(1, 'first comp'), (2, 'regraded sky')]
+        ])
+        self.assertEqual(self._search('regrad'), ['Plate'])
+        Version.objects.filter(asset=asset, number=2).update(description='denoised')
+        self.assertEqual(self._search('regrad'), [])
+        self.assertEqual(self._search('denoise comp'), ['Plate'])
+
+    def test_install_is_idempotent(self):
+        self.assertFalse(search.install())
+        self.assertEqual(self.client.get('/api/assets/search/').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class RenderCacheTests(TempMediaMixin, TestCase):
+    """ Test the render result cache keyed by source content and parameters """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='renderer', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Render Project')
+
+    def _version(self, name, content):
+        digest = hashlib.sha256(content).hexdigest()
+        blob_storage.save(blob_name(digest), ContentFile(content))
+        asset = Asset.objects.create(project=self.project, owner=self.user, name=name, asset_type='geometry')
+        return Version.objects.create(asset=asset, number=1, user=self.user, file=blob_name(digest))
+
+    def test_same_source_and_params_render_once(self):
+        first = self._version('Chair', b'mesh')
+        second = self._version('Chair copy', b'mesh')
+        result = processing.render(first)
+        self.assertEqual(processing.render(second), result)
+        processing.render(first, {'format': 'obj'})
+
+        second.asset.refresh_from_db()
+        self.assertTrue(second.asset.is_rendered)
+        self.assertEqual(second.asset.render_result.name, result['render_result'])
+        self.assertEqual(RenderCacheEntry.objects.get(pk=result['cache_key']).renders, 1)
+        self.assertEqual(render_cache.stats(), {
+            'hits': 1, 'misses': 2, 'hit_rate': 0.3333, 'entries': 2,
+            'size': sum(RenderCacheEntry.objects.values_list('size', flat=True)),
+        })
+
+    def test_waits_for_a_render_in_progress(self):
+        key = render_cache.cache_key('a' * 64, 'test', {})
+        RenderCacheEntry.objects.create(key=key, renderer='test', source_sha256='a' * 64)
+
+        def other_worker_finishes(seconds):
+            entry = RenderCacheEntry.objects.get(pk=key)
+            entry.file.save(f'{key}.bin', ContentFile(b'done'), save=False)
+            entry.status = 'ready'
+            entry.save()
+
+        render = mock.Mock(return_value=b'again')
+        with mock.patch('assets.render_cache.time.sleep', side_effect=other_worker_finishes) as sleep:
+            entry = render_cache.get_or_render('a' * 64, 'test', {}, render)
+        sleep.assert_called_once()
+        render.assert_not_called()
+        self.assertEqual(entry.file.read(), b'done')
+
+    def test_failed_render_releases_the_claim(self):
+        with self.assertRaises(ValueError):
+            render_cache.get_or_render('b' * 64, 'test', {}, mock.Mock(side_effect=ValueError))
+        self.assertFalse(RenderCacheEntry.objects.exists())
+        entry = render_cache.get_or_render('b' * 64, 'test', {}, lambda: b'ok')
+        self.assertEqual(entry.status, 'ready')
+
+    @override_settings(RENDER_CACHE_MAX_BYTES=10)
+    def test_evicts_least_recently_used(self):
+        entries = [render_cache.get_or_render(str(i) * 64, 'test', {}, lambda: b'1234') for i in range(2)]
+        render_cache.get_or_render('0' * 64, 'test', {}, mock.Mock())  # hit: 0 becomes most recent
+        render_cache.get_or_render('2' * 64, 'test', {}, lambda: b'1234')
+
+        self.assertEqual(set(RenderCacheEntry.objects.values_list('source_sha256', flat=True)), {'0' * 64, '2' * 64})
+        self.assertFalse(entries[1].file.storage.exists(entries[1].file.name))
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class ProgressPublishingTests(TestCase):
+    """ Test rate limiting and coalescing of processing progress messages """
+    def setUp(self):
+        self.layer = get_channel_layer()
+        self.user = User.objects.create_user(username='chatty', password='testpass')
+        project = Project.objects.create(owner=self.user, name='Chatty Project')
+        asset = Asset.objects.create(project=project, owner=self.user, name='Chatty')
+        self.version = Version.objects.create(asset=asset, number=1, user=self.user, file='legacy/chatty.exr')
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(progress.group_name(asset.id), self.channel)
+
+    def _received(self):
+        messages = []
+        while True:
+            try:
+                message = async_to_sync(asyncio.wait_for)(self.layer.receive(self.channel), 0.05)
+            except asyncio.TimeoutError:
+                return messages
+            messages.append((message['payload']['state'], message['payload']['progress']))
+
+    def test_progress_is_rate_limited_and_coalesced(self):
+        sent = [progress.publish_progress(self.version, percent) for percent in range(1, 101)]
+        self.assertEqual(sent.count(True), 1)
+        self.assertEqual(self._received(), [('processing', 1)])
+
+        progress.flush(self.version)
+        self.assertEqual(self._received(), [('processing', 100)])
+
+        progress.publish_progress(self.version, 50)
+        progress.publish_state(self.version, 'completed', 100)
+        progress.flush(self.version)
+        self.assertEqual(self._received(), [('completed', 100)])
+
+    @mock.patch.object(progress, 'PROGRESS_INTERVAL', 0.1)
+    def test_throttle_keeps_no_idle_entries(self):
+        progress.publish_state(self.version, 'queued')
+        self.assertNotIn(str(self.version.pk), progress._throttle)
+
+        # The terminal state is published by another process
+        progress.publish_state(self.version, 'processing', 0)
+        self.assertIn(str(self.version.pk), progress._throttle)
+        time.sleep(0.15)
+        other = Version.objects.create(asset=self.version.asset, number=2, user=self.user, file='legacy/other.exr')
+        progress.publish_state(other, 'queued')
+        self.assertNotIn(str(self.version.pk), progress._throttle)
+        self._received()
+
+    @mock.patch.object(progress, 'PROGRESS_INTERVAL', 0.1)
+    def test_held_progress_is_sent_after_the_interval(self):
+        progress.publish_progress(self.version, 10)
+        self.assertFalse(progress.publish_progress(self.version, 20))
+        self.assertFalse(progress.publish_progress(self.version, 30))
+        time.sleep(0.3)
+        self.assertEqual(self._received(), [('processing', 10), ('processing', 30)])
+
+        progress.publish_progress(self.version, 40)
+        self.assertFalse(progress.publish_progress(self.version, 50))
+        progress.publish_state(self.version, 'completed', 100)
+        time.sleep(0.3)
+        self.assertEqual(self._received(), [('processing', 40), ('completed', 100)])
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class SpriteSheetTests(TempMediaMixin, APITestCase):
+    """ Test the project image sprite sheet endpoint """
+    def setUp(self):
+        super().setUp()
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+        self.user = User.objects.create_user(username='sprites', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Sprite Project')
+        self.client.force_authenticate(user=self.user)
+        self.assets = []
+        for i, colour in enumerate([(255, 0, 0), (0, 255, 0), (0, 0, 255)]):
+            asset = Asset.objects.create(project=self.project, owner=self.user, name=f'Image {i}')
+            buf = io.BytesIO()
+            Image.new('RGB', (256, 128), colour).save(buf, 'PNG')
+            asset.file.save(f'image_{i}.png', ContentFile(buf.getvalue()))
+            thumbnails.generate_for_assets([asset], workers=1)
+            self.assets.append(asset)
+
+    def test_sheet_is_built_then_served(self):
+        url = f'/api/assets/project-images/sprite/?project={self.project.id}&tile=64'
+        # The (eager) build is queued by the first request
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_202_ACCEPTED)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['status'], 'ready')
+        self.assertEqual((response.data['columns'], response.data['width'], response.data['height']), (2, 128, 128))
+        tile = response.data['tiles'][1]
+        self.assertEqual(tile, {'id': self.assets[1].id, 'x': 64, 'y': 16, 'w': 64, 'h': 32})
+
+        sheet = self.client.get(response.data['sheet_url'])
+        self.assertIn('immutable', sheet['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(sheet.streaming_content))) as img:
+            r, g, b = img.convert('RGB').getpixel((96, 32))
+            self.assertTrue(g > 200 and r < 60 and b < 60)
+
+    def test_new_version_changes_the_sheet(self):
+        url = f'/api/assets/project-images/sprite/?project={self.project.id}'
+        self.client.get(url)
+        key = self.client.get(url).data['key']
+
+        self.client.post(f'/api/assets/{self.assets[0].id}/version-up/', {
+            'status': 'work_in_progress',
+            'file': SimpleUploadedFile('image_0.png', b'new version'),
+        }, format='multipart')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(response.data['key'], key)
+
+        # The (eager) build of the page's new sheet deleted the superseded one
+        _, files = default_storage.listdir(sprites.sprites_dir(self.project.id))
+        self.assertEqual(sorted(files), [f"{response.data['key']}.jpg", f"{response.data['key']}.json"])
+
+    def test_pages_follow_the_listing_cursors(self):
+        url = f'/api/assets/project-images/sprite/?project={self.project.id}&page_size=2'
+        first = self.client.get(url)
+        self.assertTrue(first.data['key'].startswith(f'{self.assets[0].id}-'))
+        self.assertIsNone(first.data['previous'])
+
+        # Queues the (eager) build, then serves the map
+        self.assertTrue(self.client.get(first.data['next']).data['key'].startswith(f'{self.assets[2].id}-'))
+        second = self.client.get(first.data['next'])
+        self.assertEqual([tile['id'] for tile in second.data['tiles']], [self.assets[2].id])
+        self.assertIsNone(second.data['next'])
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class BatchUploadTests(TempMediaMixin, APITestCase):
+    """ Test the batch upload endpoint """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='batcher', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Batch Project')
+        self.client.force_authenticate(user=self.user)
+
+    def _post(self, files, **data):
+        data.update(project=self.project.id, file=files)
+        return self.client.post('/api/assets/upload/batch/', data, format='multipart')
+
+    def test_files_become_versions(self):
+        existing = Asset.objects.create(project=self.project, owner=self.user, name='shot010')
+        Version.objects.create(asset=existing, number=4, user=self.user, file='legacy/shot010.exr')
+
+        response = self._post([
+            SimpleUploadedFile('shot010.exr', b'new plate'),
+            SimpleUploadedFile('shot020.exr', b'other plate'),
+        ], status='work_in_progress')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created_assets'], 1)
+        numbers = {v['name']: v['number'] for v in response.data['versions']}
+        self.assertEqual(numbers, {'shot010': 5, 'shot020': 1})
+        self.assertEqual(set(Version.objects.values_list('status', flat=True)), {'placeholder', 'work_in_progress'})
+        self.assertEqual(Blob.objects.get(pk=hashlib.sha256(b'new plate').hexdigest()).ref_count, 1)
+
+    def test_manifest_and_query_count_independent_of_batch_size(self):
+        def run(count, offset):
+            files = [SimpleUploadedFile(f'f{offset + i}.png', b'%d' % (offset + i)) for i in range(count)]
+            manifest = [{'file': f.name, 'name': f'asset {offset + i}', 'asset_type': 'image'} for i, f in enumerate(files)]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._post(files, manifest=json.dumps(manifest))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(run(2, 0), run(6, 100))
+        self.assertEqual(Asset.objects.filter(asset_type='image').count(), 8)
+
+        # Content already stored is referenced by hash, without a file part
+        response = self._post([], manifest=json.dumps([
+            {'sha256': hashlib.sha256(b'0').hexdigest(), 'name': 'asset 0'},
+        ]))
+        self.assertEqual(response.data['versions'][0]['number'], 2)
+        self.assertEqual(Blob.objects.get(pk=hashlib.sha256(b'0').hexdigest()).ref_count, 2)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class IngestDirectoryTests(TempMediaMixin, TestCase):
+    """ Test the parallel directory ingest """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ingester', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Delivery')
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        files = {
+            'hero.png': b'\x89PNG\r\n\x1a\n hero',
+            'props/chair.obj': b'v 0 0 0',
+            'props/chair_copy.obj': b'v 0 0 0',
+            'docs/notes': b'%PDF-1.7 notes',
+            'clips/intro': b'\x00\x00\x00\x18ftypmp42',
+            'misc/data.bin': b'\x00\x01',
+            '.cache/thumbs.db': b'hidden',
+        }
+        for relpath, content in files.items():
+            (self.root / relpath).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / relpath).write_bytes(content)
+
+    def test_asset_names_and_types(self):
+        self.assertEqual(ingest.asset_name('shots/sh010/plate.v2.exr'), 'plate.v2')
+        self.assertEqual(ingest.asset_name('shots/sh010/plate.exr', 'path'), 'shots/sh010/plate')
+        self.assertEqual(ingest.asset_name('shots/sh010/plate.exr', 'parent'), 'sh010')
+        pattern = re.compile(r'(?P<name>sh\d+)_v\d+')
+        self.assertEqual(ingest.asset_name('plates/sh020_v003.exr', pattern=pattern), 'sh020')
+        self.assertIsNone(ingest.asset_name('plates/readme.txt', pattern=pattern))
+
+        self.assertEqual(ingest.classify('a.JPG', b''), 'image')
+        self.assertEqual(ingest.classify('scan', b'\xff\xd8\xff\xe0'), 'image')
+        self.assertEqual(ingest.classify('model', b'glTF\x02'), 'geometry')
+        self.assertEqual(ingest.classify('unknown', b'\x00'), 'document')
+
+    def test_ingest_is_restartable(self):
+        hero = Asset.objects.create(project=self.project, owner=self.user, name='hero')
+        Version.objects.create(asset=hero, number=1, user=self.user, file='legacy/hero.png')
+
+        out = io.StringIO()
+        call_command('ingest_directory', str(self.root), self.project.pk, batch_size=2, workers=3,
+                     no_process=True, stdout=out)
+        self.assertIn('Read 6 files', out.getvalue())
+        self.assertIn('5 versions, 4 new assets, 1 already ingested', out.getvalue())
+        types = dict(Asset.objects.filter(project=self.project).values_list('name', 'asset_type'))
+        self.assertEqual(types, {'hero': 'image', 'chair': 'geometry', 'notes': 'document',
+                                 'intro': 'video', 'data': 'document'})
+        self.assertFalse(Asset.objects.filter(name='thumbs').exists())
+
+        version = Version.objects.get(asset=hero, number=2)
+        self.assertEqual(version.original_name, 'hero.png')
+        self.assertEqual(version.description, 'ingested from hero.png')
+        with version.file.open('rb') as f:
+            self.assertEqual(f.read(), b'\x89PNG\r\n\x1a\n hero')
+        self.assertEqual(Blob.objects.get(pk=hashlib.sha256(b'v 0 0 0').hexdigest()).ref_count, 1)
+
+        # A second run finds every content hash already ingested
+        (self.root / 'hero_v2.png').write_bytes(b'\x89PNG\r\n\x1a\n hero 2')
+        out = io.StringIO()
+        with mock.patch.object(ingest.tempfile, 'mkstemp', wraps=tempfile.mkstemp) as mkstemp:
+            call_command('ingest_directory', str(self.root), self.project.pk, naming='parent', no_process=True,
+                         stdout=out)
+        self.assertIn('1 versions, 1 new assets, 6 already ingested', out.getvalue())
+        # Only the new content was copied
+        self.assertEqual(mkstemp.call_count, 1)
+        self.assertTrue(Asset.objects.filter(project=self.project, name='hero_v2').exists())
+        self.assertFalse(os.listdir(blob_storage.temp_dir()))
+
+    def test_stored_content_collected_after_hashing_is_copied(self):
+        content = (self.root / 'hero.png').read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        blob_storage.save(blob_name(digest), ContentFile(content))
+        source = str(self.root / 'hero.png')
+        entry = {'path': 'hero.png', 'name': 'hero', 'source': source, 'probe': True}
+        entry['staged'], entry['sha256'], entry['size'], entry['asset_type'] = ingest.copy_file(source, probe=True)
+        self.assertIsNone(entry['staged'])
+
+        blob_storage.delete(blob_name(digest))
+        ingest._write_batch(self.project, self.user, [entry], 'placeholder', set(), ingest.Report(), False)
+        version = Version.objects.get(asset__name='hero')
+        with version.file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 1)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class RetrieveUXCanvasImagesTests(TempMediaMixin, TestCase):
+    """ Test the concurrent UXCanvas import against a local stand-in server """
+    MISSING = '29ad8926-c761-4955-a819-a0623dfe5a5f'
+    FLAKY = '77ab4ba2-0910-4565-b16d-f5a31131e46c'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='importer', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='cyber-nexus')
+        Asset.objects.create(project=self.project, owner=self.user, name='Hover Vehicle')
+
+        buf = io.BytesIO()
+        Image.new('RGB', (64, 48), (40, 90, 200)).save(buf, 'JPEG')
+        body = buf.getvalue()
+        requested = self.requested = []
+        test = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                image_id = self.path.rsplit('/', 1)[-1]
+                requested.append(image_id)
+                if image_id == test.MISSING:
+                    self.send_error(404)
+                elif image_id == test.FLAKY and requested.count(image_id) == 1:
+                    self.send_error(503)
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.base_url = f'http://127.0.0.1:{server.server_port}/images'
+
+    def test_concurrent_import(self):
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('retrieve_uxcanvas_images', user_id=self.user.pk, base_url=self.base_url,
+                         concurrency=4, backoff=0, batch_size=10, stdout=out)
+
+        # 37 images, 34 distinct names, one already imported, one missing upstream
+        assets = Asset.objects.filter(project=self.project).exclude(name='Hover Vehicle')
+        self.assertEqual(assets.count(), 32)
+        self.assertEqual(len(self.requested), 34)
+        self.assertEqual(self.requested.count(self.FLAKY), 2)
+        self.assertNotIn('0512db2b-5daa-41bb-90a0-8e27b8bffda4', self.requested)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "assets_asset"')]
+        self.assertEqual(len(inserts), 4)
+
+        portrait = Asset.objects.get(project=self.project, name='Character Portrait')
+        self.assertTrue(portrait.is_rendered)
+        self.assertEqual(portrait.file.name, f'assets/{self.FLAKY}.jpg')
+        with portrait.file.open('rb') as f:
+            self.assertEqual(Image.open(f).size, (64, 48))
+        self.assertTrue(portrait.thumbnail)
+        self.assertIn('32 images, 4 skipped, 1 errors', out.getvalue())
+
+        # A second run finds everything with the up-front query and downloads nothing new
+        self.requested.clear()
+        call_command('retrieve_uxcanvas_images', user_id=self.user.pk, base_url=self.base_url,
+                     backoff=0, stdout=io.StringIO())
+        self.assertEqual(self.requested, [self.MISSING])
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class CursorPaginationTests(APITestCase):
+    """ Test keyset pagination of the asset listings """
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Paged Project')
+        self.client.force_authenticate(user=self.user)
+        other = Project.objects.create(owner=self.user, name='Other Project')
+        # Names repeated across projects check that the id tie-breaker keeps pages disjoint
+        for project, names in ((self.project, 'bacedf'), (other, 'ac')):
+            for name in names:
+                Asset.objects.create(project=project, owner=self.user, name=name, asset_type='image')
+        self.expected = [a.id for a in Asset.objects.order_by('name', 'id')]
+
+    def _walk(self, url, key):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            ids.extend(item['id'] for item in response.data[key])
+            url = response.data['next']
+        return ids, pages
+
+    def test_list_pages_forward_and_back(self):
+        ids, pages = self._walk('/api/assets/?page_size=3', 'results')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual([len(p['results']) for p in pages], [3, 3, 2])
+        self.assertIsNone(pages[0]['previous'])
+
+        back = self.client.get(pages[2]['previous']).data
+        self.assertEqual([a['id'] for a in back['results']], self.expected[3:6])
+        back = self.client.get(back['previous']).data
+        self.assertEqual([a['id'] for a in back['results']], self.expected[:3])
+        self.assertIsNone(back['previous'])
+        self.assertIsNotNone(back['next'])
+
+    def test_project_images_pages_without_count_query(self):
+        url = f'/api/assets/project-images/?project={self.project.id}&page_size=4'
+        with CaptureQueriesContext(connection) as ctx:
+            ids, pages = self._walk(url, 'images')
+        self.assertEqual(ids, [a.id for a in self.project.assets.order_by('name')])
+        self.assertEqual([p['count'] for p in pages], [4, 2])
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_page_size_is_capped_and_cursor_validated(self):
+        response = self.client.get('/api/assets/?page_size=100000')
+        self.assertEqual(len(response.data['results']), len(self.expected))
+        response = self.client.get('/api/assets/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class SparseListingTests(APITestCase):
+    """ Test prefetching and sparse fieldsets of the asset list """
+    def setUp(self):
+        self.user = User.objects.create_user(username='browser', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Browse Project')
+        self.client.force_authenticate(user=self.user)
+        for i in range(6):
+            asset = Asset.objects.create(project=self.project, owner=self.user, name=f'asset {i}',
+                                         ai_data={'labels': ['x'] * 100})
+            for number in range(1, 4):
+                Version.objects.create(asset=asset, number=number, user=self.user, file=f'legacy/{i}_{number}.exr')
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, ctx.captured_queries
+
+    def test_query_count_independent_of_page_size(self):
+        _, small = self._queries('/api/assets/?page_size=2')
+        response, large = self._queries('/api/assets/?page_size=6')
+        self.assertEqual(len(small), len(large))
+        self.assertEqual([len(a['versions']) for a in response.data['results']], [3] * 6)
+
+    def test_fields_and_expand(self):
+        response, queries = self._queries('/api/assets/?fields=id,name,bogus')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('ai_data', queries[0]['sql'])
+
+        response = self.client.get('/api/assets/?fields=id&expand=versions&latest_versions=1')
+        first = response.data['results'][0]
+        self.assertEqual(set(first), {'id', 'versions'})
+        self.assertEqual([v['number'] for v in first['versions']], [3])
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class ResponseCacheTests(TempMediaMixin, APITestCase):
+    """ Test the versioned response cache of the list endpoints """
+    def setUp(self):
+        super().setUp()
+        caches['responses'].clear()
+        self.user = User.objects.create_user(username='poller', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Polled Project')
+        self.asset = Asset.objects.create(project=self.project, owner=self.user, name='plate')
+        self.client.force_authenticate(user=self.user)
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(ctx.captured_queries)
+
+    def test_hits_skip_the_database_until_a_write(self):
+        urls = [
+            '/api/projects/',
+            '/api/assets/',
+            f'/api/assets/{self.asset.id}/versions/',
+            f'/api/assets/project-images/?project={self.project.id}',
+        ]
+        for url in urls:
+            self.assertEqual(self._get(url)[0]['X-Cache'], 'MISS')
+            response, queries = self._get(url)
+            self.assertEqual((response['X-Cache'], queries), ('HIT', 0))
+
+        Version.objects.create(asset=self.asset, number=1, user=self.user, file='legacy/plate.exr')
+        for url in urls[1:]:
+            self.assertEqual(self._get(url)[0]['X-Cache'], 'MISS')
+        self.assertEqual(self._get(urls[0])[0]['X-Cache'], 'HIT')
+
+        Project.objects.create(owner=self.user, name='Second Project')
+        response, _ = self._get(urls[0])
+        self.assertEqual((response['X-Cache'], len(response.data)), ('MISS', 2))
+
+    def test_invalidation_is_scoped(self):
+        url = f'/api/assets/{self.asset.id}/versions/'
+        self._get(url)
+        other = Asset.objects.create(project=self.project, owner=self.user, name='other plate')
+        self.assertEqual(self._get(url)[0]['X-Cache'], 'HIT')
+
+        Comment.objects.create(asset=self.asset, author=self.user, content='Looks good')
+        self.assertEqual(self._get(url)[0]['X-Cache'], 'MISS')
+
+        # Bulk writes bump the generations explicitly
+        self._get(f'/api/assets/{other.id}/versions/')
+        self.client.post('/api/assets/upload/batch/', {
+            'project': self.project.id,
+            'manifest': json.dumps([{'file': 'x.exr', 'name': 'other plate'}]),
+            'file': [SimpleUploadedFile('x.exr', b'x')],
+        }, format='multipart')
+        response, _ = self._get(f'/api/assets/{other.id}/versions/')
+        self.assertEqual((response['X-Cache'], len(response.data['versions'])), ('MISS', 1))
+
+    @mock.patch.object(response_cache, '_counts', Counter())
+    def test_stats(self):
+        url = '/api/assets/'
+        self._get(url)
+        self._get(url)
+        self.assertEqual(self.client.get('/api/assets/cache-stats/').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get('/api/assets/cache-stats/').data
+        self.assertEqual(stats['asset-list'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        self.assertEqual(stats['total']['hits'], 1)
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class QueryPlanTests(TestCase):
+    """ Test that the hot asset/version queries are served by indexes """
+    def test_benchmark_plans_use_indexes(self):
+        out = io.StringIO()
+        call_command('benchmark_asset_queries', assets=500, projects=5, repeat=1, check=True, stdout=out)
+        self.assertIn('asset_owner_proj_type_name', out.getvalue())
+        self.assertFalse(Asset.objects.exists())
+
+    def test_sqlite_benchmark_reports_both_profiles(self):
+        out = io.StringIO()
+        call_command('benchmark_sqlite', writers=2, readers=2, duration=0.2, assets=10, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(':')[0] for line in lines], ['default', 'production'])
+        self.assertIn(" 0 'database is locked'", lines[1])
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class VersionCounterConcurrencyTests(TempMediaMixin, TransactionTestCase):
+    """ Stress the atomic version counter with parallel version_up calls """
+    THREADS = 8
+    VERSIONS_PER_THREAD = 5
+
+    def setUp(self):
+        super().setUp()
+        # Only the numbering is under test: don't queue the processing pipelines
+        enqueue = mock.patch('assets.processing.enqueue')
+        enqueue.start()
+        self.addCleanup(enqueue.stop)
+
+        self.user = User.objects.create_user(username='racer', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Race Project')
+        self.asset = Asset.objects.create(project=self.project, owner=self.user, name='Contested')
+
+    def _worker(self, index, barrier, errors):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        try:
+            barrier.wait()
+            for i in range(self.VERSIONS_PER_THREAD):
+                response = client.post(f'/api/assets/{self.asset.id}/version-up/', {
+                    'status': 'work_in_progress',
+                    'file': SimpleUploadedFile('take.exr', b'%d-%d' % (index, i)),
+                }, format='multipart')
+                if response.status_code != status.HTTP_201_CREATED:
+                    errors.append(response.status_code)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_parallel_version_up_has_no_gaps_or_collisions(self):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+        threads = [threading.Thread(target=self._worker, args=(i, barrier, errors)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        total = self.THREADS * self.VERSIONS_PER_THREAD
+        numbers = sorted(self.asset.versions.values_list('number', flat=True))
+        self.assertEqual(numbers, list(range(1, total + 1)))
+        self.asset.refresh_from_db()
+        self.assertEqual(self.asset.version_counter, total)
+
+    def test_concurrent_commits_of_one_session_create_one_version(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        client.post(f'/api/assets/{self.asset.id}/version-up/', {
+            'status': 'work_in_progress',
+            'file': SimpleUploadedFile('take.exr', b'retried take'),
+        }, format='multipart')
+        session_id = client.post('/api/assets/uploads/', {
+            'asset': self.asset.id,
+            'status': 'work_in_progress',
+            'filename': 'take.exr',
+            'sha256': hashlib.sha256(b'retried take').hexdigest(),
+        }, format='json').data['id']
+
+        barrier = threading.Barrier(self.THREADS)
+        codes = []
+
+        def commit():
+            worker = APIClient()
+            worker.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                codes.append(worker.post(f'/api/assets/uploads/{session_id}/commit/').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=commit) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(codes), [status.HTTP_201_CREATED] + [status.HTTP_409_CONFLICT] * (self.THREADS - 1))
+        self.assertEqual(self.asset.versions.count(), 2)
@@ -0,0 +1,155 @@
+""" Multi-resolution thumbnail generation for image assets.
+
+Each source image is decoded once (JPEGs in draft mode, at the smallest
+DCT scale still larger than the biggest thumbnail) and every size is
+derived from the previous, larger one. Each size is written as JPEG (PNG
+when the image has transparency) and WebP. Batches are spread over a
+process pool so large imports use every core.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Longest edge of each generated thumbnail, in pixels
+THUMBNAIL_SIZES = (1024, 512, 128)
+# Size stored in Asset.thumbnail, served when no size is requested
+DEFAULT_THUMBNAIL_SIZE = 512
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def _has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def _encode(img, fmt):
+    buf = io.BytesIO()
+    if fmt == 'JPEG':
+        img.convert('RGB').save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif fmt == 'PNG':
+        img.save(buf, 'PNG', optimize=True)
+    else:
+        img.save(buf, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buf.getvalue()
+
+
+def render_thumbnails(source_path, sizes=THUMBNAIL_SIZES):
+    """
+    Decode source_path once and return a list of
+    (size, extension, width, height, bytes), largest size first.
+    Runs in pool workers, so it only deals with paths and bytes.
+    """
+    sizes = sorted(sizes, reverse=True)
+    with Image.open(source_path) as img:
+        # JPEG only: let libjpeg decode at a reduced scale
+        img.draft('RGB', (sizes[0], sizes[0]))
+        img = ImageOps.exif_transpose(img)
+        alpha = _has_alpha(img)
+        if img.mode not in ('RGB', 'RGBA', 'L'):
+            img = img.convert('RGBA' if alpha else 'RGB')
+
+        results = []
+        current = img
+        for size in sizes:
+            current = current.copy()
+            current.thumbnail((size, size), Image.LANCZOS, reducing_gap=2.0)
+            width, height = current.size
+            main_ext = 'png' if alpha else 'jpg'
+            results.append((size, main_ext, width, height, _encode(current, 'PNG' if alpha else 'JPEG')))
+            results.append((size, 'webp', width, height, _encode(current, 'WEBP')))
+    return results
+
+
+def _render_or_none(source_path):
+    """ render_thumbnails, returning None for unreadable or oversized sources. """
+    try:
+        return render_thumbnails(source_path)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def thumbnail_source(asset):
+    """ Return the FieldFile to thumbnail: the latest version's file, else asset.file. """
+    latest = asset.versions.order_by('-number').first()
+    if latest is not None and latest.file:
+        return latest.file
+    return asset.file or None
+
+
+def _pool_size():
+    return int(getattr(settings, 'THUMBNAIL_WORKERS', 0) or os.cpu_count() or 1)
+
+
+def store_thumbnails(asset, rendered):
+    """
+    Save rendered thumbnails (see render_thumbnails) for asset and record
+    them in asset.thumbnails as {"<size>": {"width", "height", "<ext>": name}}.
+    """
+    storage = asset.thumbnail.storage
+    for entry in (asset.thumbnails or {}).values():
+        for key, name in entry.items():
+            if key not in ('width', 'height'):
+                storage.delete(name)
+
+    thumbnails = {}
+    for size, ext, width, height, content in rendered:
+        name = storage.save(f'thumbnails/{asset.id}/thumb_{size}.{ext}', ContentFile(content))
+        entry = thumbnails.setdefault(str(size), {'width': width, 'height': height})
+        entry[ext] = name
+
+    asset.thumbnails = thumbnails
+    default = thumbnails.get(str(DEFAULT_THUMBNAIL_SIZE)) or next(iter(thumbnails.values()), {})
+    asset.thumbnail.name = default.get('jpg') or default.get('png')
+    # updated_at changes the ?v= token of the media URLs and sprite sheet keys
+    asset.save(update_fields=['thumbnail', 'thumbnails', 'updated_at'])
+
+
+def generate_for_assets(assets, workers=None):
+    """
+    Generate thumbnails for image assets, decoding in a process pool.
+    Returns the number of assets thumbnailed; unreadable sources are skipped.
+    """
+    jobs = []
+    for asset in assets:
+        source = thumbnail_source(asset) if asset.asset_type == 'image' else None
+        if source:
+            jobs.append((asset, source.path))
+    if not jobs:
+        return 0
+
+    paths = [path for _, path in jobs]
+    workers = min(workers or _pool_size(), len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_render_or_none, paths))
+    else:
+        outcomes = [_render_or_none(path) for path in paths]
+
+    done = 0
+    for (asset, _), rendered in zip(jobs, outcomes):
+        if rendered:
+            store_thumbnails(asset, rendered)
+            done += 1
+    return done
+
+
+def pick_thumbnail(asset, size=None, fmt=None):
+    """
+    Return the stored name of the smallest thumbnail at least size pixels
+    (the largest one if none is big enough), in fmt ('webp') when available.
+    Falls back to asset.thumbnail.
+    """
+    thumbnails = asset.thumbnails or {}
+    if not thumbnails or (size is None and fmt is None):
+        return asset.thumbnail.name
+    available = sorted(int(s) for s in thumbnails)
+    wanted = size or DEFAULT_THUMBNAIL_SIZE
+    chosen = next((s for s in available if s >= wanted), available[-1])
+    entry = thumbnails[str(chosen)]
+    return entry.get(fmt) or entry.get('jpg') or entry.get('png')
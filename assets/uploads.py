@@ -0,0 +1,180 @@
+""" Chunked, resumable uploads for asset versions.
+
+An upload session is opened with ``init``, receives its bytes through any
+number of ``append`` calls and becomes a ``Version`` on ``commit``.
+Chunks are streamed straight into a ``.part`` file in the blob store's
+temporary directory, so committing is a rename on the same volume and
+memory usage stays bounded by the read block size.
+
+Sessions left idle (neither committed nor aborted) for longer than
+ASSET_UPLOAD_SESSION_TTL are marked 'expired' by ``expire_sessions`` (run
+periodically by the expire_upload_sessions task or management command),
+which removes their ``.part`` files.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from versions.storage import blob_storage
+
+from .models import UploadSession
+
+# Largest chunk accepted by a single append request (bytes)
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Size of the blocks read from the request stream and written to disk
+READ_BLOCK_SIZE = 64 * 1024
+
+# Seconds an upload session may stay idle before it is expired
+DEFAULT_SESSION_TTL = 24 * 3600
+# Running digests kept in memory; older ones are rebuilt from the .part file when needed
+MAX_HASHERS = 256
+
+# session id -> (offset, running sha256) for sessions appended in this process,
+# least recently used first. Another worker (or a restart, or an eviction)
+# rebuilds the digest from the .part file.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadOffsetMismatch(Exception):
+    """ Raised when a chunk does not start at the acknowledged offset. """
+
+    def __init__(self, expected):
+        super().__init__(f'expected offset {expected}')
+        self.expected = expected
+
+
+def chunk_size():
+    """ Return the maximum chunk size accepted by append. """
+    return int(getattr(settings, 'ASSET_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+
+
+def session_ttl():
+    """ Return the seconds an upload session may stay idle before it is expired. """
+    return int(getattr(settings, 'ASSET_UPLOAD_SESSION_TTL', DEFAULT_SESSION_TTL))
+
+
+def part_path(session):
+    """ Return the temporary file receiving the chunks of an upload session. """
+    return Path(blob_storage.temp_dir()) / f'{session.id}.part'
+
+
+def _drop_hasher(session_id):
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+
+
+def _keep_hasher(session_id, offset, hasher):
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+        _hashers[session_id] = (offset, hasher)
+        while len(_hashers) > MAX_HASHERS:
+            del _hashers[next(iter(_hashers))]
+
+
+def _hasher_at(session, path):
+    """ Return a sha256 object covering the first session.offset bytes of path. """
+    with _hashers_lock:
+        entry = _hashers.pop(session.pk, None)
+    if entry is not None and entry[0] == session.offset:
+        return entry[1]
+
+    hasher = hashlib.sha256()
+    remaining = session.offset
+    if remaining:
+        with open(path, 'rb') as f:
+            while remaining:
+                block = f.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def start(session):
+    """ Create the empty .part file for a new session. """
+    path = part_path(session)
+    os.makedirs(path.parent, exist_ok=True)
+    with open(path, 'wb'):
+        pass
+    _keep_hasher(session.pk, 0, hashlib.sha256())
+
+
+def append(session, stream, offset, length=None):
+    """
+    Write the bytes of stream at offset and return the new offset.
+
+    Anything past the last acknowledged offset (e.g. half a chunk from a
+    dropped connection) is truncated before writing, so a client resumes
+    simply by re-sending from the offset reported by the server.
+    """
+    if offset != session.offset:
+        raise UploadOffsetMismatch(session.offset)
+
+    path = part_path(session)
+    hasher = _hasher_at(session, path)
+    limit = chunk_size()
+    written = 0
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.truncate()
+        while length is None or written < length:
+            want = READ_BLOCK_SIZE if length is None else min(READ_BLOCK_SIZE, length - written)
+            block = stream.read(want)
+            if not block:
+                break
+            written += len(block)
+            if written > limit:
+                raise ValueError(f'chunk exceeds {limit} bytes')
+            f.write(block)
+            hasher.update(block)
+
+    new_offset = offset + written
+    _keep_hasher(session.pk, new_offset, hasher)
+    return new_offset
+
+
+def finish(session):
+    """
+    Return (path, sha256 hex digest, size) of the completed .part file, still
+    unpublished: Blob.adopt moves it into the blob store with its reference.
+    """
+    path = part_path(session)
+    digest = _hasher_at(session, path).hexdigest()
+    _drop_hasher(session.pk)
+    return str(path), digest, os.path.getsize(path)
+
+
+def discard(session):
+    """ Remove the .part file of an aborted session. """
+    _drop_hasher(session.pk)
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def expire_sessions(ttl=None):
+    """
+    Mark the active sessions idle for more than ttl seconds (default:
+    session_ttl()) 'expired' and remove their .part files. Returns the
+    number of sessions expired.
+    """
+    ttl = session_ttl() if ttl is None else ttl
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    expired = 0
+    for session in UploadSession.objects.filter(status='active', updated_at__lt=cutoff).only('pk').iterator():
+        # Conditional: a chunk acknowledged meanwhile keeps the session alive
+        if UploadSession.objects.filter(pk=session.pk, status='active', updated_at__lt=cutoff).update(
+            status='expired', updated_at=timezone.now()
+        ):
+            discard(session)
+            expired += 1
+    return expired
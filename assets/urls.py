@@ -1,6 +1,9 @@
 from django.urls import path
 from .views import AssetListView, AssetDetailView, upload_asset, AssetVersionsView, version_up
-from .views import current_user, serve_asset_image, serve_asset_thumbnail, list_project_images
+from .views import current_user, serve_asset_image, serve_asset_thumbnail, serve_version_file, list_project_images
+from .views import upload_session_init, upload_session_detail, upload_session_commit
+from .views import project_images_sprite, serve_sprite_sheet, upload_assets_batch, response_cache_stats
+from .views import similar_project_images, visually_similar_images, search_assets
 
 urlpatterns = [
     path('', AssetListView.as_view(), name='asset-list'),
@@ -9,7 +12,18 @@ urlpatterns = [
     path('<int:pk>/version-up/', version_up, name='asset-version-up'),
     path('<int:asset_id>/image/', serve_asset_image, name='asset-image'),
     path('<int:asset_id>/thumbnail/', serve_asset_thumbnail, name='asset-thumbnail'),
+    path('<int:asset_id>/versions/<int:number>/file/', serve_version_file, name='asset-version-file'),
     path('upload/', upload_asset, name='asset-upload'),
+    path('upload/batch/', upload_assets_batch, name='asset-upload-batch'),
+    path('uploads/', upload_session_init, name='asset-upload-init'),
+    path('uploads/<uuid:session_id>/', upload_session_detail, name='asset-upload-session'),
+    path('uploads/<uuid:session_id>/commit/', upload_session_commit, name='asset-upload-commit'),
     path('user/', current_user, name='current-user'),
+    path('search/', search_assets, name='asset-search'),
+    path('cache-stats/', response_cache_stats, name='response-cache-stats'),
     path('project-images/', list_project_images, name='project-images'),
+    path('project-images/similar/', similar_project_images, name='project-images-similar'),
+    path('project-images/visually-similar/', visually_similar_images, name='project-images-visually-similar'),
+    path('project-images/sprite/', project_images_sprite, name='project-images-sprite'),
+    path('project-images/sprite/<int:project_id>/<slug:key>/', serve_sprite_sheet, name='project-images-sprite-sheet'),
 ]
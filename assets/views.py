@@ -1,39 +1,51 @@
 # Python
 """ This module contains the views for the assets app.
 
-It defines API endpoints for uploading assets, retrieving asset details,
-listing assets, listing versions for an asset, and creating a new version ("version up").
+It defines API endpoints for uploading assets (in one request or as resumable
+chunked upload sessions), retrieving asset details, listing assets, listing
+versions for an asset, and creating a new version ("version up").
 """
 
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+from io import BytesIO
 from pathlib import Path
-import os
+import json
 
-from django.conf import settings
-from django.core.files.storage import FileSystemStorage
-from django.db.models import Max
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.db.models.fields.files import FieldFile
 from django.shortcuts import get_object_or_404
-from django.utils.text import slugify
+from django.utils import timezone
 
 from rest_framework import generics, permissions
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status as drf_status
-from django.http import HttpResponse, Http404
+from django.http import Http404
 from django.views.decorators.cache import cache_control
 
-from .models import Asset
+from . import embeddings, media, phash, processing, render_cache, search, sprites, thumbnails, uploads
+from .models import Asset, UploadSession
+from .pagination import KeysetPagination
 from .serializers import AssetSerializer
+from .tasks import build_sprite_sheet
 from projects.models import Project
-from versions.models import Version
+from versions.models import Blob, Version
+from versions.storage import blob_name, blob_storage, digest_from_name
 from versions.constants import STATUS_VALUES
+from stratopipe import response_cache
 
 
 class AssetUploadView(generics.CreateAPIView):
     """
-    Handles the upload of assets. Depending on the asset type, it triggers
-    rendering or AI processing tasks asynchronously.
+    Handles the upload of assets. Rendering and AI processing run on each new
+    Version, through the pipeline registered for the asset type (processing.py).
     """
     queryset = Asset.objects.all()
     serializer_class = AssetSerializer
@@ -41,8 +53,7 @@ class AssetUploadView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         # Save the asset associated with the current authenticated user
-        asset = serializer.save(owner=self.request.user)
-        # If you have async processing, trigger here (render/AI, etc.)
+        serializer.save(owner=self.request.user)
 
 
 class AssetDetailView(generics.RetrieveAPIView):
@@ -60,48 +71,79 @@ class AssetDetailView(generics.RetrieveAPIView):
 
 class AssetListView(generics.ListAPIView):
     """
-    Lists assets for the current authenticated user.
-    Supports filtering by ?project=<id>.
+    Lists assets for the current authenticated user, ordered by name.
+    Supports filtering by ?project=<id>; paginated with ?cursor= and ?page_size=.
+
+    Sparse fieldsets: ?fields=id,name,... returns only those fields (and
+    loads only their columns); ?expand=versions adds the nested versions to
+    them. ?latest_versions=K nests only the K latest versions of each asset.
+    Versions are prefetched, so the query count does not depend on page size.
     """
     queryset = Asset.objects.all()
     serializer_class = AssetSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    # Model columns backing serializer fields named differently
+    FIELD_COLUMNS = {'uploaded_by': 'owner'}
+
+    def get_requested_fields(self):
+        """ Return the set of fields selected by ?fields= and ?expand=, or None for all. """
+        params = self.request.query_params
+        if not params.get('fields'):
+            return None
+        available = set(AssetSerializer.Meta.fields)
+        fields = {name.strip() for name in params['fields'].split(',')} & available
+        expand = {name.strip() for name in params.get('expand', '').split(',')} & available
+        return fields | expand
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(
+            request, 'asset-list', [('user', request.user.pk)],
+            partial(super().list, request, *args, **kwargs),
+        )
 
     def get_queryset(self):
         qs = Asset.objects.filter(owner=self.request.user)
         project_id = self.request.query_params.get('project')
         if project_id:
             qs = qs.filter(project_id=project_id)
+
+        fields = self.get_requested_fields()
+        if fields is not None:
+            # The pagination keys are always needed to build the cursors
+            columns = {'id', 'name'} | {self.FIELD_COLUMNS.get(f, f) for f in fields - {'versions'}}
+            qs = qs.only(*columns)
+        if fields is None or 'versions' in fields:
+            qs = qs.prefetch_related(Prefetch('versions', queryset=self._versions_queryset()))
         return qs
 
+    def _versions_queryset(self):
+        versions = Version.objects.order_by('-number')
+        try:
+            latest = int(self.request.query_params['latest_versions'])
+        except (KeyError, ValueError):
+            return versions
+        # Rank the versions within each asset so one query serves every page row
+        rank = Window(RowNumber(), partition_by=F('asset_id'), order_by=F('number').desc())
+        return versions.annotate(rank=rank).filter(rank__lte=latest)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def upload_asset(request):
+
+def _resolve_asset(user, project, name, asset_type, description):
     """
-    Save uploaded file under MEDIA_ROOT/USER_DATA/<username>/<project-slug>/ and create a Version.
-    If the Asset (project+name) doesn't exist, create it; then create Version(number=next).
-    The file reference lives on the Version.
+    Find the Asset (project+name) or create it. For an existing asset, a
+    non-empty description and a valid asset_type overwrite the stored ones.
     """
-    user = request.user
-    project_id = request.data.get('project')
-    name = request.data.get('name')
-    asset_type = request.data.get('asset_type')
-    asset_description = (request.data.get('description') or '').strip()
-    upload = request.FILES.get('file')
-
-    if not project_id or not name or not upload:
-        return Response({'error': 'project, name and file are required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
-
-    # Ensure the project belongs to the current user
-    project = get_object_or_404(Project, pk=project_id, owner=user)
-
     # Create/find the Asset shell (file is optional; versions hold the file)
     asset, created = Asset.objects.get_or_create(
         project=project,
         name=name,
         defaults={
-            'description': asset_description,
+            'description': description,
             # ensure asset_type is one of the allowed choices; fallback to default
             'asset_type': (asset_type if asset_type in dict(Asset.ASSET_TYPES) else Asset._meta.get_field('asset_type').default),
             'owner': user,
@@ -109,44 +151,71 @@ def upload_asset(request):
     )
     if not created:
         fields_to_update = []
-        if asset_description:
-            asset.description = asset_description
+        if description:
+            asset.description = description
             fields_to_update.append('description')
         if asset_type and asset_type in dict(Asset.ASSET_TYPES):
             asset.asset_type = asset_type
             fields_to_update.append('asset_type')
         if fields_to_update:
             asset.save(update_fields=fields_to_update)
+    return asset
 
-    # Determine next version number
-    max_number = asset.versions.aggregate(n=Max('number'))['n'] or 0
-    next_number = max_number + 1
 
-    # Store file under MEDIA_ROOT/USER_DATA/<username>/<project-slug>/
-    base_root = getattr(settings, 'MEDIA_ROOT', None) or (Path(settings.BASE_DIR) / 'media')
-    safe_project = slugify(project.name) or f'project-{project.id}'
-    target_dir = Path(base_root) / 'USER_DATA' / user.username / safe_project
-    os.makedirs(target_dir, exist_ok=True)
+def _save_new_version(version, staged=None):
+    """
+    Number and insert a new Version in one transaction: the asset's version
+    counter is incremented atomically, so concurrent uploads never collide.
+    staged, a (path, sha256, size) from blob_storage.stage, is published in
+    the same transaction, after its blob reference is taken (Blob.adopt).
+    Its processing pipeline is queued once the transaction commits.
+    """
+    try:
+        with transaction.atomic():
+            if staged is not None:
+                version.file.name = Blob.adopt(*staged)
+                version.blob_acquired = True
+            version.number = Asset.objects.allocate_version_numbers({version.asset_id: 1})[version.asset_id]
+            version.save(force_insert=True)
+            processing.enqueue([version])
+    finally:
+        if staged is not None:
+            # Left over only if the transaction failed before publishing it
+            blob_storage.discard(staged[0])
+    return version
 
-    fs = FileSystemStorage(location=str(target_dir))
-    saved_name = fs.save(upload.name, upload)
-    absolute_path = Path(target_dir) / saved_name
 
-    try:
-        media_root = Path(base_root).resolve()
-        rel_path = absolute_path.resolve().relative_to(media_root).as_posix()
-    except Exception:
-        rel_path = absolute_path.as_posix()
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_asset(request):
+    """
+    Save uploaded file in the content-addressed blob store and create a Version.
+    If the Asset (project+name) doesn't exist, create it; then create Version(number=next).
+    The file reference lives on the Version.
+    """
+    user = request.user
+    project_id = request.data.get('project')
+    name = request.data.get('name')
+    asset_type = request.data.get('asset_type')
+    asset_description = (request.data.get('description') or '').strip()
+    upload = request.FILES.get('file')
+
+    if not project_id or not name or not upload:
+        return Response({'error': 'project, name and file are required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
 
-    # Create initial Version with default description
-    version = Version.objects.create(
+    # Ensure the project belongs to the current user
+    project = get_object_or_404(Project, pk=project_id, owner=user)
+
+    asset = _resolve_asset(user, project, name, asset_type, asset_description)
+
+    # Create initial Version with default description; identical bytes are stored once
+    version = Version(
         asset=asset,
-        number=next_number,
         description='uploaded by the user',
         user=user,
+        original_name=upload.name,
     )
-    version.file.name = rel_path
-    version.save(update_fields=['file'])
+    _save_new_version(version, blob_storage.stage(upload))
 
     return Response({
         'asset': asset.id,
@@ -168,6 +237,11 @@ class AssetVersionsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
+        return response_cache.cached_response(
+            request, 'asset-versions', [('asset', pk)], partial(self._versions, request, pk),
+        )
+
+    def _versions(self, request, pk):
         asset = get_object_or_404(Asset, pk=pk, owner=request.user)
         data = [
             {
@@ -178,12 +252,60 @@ class AssetVersionsView(APIView):
                 'user': v.user_id,
                 'created_at': v.created_at,
                 'status': v.status,
+                'processing_status': v.processing_status,
             }
             for v in asset.versions.order_by('number')
         ]
         return Response({'asset': asset.id, 'versions': data}, status=drf_status.HTTP_200_OK)
 
 
+# Endpoints served through the response cache, as named in cached_response
+CACHED_ENDPOINTS = ('project-list', 'asset-list', 'asset-versions', 'project-images')
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    """
+    Hit/miss counts and hit rate of the response cache, per endpoint and in
+    total (counted by the serving process), and of the render cache under
+    'render', for monitoring. Staff only.
+    """
+    return Response({**response_cache.stats(CACHED_ENDPOINTS), 'render': render_cache.stats()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_assets(request):
+    """
+    Full-text search over the names, descriptions and categories of the
+    assets of the user's projects, their version descriptions and comments.
+    Every word matches as a prefix; best matches first.
+    Query parameters: q (required), limit (default 20, at most 100).
+    """
+    query = (request.query_params.get('q') or '').strip()
+    if not query:
+        return Response({'error': 'q parameter is required'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    matches = search.search(request.user, query, _int_param(request, 'limit', 20, 100))
+    assets = Asset.objects.only('id', 'name', 'asset_type', 'project_id', 'categories').in_bulk(
+        [pk for pk, _, _ in matches])
+    return Response({
+        'query': query,
+        'results': [
+            {
+                'id': pk,
+                'name': assets[pk].name,
+                'asset_type': assets[pk].asset_type,
+                'project': assets[pk].project_id,
+                'categories': assets[pk].categories,
+                'rank': rank,
+                'snippet': snippet,
+            }
+            for pk, rank, snippet in matches if pk in assets
+        ],
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def current_user(request):
@@ -215,38 +337,441 @@ def version_up(request, pk):
     if status_value not in STATUS_VALUES:
         return Response({'error': 'invalid status.'}, status=drf_status.HTTP_400_BAD_REQUEST)
 
-    # next version number
-    max_number = asset.versions.aggregate(n=Max('number'))['n'] or 0
-    next_number = max_number + 1
+    version = Version(
+        asset=asset,
+        description=desc,
+        user=user,
+        status=status_value,
+        original_name=upload.name,
+    )
+    # next version number, allocated atomically with the insert
+    _save_new_version(version, blob_storage.stage(upload))
+
+    return Response({
+        'asset': asset.id,
+        'version': {
+            'id': version.id,
+            'number': version.number,
+            'file': version.file.url if hasattr(version.file, 'url') else version.file.name,
+            'description': version.description,
+            'status': version.status,
+            'user': version.user_id,
+            'created_at': version.created_at,
+        }
+    }, status=drf_status.HTTP_201_CREATED)
+
+
+def _batch_entries(request):
+    """
+    Return the entries of a batch upload as dicts with keys upload (or sha256),
+    name, asset_type and description, or raise ValueError.
+    """
+    uploads_by_name = {}
+    for upload in request.FILES.getlist('file'):
+        uploads_by_name.setdefault(upload.name, []).append(upload)
+
+    manifest = request.data.get('manifest')
+    if not manifest:
+        return [
+            {'upload': upload, 'name': Path(upload.name).stem or upload.name}
+            for upload in request.FILES.getlist('file')
+        ]
+
+    if isinstance(manifest, str):
+        manifest = json.loads(manifest)
+    if not isinstance(manifest, list):
+        raise ValueError('manifest must be a list.')
+    entries = []
+    for item in manifest:
+        if not isinstance(item, dict) or not item.get('name'):
+            raise ValueError('every manifest entry needs a name.')
+        entry = dict(item)
+        if item.get('file'):
+            candidates = uploads_by_name.get(item['file'])
+            if not candidates:
+                raise ValueError(f"no uploaded file named {item['file']!r}.")
+            entry['upload'] = candidates.pop(0)
+        elif not item.get('sha256'):
+            raise ValueError('every manifest entry needs a file or a sha256.')
+        entries.append(entry)
+    return entries
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_assets_batch(request):
+    """
+    Upload many files to one project in a single request.
+    multipart/form-data fields:
+      - project (required)
+      - file (repeated); without a manifest, each becomes a version of the
+        asset named after the file (extension stripped)
+      - manifest (optional JSON list) of {"file": <part file name> | "sha256": <stored content>,
+        "name", "asset_type", "description"}; sha256 entries reference content
+        already in the blob store and transfer nothing
+      - asset_type (optional default), status (optional, one of STATUS_VALUES)
+    Assets are resolved with one query, version numbers are allocated in bulk
+    and all rows are written with bulk_create in a single transaction.
+    """
+    user = request.user
+    project_id = request.data.get('project')
+    if not project_id:
+        return Response({'error': 'project is required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    project = get_object_or_404(Project, pk=project_id, owner=user)
 
-    # store file to MEDIA_ROOT/USER_DATA/<username>/<project-slug>/
-    base_root = getattr(settings, 'MEDIA_ROOT', None) or (Path(settings.BASE_DIR) / 'media')
-    safe_project = slugify(asset.project.name) or f'project-{asset.project_id}'
-    target_dir = Path(base_root) / 'USER_DATA' / user.username / safe_project
-    os.makedirs(target_dir, exist_ok=True)
+    status_value = request.data.get('status') or Version._meta.get_field('status').default
+    if status_value not in STATUS_VALUES:
+        return Response({'error': 'invalid status.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    try:
+        entries = _batch_entries(request)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=drf_status.HTTP_400_BAD_REQUEST)
+    if not entries:
+        return Response({'error': 'at least one file is required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
 
-    fs = FileSystemStorage(location=str(target_dir))
-    saved_name = fs.save(upload.name, upload)
-    absolute_path = Path(target_dir) / saved_name
+    # Referenced content must already be stored
+    referenced = {e['sha256'].lower() for e in entries if 'upload' not in e}
+    sizes = dict(Blob.objects.filter(pk__in=referenced).values_list('pk', 'size'))
+    missing = referenced - set(sizes)
+    if missing:
+        return Response({'error': 'unknown sha256.', 'missing': sorted(missing)},
+                        status=drf_status.HTTP_400_BAD_REQUEST)
 
+    # Stream every upload to a temporary file, hashing it
+    staged = []
     try:
-        media_root = Path(base_root).resolve()
-        rel_path = absolute_path.resolve().relative_to(media_root).as_posix()
-    except Exception:
-        rel_path = absolute_path.as_posix()
+        for entry in entries:
+            if 'upload' in entry:
+                path, digest, size = blob_storage.stage(entry['upload'])
+                staged.append((path, digest))
+                entry['file'] = blob_name(digest)
+                entry['original_name'] = entry['upload'].name
+                sizes[digest] = size
+            else:
+                entry['file'] = blob_name(entry['sha256'].lower())
+                entry['original_name'] = entry.get('original_name') or entry['name']
+        return _create_batch(request, project, user, entries, staged, referenced, sizes, status_value)
+    finally:
+        # Left over only if the transaction failed before publishing them
+        for path, _ in staged:
+            blob_storage.discard(path)
 
-    version = Version.objects.create(
-        asset=asset,
-        number=next_number,
-        description=desc,
-        user=user,
-        status=status_value,
+
+def _create_batch(request, project, user, entries, staged, referenced, sizes, status_value):
+    """ Write the assets and versions of a batch upload in one transaction (see upload_assets_batch). """
+    default_type = request.data.get('asset_type')
+    valid_types = dict(Asset.ASSET_TYPES)
+    fallback_type = Asset._meta.get_field('asset_type').default
+
+    with transaction.atomic():
+        # Take the blob references before publishing or checking any file, so a
+        # concurrent release of the last reference cannot delete one in between
+        counts = Counter(digest_from_name(entry['file']) for entry in entries)
+        Blob.acquire_many(counts, sizes)
+        gone = sorted(digest for digest in referenced if not blob_storage.exists(blob_name(digest)))
+        if gone:
+            transaction.set_rollback(True)
+            return Response({'error': 'unknown sha256.', 'missing': gone}, status=drf_status.HTTP_400_BAD_REQUEST)
+        for path, digest in staged:
+            blob_storage.adopt(path, digest)
+
+        names = {e['name'] for e in entries}
+        assets = {a.name: a for a in Asset.objects.filter(project=project, name__in=names)}
+        new_assets = {}
+        changed = {}
+        for entry in entries:
+            asset_type = entry.get('asset_type') or default_type
+            description = (entry.get('description') or '').strip()
+            asset = assets.get(entry['name'])
+            if asset is None:
+                if entry['name'] not in new_assets:
+                    new_assets[entry['name']] = Asset(
+                        project=project,
+                        name=entry['name'],
+                        description=description,
+                        asset_type=asset_type if asset_type in valid_types else fallback_type,
+                        owner=user,
+                    )
+                continue
+            if description:
+                asset.description = description
+                changed.setdefault(asset.pk, (asset, set()))[1].add('description')
+            if asset_type in valid_types:
+                asset.asset_type = asset_type
+                changed.setdefault(asset.pk, (asset, set()))[1].add('asset_type')
+
+        if new_assets:
+            Asset.objects.bulk_create(new_assets.values())
+            # Re-read to get primary keys on every backend
+            assets.update((a.name, a) for a in Asset.objects.filter(project=project, name__in=new_assets))
+        if changed:
+            fields = set().union(*(f for _, f in changed.values()))
+            Asset.objects.bulk_update([a for a, _ in changed.values()], sorted(fields))
+
+        # Allocate consecutive version numbers per asset, for the whole batch at once
+        next_numbers = Asset.objects.allocate_version_numbers(
+            Counter(assets[entry['name']].pk for entry in entries)
+        )
+        versions = []
+        for entry in entries:
+            asset = assets[entry['name']]
+            number = next_numbers[asset.pk]
+            next_numbers[asset.pk] = number + 1
+            versions.append(Version(
+                asset=asset,
+                number=number,
+                file=entry['file'],
+                original_name=entry['original_name'],
+                description='uploaded by the user',
+                user=user,
+                status=status_value,
+            ))
+        Version.objects.bulk_create(versions)
+
+        # bulk_create sends no post_save, so invalidate the cached listings here
+        response_cache.bump(*{
+            scope for a in assets.values()
+            for scope in response_cache.asset_scopes(a.owner_id, a.project_id, a.pk)
+        })
+        processing.enqueue(versions)
+
+    return Response({
+        'project': project.id,
+        'created_assets': len(new_assets),
+        'versions': [
+            {
+                'asset': v.asset_id,
+                'name': v.asset.name,
+                'id': v.id,
+                'number': v.number,
+                'file': v.file.url if hasattr(v.file, 'url') else v.file.name,
+                'status': v.status,
+            }
+            for v in versions
+        ],
+    }, status=drf_status.HTTP_201_CREATED)
+
+
+def _upload_session_payload(session):
+    return {
+        'id': session.id,
+        'filename': session.filename,
+        'offset': session.offset,
+        'total_size': session.total_size,
+        'chunk_size': uploads.chunk_size(),
+        'status': session.status,
+        # Unless a chunk arrives before, the session is expired then (see uploads.expire_sessions)
+        'expires_at': (session.updated_at + timedelta(seconds=uploads.session_ttl())
+                       if session.status == 'active' else None),
+    }
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_session_init(request):
+    """
+    Open a chunked upload session.
+    JSON or form fields:
+      - filename (required)
+      - size (optional, total number of bytes; enables a completeness check on commit)
+      - sha256 (optional); if these bytes are already stored the session is
+        created complete ("duplicate": true) and can be committed right away
+      - asset (optional) to version up an existing asset; then status is required
+        and description is the new version's description
+      - otherwise project and name (required), asset_type and description,
+        as for upload_asset
+    """
+    user = request.user
+    filename = (request.data.get('filename') or '').strip()
+    total_size = request.data.get('size')
+    if not filename:
+        return Response({'error': 'filename is required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    if total_size not in (None, ''):
+        try:
+            total_size = int(total_size)
+            if total_size < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({'error': 'invalid size.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    else:
+        total_size = None
+
+    asset_id = request.data.get('asset')
+    if asset_id:
+        asset = get_object_or_404(Asset, pk=asset_id, owner=user)
+        status_value = request.data.get('status')
+        if not status_value:
+            return Response({'error': 'status is required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+        if status_value not in STATUS_VALUES:
+            return Response({'error': 'invalid status.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+        session = UploadSession.objects.create(
+            user=user,
+            project=asset.project,
+            asset=asset,
+            version_description=(request.data.get('description') or '').strip(),
+            version_status=status_value,
+            filename=filename,
+            total_size=total_size,
+        )
+    else:
+        project_id = request.data.get('project')
+        name = request.data.get('name')
+        if not project_id or not name:
+            return Response({'error': 'project and name are required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+        project = get_object_or_404(Project, pk=project_id, owner=user)
+        session = UploadSession.objects.create(
+            user=user,
+            project=project,
+            name=name,
+            asset_type=request.data.get('asset_type') or '',
+            description=(request.data.get('description') or '').strip(),
+            filename=filename,
+            total_size=total_size,
+        )
+
+    digest = (request.data.get('sha256') or '').strip().lower()
+    blob = Blob.objects.filter(pk=digest, ref_count__gt=0).first() if digest else None
+    if blob is not None and blob_storage.exists(blob_name(digest)):
+        # Metadata-only upload: nothing to transfer
+        session.checksum = digest
+        session.offset = session.total_size = blob.size
+        session.save(update_fields=['checksum', 'offset', 'total_size'])
+    else:
+        uploads.start(session)
+    payload = _upload_session_payload(session)
+    payload['duplicate'] = bool(session.checksum)
+    return Response(payload, status=drf_status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_session_detail(request, session_id):
+    """
+    GET: report the acknowledged offset, to resume after a reconnect.
+    PUT: append the raw request body (application/octet-stream) as the next chunk.
+         The Upload-Offset header must equal the acknowledged offset, otherwise
+         409 is returned along with the offset to resume from.
+    DELETE: abort the session and remove the partial file.
+    """
+    session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+
+    if request.method == 'GET':
+        return Response(_upload_session_payload(session))
+
+    if session.status != 'active':
+        return Response({'error': f'upload session is {session.status}.'}, status=drf_status.HTTP_409_CONFLICT)
+
+    if request.method == 'DELETE':
+        uploads.discard(session)
+        session.status = 'aborted'
+        session.save(update_fields=['status', 'updated_at'])
+        return Response(status=drf_status.HTTP_204_NO_CONTENT)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.headers.get('Content-Length') or 0)
+    except ValueError:
+        return Response({'error': 'Upload-Offset header is required.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    if length > uploads.chunk_size():
+        return Response({'error': f'chunks are limited to {uploads.chunk_size()} bytes.'},
+                        status=drf_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    if session.total_size is not None and offset + length > session.total_size:
+        return Response({'error': 'chunk goes past the announced size.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+
+    try:
+        new_offset = uploads.append(session, request.stream or BytesIO(), offset, length)
+    except uploads.UploadOffsetMismatch as exc:
+        return Response({'error': 'offset mismatch.', 'offset': exc.expected}, status=drf_status.HTTP_409_CONFLICT)
+    except FileNotFoundError:
+        # Expired (or aborted) while this chunk was on its way
+        session.refresh_from_db(fields=['status'])
+        return Response({'error': f'upload session is {session.status}.'}, status=drf_status.HTTP_409_CONFLICT)
+
+    # Only acknowledge if nobody advanced the session meanwhile
+    now = timezone.now()
+    acknowledged = UploadSession.objects.filter(pk=session.pk, offset=offset, status='active').update(
+        offset=new_offset, updated_at=now
     )
-    version.file.name = rel_path
-    version.save(update_fields=['file'])
+    if not acknowledged:
+        session.refresh_from_db(fields=['offset'])
+        return Response({'error': 'offset mismatch.', 'offset': session.offset}, status=drf_status.HTTP_409_CONFLICT)
+    session.offset, session.updated_at = new_offset, now
+    return Response(_upload_session_payload(session))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_session_commit(request, session_id):
+    """
+    Finish a chunked upload: move the file into place and create the Version.
+    Optional field sha256 is checked against the digest computed while receiving.
+    """
+    user = request.user
+    session = get_object_or_404(UploadSession, pk=session_id, user=user)
+    if session.status != 'active':
+        return Response({'error': f'upload session is {session.status}.'}, status=drf_status.HTTP_409_CONFLICT)
+    if session.total_size is not None and session.offset != session.total_size:
+        return Response({'error': 'upload is incomplete.', 'offset': session.offset},
+                        status=drf_status.HTTP_409_CONFLICT)
+
+    staged = None
+    if session.checksum:
+        # Content announced at init was already stored
+        digest = session.checksum
+    else:
+        try:
+            staged = uploads.finish(session)
+        except FileNotFoundError:
+            # Published by a concurrent commit of this session
+            session.refresh_from_db(fields=['status'])
+            return Response({'error': f'upload session is {session.status}.'}, status=drf_status.HTTP_409_CONFLICT)
+        digest = staged[1]
+        expected = (request.data.get('sha256') or '').strip().lower()
+        if expected and expected != digest:
+            uploads.discard(session)
+            session.status = 'aborted'
+            session.save(update_fields=['status', 'updated_at'])
+            return Response({'error': 'checksum mismatch.', 'sha256': digest}, status=drf_status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        # Claim the session: of concurrent commits (e.g. a retry after a timeout) only one gets it
+        claimed = UploadSession.objects.filter(pk=session.pk, status='active').update(
+            status='committed', updated_at=timezone.now()
+        )
+        if not claimed:
+            session.refresh_from_db(fields=['status'])
+            return Response({'error': f'upload session is {session.status}.'}, status=drf_status.HTTP_409_CONFLICT)
+
+        if session.asset_id:
+            asset = session.asset
+        else:
+            asset = _resolve_asset(user, session.project, session.name, session.asset_type, session.description)
+        version = Version(
+            asset=asset,
+            description=session.version_description or 'uploaded by the user',
+            user=user,
+            status=session.version_status or Version._meta.get_field('status').default,
+            original_name=session.filename,
+        )
+        if staged is None:
+            # Referenced before checking the file, so it cannot be collected in between
+            if not Blob.acquire_stored(digest, session.total_size or 0):
+                # Leave the session active
+                transaction.set_rollback(True)
+                return Response({'error': 'stored content is gone; upload the file.'},
+                                status=drf_status.HTTP_409_CONFLICT)
+            version.file.name = blob_name(digest)
+            version.blob_acquired = True
+        _save_new_version(version, staged)
+
+        session.asset = asset
+        session.checksum = digest
+        session.status = 'committed'
+        session.save(update_fields=['asset', 'checksum', 'updated_at'])
 
     return Response({
         'asset': asset.id,
+        'sha256': digest,
         'version': {
             'id': version.id,
             'number': version.number,
@@ -259,36 +784,34 @@ def version_up(request, pk):
     }, status=drf_status.HTTP_201_CREATED)
 
 
+def _media_token(asset):
+    """ The ?v= token of an asset's image and thumbnail URLs: updated_at in microseconds since the epoch. """
+    # Whole seconds would give two saves within a second the same token
+    updated_at = asset.updated_at
+    return str(int(updated_at.timestamp()) * 1_000_000 + updated_at.microsecond)
+
+
+def _is_current_media_url(request, asset):
+    """ Whether the request carries the asset's current ?v= token, so its URL can be cached as immutable. """
+    return request.query_params.get('v') == _media_token(asset)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def serve_asset_image(request, asset_id):
     """
     Serve the image file for a specific asset.
+    Streams the file (with Range support) instead of loading it into memory.
+    Conditional requests are answered with 304 from a stat of the file.
     """
     try:
         asset = Asset.objects.get(id=asset_id, owner=request.user)
-        if not asset.file:
-            raise Http404("Asset file not found")
-        
-        # Read the file content
-        with asset.file.open('rb') as f:
-            image_data = f.read()
-        
-        # Determine content type based on file extension
-        content_type = 'image/jpeg'  # Default
-        if asset.file.name.lower().endswith('.png'):
-            content_type = 'image/png'
-        elif asset.file.name.lower().endswith('.gif'):
-            content_type = 'image/gif'
-        elif asset.file.name.lower().endswith('.webp'):
-            content_type = 'image/webp'
-        
-        response = HttpResponse(image_data, content_type=content_type)
-        response['Content-Disposition'] = f'inline; filename="{asset.name}"'
-        return response
-        
     except Asset.DoesNotExist:
         raise Http404("Asset not found")
+    if not asset.file:
+        raise Http404("Asset file not found")
+    return media.serve_file(request, asset.file, asset.name, default_content_type='image/jpeg',
+                            immutable=_is_current_media_url(request, asset))
 
 
 @api_view(['GET'])
@@ -296,43 +819,59 @@ def serve_asset_image(request, asset_id):
 def serve_asset_thumbnail(request, asset_id):
     """
     Serve the thumbnail for a specific asset.
+    Optional query parameters:
+      - size: longest edge wanted; the smallest generated size at least that big is served
+      - type: 'webp' for the WebP variant ('format' is reserved by DRF for content negotiation)
     """
     try:
         asset = Asset.objects.get(id=asset_id, owner=request.user)
-        if not asset.thumbnail:
-            raise Http404("Asset thumbnail not found")
-        
-        # Read the thumbnail content
-        with asset.thumbnail.open('rb') as f:
-            image_data = f.read()
-        
-        # Determine content type based on file extension
-        content_type = 'image/jpeg'  # Default
-        if asset.thumbnail.name.lower().endswith('.png'):
-            content_type = 'image/png'
-        elif asset.thumbnail.name.lower().endswith('.gif'):
-            content_type = 'image/gif'
-        elif asset.thumbnail.name.lower().endswith('.webp'):
-            content_type = 'image/webp'
-        
-        response = HttpResponse(image_data, content_type=content_type)
-        response['Content-Disposition'] = f'inline; filename="{asset.name}_thumb"'
-        return response
-        
     except Asset.DoesNotExist:
         raise Http404("Asset not found")
+    if not asset.thumbnail:
+        raise Http404("Asset thumbnail not found")
+    size = request.query_params.get('size')
+    name = thumbnails.pick_thumbnail(
+        asset,
+        size=int(size) if size and size.isdigit() else None,
+        fmt=request.query_params.get('type'),
+    )
+    thumbnail = type(asset.thumbnail)(asset, asset.thumbnail.field, name)
+    return media.serve_file(request, thumbnail, f'{asset.name}_thumb', default_content_type='image/jpeg',
+                            immutable=_is_current_media_url(request, asset))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def serve_version_file(request, asset_id, number):
+    """
+    Serve the file of version <number> of asset <asset_id>.
+    Supports Range requests, e.g. for scrubbing video.
+    """
+    version = get_object_or_404(Version, asset_id=asset_id, number=number, asset__owner=request.user)
+    # A version's content never changes, so its URL can be cached for good
+    return media.serve_file(request, version.file, version.original_name or version.asset.name, immutable=True)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_project_images(request):
     """
-    List all images for a specific project with their metadata.
+    List the images of a project with their metadata, ordered by name.
+    Paginated with ?cursor= and ?page_size=; follow 'next' for more images.
     """
     project_id = request.query_params.get('project')
     if not project_id:
         return Response({'error': 'project parameter is required'}, status=drf_status.HTTP_400_BAD_REQUEST)
-    
+    try:
+        project_id = int(project_id)
+    except ValueError:
+        return Response({'error': 'Project not found'}, status=drf_status.HTTP_404_NOT_FOUND)
+    return response_cache.cached_response(
+        request, 'project-images', [('project', project_id)], partial(_project_images, request, project_id),
+    )
+
+
+def _project_images(request, project_id):
     try:
         project = Project.objects.get(id=project_id, owner=request.user)
     except Project.DoesNotExist:
@@ -342,10 +881,16 @@ def list_project_images(request):
         project=project,
         owner=request.user,
         asset_type='image'
-    ).order_by('name')
-    
+    ).only(
+        'id', 'name', 'description', 'categories', 'ai_enhanced', 'is_rendered',
+        'created_at', 'updated_at', 'thumbnails',
+    )
+    paginator = KeysetPagination()
+    assets = paginator.paginate_queryset(assets, request)
+
     image_data = []
     for asset in assets:
+        version_token = _media_token(asset)
         image_data.append({
             'id': asset.id,
             'name': asset.name,
@@ -355,12 +900,147 @@ def list_project_images(request):
             'is_rendered': asset.is_rendered,
             'created_at': asset.created_at,
             'updated_at': asset.updated_at,
-            'image_url': f'/api/assets/{asset.id}/image/',
-            'thumbnail_url': f'/api/assets/{asset.id}/thumbnail/',
+            'image_url': f'/api/assets/{asset.id}/image/?v={version_token}',
+            'thumbnail_url': f'/api/assets/{asset.id}/thumbnail/?v={version_token}',
+            'thumbnail_sizes': sorted(int(size) for size in (asset.thumbnails or {})),
         })
     
     return Response({
         'project': project.name,
         'images': image_data,
-        'count': len(image_data)
+        # Number of images on this page; the total is not counted
+        'count': len(image_data),
+        'next': paginator.next_link,
+        'previous': paginator.previous_link,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def similar_project_images(request):
+    """
+    Near duplicates of an image within its project, closest first.
+    Query parameters: asset (required), distance (Hamming distance in bits,
+    default 6) and algorithm (phash, dhash or ahash; default phash).
+    """
+    try:
+        asset = Asset.objects.get(pk=int(request.query_params.get('asset', '')), owner=request.user,
+                                  asset_type='image')
+    except (ValueError, Asset.DoesNotExist):
+        return Response({'error': 'Image not found'}, status=drf_status.HTTP_404_NOT_FOUND)
+    algorithm = request.query_params.get('algorithm', phash.DEFAULT_ALGORITHM)
+    if algorithm not in phash.ALGORITHMS:
+        return Response({'error': 'invalid algorithm.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    value = getattr(asset, algorithm)
+    if value is None:
+        return Response({'error': 'Image has not been hashed yet'}, status=drf_status.HTTP_409_CONFLICT)
+    distance = _int_param(request, 'distance', phash.DEFAULT_DISTANCE, phash.HASH_BITS)
+
+    matches = [
+        (d, pk) for d, pk in phash.project_index(asset.project_id, algorithm).search(phash.to_unsigned(value), distance)
+        if pk != asset.pk
+    ]
+    # The index holds every image of the project: only report the user's own
+    names = dict(Asset.objects.filter(pk__in=[pk for _, pk in matches], owner=request.user)
+                 .values_list('pk', 'name'))
+    return Response({
+        'asset': asset.id,
+        'project': asset.project_id,
+        'algorithm': algorithm,
+        'distance': distance,
+        'results': [
+            {'id': pk, 'name': names[pk], 'distance': d, 'thumbnail_url': f'/api/assets/{pk}/thumbnail/'}
+            for d, pk in matches if pk in names
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def visually_similar_images(request):
+    """
+    The user's images of the same project that look most like an image,
+    most similar first. Query parameters: asset (required), k (default 20).
+    """
+    try:
+        asset = Asset.objects.get(pk=int(request.query_params.get('asset', '')), owner=request.user,
+                                  asset_type='image')
+    except (ValueError, Asset.DoesNotExist):
+        return Response({'error': 'Image not found'}, status=drf_status.HTTP_404_NOT_FOUND)
+    query = embeddings.vector(asset.project_id, asset.id)
+    if query is None:
+        return Response({'error': 'Image has not been analyzed yet'}, status=drf_status.HTTP_409_CONFLICT)
+    k = _int_param(request, 'k', 20, 200)
+
+    # A few extra rows, for deleted assets still in the store
+    matches = embeddings.search(asset.project_id, query, request.user.id, k + 10, exclude=[asset.id])
+    names = dict(Asset.objects.filter(pk__in=[pk for _, pk in matches], owner=request.user)
+                 .values_list('pk', 'name'))
+    return Response({
+        'asset': asset.id,
+        'project': asset.project_id,
+        'results': [
+            {'id': pk, 'name': names[pk], 'similarity': round(score, 4),
+             'thumbnail_url': f'/api/assets/{pk}/thumbnail/'}
+            for score, pk in matches if pk in names
+        ][:k],
     })
+
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(1, min(value, maximum))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def project_images_sprite(request):
+    """
+    Sprite sheet of the thumbnails of one page of a project's images.
+    Query parameters: project (required), cursor, page_size, tile (pixels).
+    Pages match those of list_project_images; follow 'next' for more.
+    Returns the offset map (200) once the sheet is built; otherwise queues the
+    build and returns 202 with status 'pending' so the client retries.
+    """
+    project_id = request.query_params.get('project')
+    if not project_id:
+        return Response({'error': 'project parameter is required'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    try:
+        project = Project.objects.get(id=project_id, owner=request.user)
+    except (Project.DoesNotExist, ValueError):
+        return Response({'error': 'Project not found'}, status=drf_status.HTTP_404_NOT_FOUND)
+
+    tile = _int_param(request, 'tile', sprites.DEFAULT_TILE_SIZE, max(thumbnails.THUMBNAIL_SIZES))
+    paginator = KeysetPagination()
+    paginator.page_size = sprites.DEFAULT_PAGE_SIZE
+    paginator.max_page_size = sprites.MAX_PAGE_SIZE
+    members = paginator.paginate_queryset(sprites.images(project, request.user), request)
+    links = {'next': paginator.next_link, 'previous': paginator.previous_link}
+
+    key = sprites.sheet_key(members, tile)
+    sprite_map = sprites.load_map(project.id, key)
+    if sprite_map is None:
+        if members and cache.add(sprites.build_lock_key(key), True, timeout=600):
+            build_sprite_sheet.delay(project.id, key, [m['id'] for m in members], tile)
+        status_code = drf_status.HTTP_202_ACCEPTED if members else drf_status.HTTP_200_OK
+        return Response({'status': 'pending' if members else 'empty', 'key': key, 'tiles': [], **links},
+                        status=status_code)
+
+    sprite_map['status'] = 'ready'
+    sprite_map['sheet_url'] = f'/api/assets/project-images/sprite/{project.id}/{key}/'
+    sprite_map.update(links)
+    return Response(sprite_map)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def serve_sprite_sheet(request, project_id, key):
+    """
+    Serve a built sprite sheet. Its key changes with its content, so it is cached as immutable.
+    """
+    get_object_or_404(Project, pk=project_id, owner=request.user)
+    sheet = FieldFile(None, Asset._meta.get_field('thumbnail'), sprites.sheet_name(project_id, key))
+    return media.serve_file(request, sheet, f'sprite_{key}.jpg', immutable=True)
@@ -2,9 +2,12 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.test import override_settings
+from stratopipe.testing import IN_PROCESS_BACKENDS
 
 User = get_user_model()
 
+@override_settings(**IN_PROCESS_BACKENDS)
 class AuthAPITests(APITestCase):
     """ Test the authentication endpoints """
     def test_register(self):
@@ -1,40 +1,196 @@
-""" WebSocket consumer for real-time collaboration features. """
+""" WebSocket consumers for real-time collaboration and processing progress. """
 
+import asyncio
+import itertools
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+from collections import OrderedDict
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
+
+from assets import progress
+from assets.models import Asset
+from projects.models import Project
+
+
+# Seconds between two frames sent to a client (and two batches sent to a room by a client)
+FRAME_INTERVAL = 0.05
+# Messages a client may have waiting for the next frame before the oldest are dropped
+MAX_PENDING = 256
+# Message kinds where only the latest message per sender (and key) matters
+COALESCED_KINDS = {'cursor', 'selection', 'presence', 'viewport', 'typing'}
+
+
+def room_group_name(kind, pk):
+    return f'collaboration-{kind}-{pk}'
+
+
+class Outbox:
+    """
+    Messages waiting for the next frame, in order. A message added with a
+    key replaces the waiting one with the same key. Beyond limit entries,
+    the oldest keyed (coalescable) message is dropped first, else the oldest.
+    """
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.dropped = 0
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, message, key=None):
+        if key is None:
+            key = (None, next(self._sequence))
+        else:
+            key = tuple(key)
+            self.entries.pop(key, None)
+        self.entries[key] = message
+        if self.limit is not None and len(self.entries) > self.limit:
+            victim = next((k for k in self.entries if k[0] is not None), None)
+            if victim is None:
+                self.entries.popitem(last=False)
+            else:
+                del self.entries[victim]
+            self.dropped += 1
+
+    def drain(self):
+        """ Return ([(key or None, message)], number dropped since the last drain) and empty the outbox. """
+        items = [(None if key[0] is None else list(key), message) for key, message in self.entries.items()]
+        dropped = self.dropped
+        self.entries = OrderedDict()
+        self.dropped = 0
+        return items, dropped
 
 
 class CollaborationConsumer(AsyncWebsocketConsumer):
-    """ WebSocket consumer for real-time collaboration features. """
+    """
+    Real-time collaboration in a room: a project (ws/collaboration/projects/<id>/)
+    or an asset (ws/collaboration/assets/<id>/), open to the project owner.
+
+    Clients send JSON objects with a "kind" (default "message"). Messages of
+    the COALESCED_KINDS are merged per sender, kind and "key" (only the
+    latest is kept), and each client's messages reach the room as one batch
+    per FRAME_INTERVAL. Every client receives the room's messages as frames,
+    {"type": "frame", "messages": [...], "dropped": n}, at most one per
+    FRAME_INTERVAL; a client that falls behind has its waiting messages
+    merged, and past MAX_PENDING dropped (counted in "dropped").
+    """
     async def connect(self):
-        self.room_group_name = 'collaboration'
-        # Join the collaboration group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        kwargs = self.scope['url_route']['kwargs']
+        kind, pk = ('asset', kwargs['asset_id']) if 'asset_id' in kwargs else ('project', kwargs['project_id'])
+        if not await self._can_join(kind, pk):
+            # Anonymous, or not the owner of the project
+            await self.close(code=4403)
+            return
+        self.room_group_name = room_group_name(kind, pk)
+        self.inbound = Outbox()
+        self.outbox = Outbox(MAX_PENDING)
+        self._flush_task = None
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
-        # Leave the collaboration group on disconnect
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
-
-    async def receive(self, text_data):
-        # Receive message from WebSocket client and broadcast it
-        data = json.loads(text_data)
-        message = data.get('message', '')
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'collaboration_message',
-                'message': message
-            }
-        )
-
-    async def collaboration_message(self, event):
-        # Send message to WebSocket client
-        message = event['message']
-        await self.send(text_data=json.dumps({'message': message}))
+        if not hasattr(self, 'room_group_name'):
+            return
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        user = self.scope['user']
+        kind = str(data.get('kind') or 'message')
+        message = {**data, 'kind': kind, 'user': user.pk, 'username': user.get_username()}
+        key = None
+        if kind in COALESCED_KINDS:
+            key = [kind, self.channel_name, str(data.get('key', ''))]
+        self.inbound.add(message, key)
+        self._schedule_flush()
+
+    async def collaboration_frame(self, event):
+        # A batch of messages sent to the room
+        for key, message in event['messages']:
+            self.outbox.add(message, key)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_frames())
+
+    async def _flush_frames(self):
+        """ Every FRAME_INTERVAL, send the client's batch to the room and a frame to the client, until idle. """
+        while True:
+            await asyncio.sleep(FRAME_INTERVAL)
+            messages, _ = self.inbound.drain()
+            if messages:
+                await self.channel_layer.group_send(self.room_group_name, {
+                    'type': 'collaboration.frame',
+                    'messages': messages,
+                })
+            messages, dropped = self.outbox.drain()
+            if messages or dropped:
+                frame = {'type': 'frame', 'messages': [message for _, message in messages]}
+                if dropped:
+                    frame['dropped'] = dropped
+                # Messages arriving while this send waits are merged into the next frame
+                await self.send(text_data=json.dumps(frame))
+            if not self.inbound and not self.outbox:
+                self._flush_task = None
+                return
+
+    @database_sync_to_async
+    def _can_join(self, kind, pk):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return False
+        if kind == 'asset':
+            return Asset.objects.filter(pk=pk, project__owner=user).exists()
+        return Project.objects.filter(pk=pk, owner=user).exists()
+
+
+class AssetProgressConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes the processing state and progress of an asset's versions
+    (see assets/progress.py), so clients need not poll the versions endpoint.
+    On connect, the current state of the latest version is sent.
+    """
+    async def connect(self):
+        self.asset_id = self.scope['url_route']['kwargs']['asset_id']
+        latest = await self._latest_version()
+        if latest is False:
+            # Anonymous, or not the owner of the asset
+            await self.close(code=4403)
+            return
+        self.room_group_name = progress.group_name(self.asset_id)
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept()
+        if latest is not None:
+            await self.send_json(latest)
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def asset_progress(self, event):
+        await self.send_json(event['payload'])
+
+    @database_sync_to_async
+    def _latest_version(self):
+        """ Return the latest version's state message, None without versions, False if forbidden. """
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return False
+        asset = Asset.objects.filter(pk=self.asset_id, owner=user).first()
+        if asset is None:
+            return False
+        version = asset.versions.order_by('-number').first()
+        if version is None:
+            return None
+        return progress.payload(version, version.processing_status)
@@ -0,0 +1,11 @@
+""" WebSocket URL configuration for the collaboration app """
+
+from django.urls import path
+
+from .consumers import AssetProgressConsumer, CollaborationConsumer
+
+websocket_urlpatterns = [
+    path('ws/collaboration/projects/<int:project_id>/', CollaborationConsumer.as_asgi()),
+    path('ws/collaboration/assets/<int:asset_id>/', CollaborationConsumer.as_asgi()),
+    path('ws/assets/<int:asset_id>/progress/', AssetProgressConsumer.as_asgi()),
+]
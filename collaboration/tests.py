@@ -0,0 +1,135 @@
+""" Tests for the collaboration app """
+
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from assets import progress
+from assets.models import Asset
+from projects.models import Project
+from stratopipe.testing import IN_PROCESS_BACKENDS
+from versions.models import Version
+from . import consumers
+from .routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class AssetProgressConsumerTests(TransactionTestCase):
+    """ Test the processing progress WebSocket """
+    def setUp(self):
+        self.user = User.objects.create_user(username='watcher', password='testpass')
+        project = Project.objects.create(owner=self.user, name='Watched Project')
+        self.asset = Asset.objects.create(project=project, owner=self.user, name='Watched')
+        self.version = Version.objects.create(asset=self.asset, number=1, user=self.user,
+                                              file='legacy/watched.exr', processing_status='processing')
+
+    def _communicator(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns),
+                                             f'/ws/assets/{self.asset.id}/progress/')
+        communicator.scope['user'] = user
+        return communicator
+
+    async def test_owner_receives_snapshot_and_updates(self):
+        communicator = self._communicator(self.user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual((snapshot['number'], snapshot['state']), (1, 'processing'))
+
+        await sync_to_async(progress.publish_state)(self.version, 'completed', 100)
+        message = await communicator.receive_json_from()
+        self.assertEqual((message['state'], message['progress']), ('completed', 100))
+        await communicator.disconnect()
+
+    async def test_other_users_are_rejected(self):
+        other = await sync_to_async(User.objects.create_user)(username='stranger', password='testpass')
+        for user in (AnonymousUser(), other):
+            connected, code = await self._communicator(user).connect()
+            self.assertFalse(connected)
+            self.assertEqual(code, 4403)
+
+
+class OutboxTests(TestCase):
+    """ Test the coalescing, bounded message queue of a connection """
+    def test_keyed_messages_are_merged_and_dropped_first(self):
+        outbox = consumers.Outbox(limit=3)
+        outbox.add({'text': 'hello'})
+        outbox.add({'x': 1}, ['cursor', 'a', ''])
+        outbox.add({'x': 2}, ['cursor', 'a', ''])
+        outbox.add({'x': 1}, ['cursor', 'b', ''])
+        self.assertEqual(len(outbox), 3)
+        outbox.add({'text': 'world'})
+        messages, dropped = outbox.drain()
+        self.assertEqual(messages, [(None, {'text': 'hello'}), (['cursor', 'b', ''], {'x': 1}),
+                                    (None, {'text': 'world'})])
+        self.assertEqual(dropped, 1)
+        self.assertEqual(outbox.drain(), ([], 0))
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class CollaborationConsumerTests(TransactionTestCase):
+    """ Test the collaboration rooms """
+    def setUp(self):
+        self.user = User.objects.create_user(username='collaborator', password='testpass')
+        self.project = Project.objects.create(owner=self.user, name='Shared Project')
+        self.other_project = Project.objects.create(owner=self.user, name='Other Project')
+        self.asset = Asset.objects.create(project=self.project, owner=self.user, name='Shared Asset')
+
+    def _communicator(self, path, user=None):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = user or self.user
+        return communicator
+
+    async def _connect(self, path):
+        communicator = self._communicator(path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_messages_stay_in_their_room(self):
+        first = await self._connect(f'/ws/collaboration/projects/{self.project.pk}/')
+        second = await self._connect(f'/ws/collaboration/projects/{self.project.pk}/')
+        elsewhere = await self._connect(f'/ws/collaboration/projects/{self.other_project.pk}/')
+        asset_room = await self._connect(f'/ws/collaboration/assets/{self.asset.pk}/')
+
+        await first.send_json_to({'message': 'hello'})
+        for communicator in (first, second):
+            frame = await communicator.receive_json_from()
+            self.assertEqual(frame['type'], 'frame')
+            self.assertEqual([(m['kind'], m['message'], m['username']) for m in frame['messages']],
+                             [('message', 'hello', 'collaborator')])
+        self.assertTrue(await elsewhere.receive_nothing(timeout=0.2))
+        self.assertTrue(await asset_room.receive_nothing(timeout=0.01))
+        for communicator in (first, second, elsewhere, asset_room):
+            await communicator.disconnect()
+
+    async def test_high_frequency_messages_are_coalesced(self):
+        sender = await self._connect(f'/ws/collaboration/assets/{self.asset.pk}/')
+        watcher = await self._connect(f'/ws/collaboration/assets/{self.asset.pk}/')
+        with mock.patch.object(consumers, 'FRAME_INTERVAL', 0.2):
+            for x in range(20):
+                await sender.send_json_to({'kind': 'cursor', 'x': x})
+            await sender.send_json_to({'kind': 'message', 'message': 'done'})
+            frame = await watcher.receive_json_from(timeout=2)
+        self.assertEqual([(m['kind'], m.get('x')) for m in frame['messages']], [('cursor', 19), ('message', None)])
+        await sender.disconnect()
+        await watcher.disconnect()
+
+    async def test_only_the_project_owner_may_join(self):
+        other = await sync_to_async(User.objects.create_user)(username='outsider', password='testpass')
+        foreign = await sync_to_async(Project.objects.create)(owner=other, name='Foreign')
+        paths = [f'/ws/collaboration/projects/{self.project.pk}/', f'/ws/collaboration/assets/{self.asset.pk}/']
+        for user in (AnonymousUser(), other):
+            for path in paths:
+                connected, code = await self._communicator(path, user).connect()
+                self.assertFalse(connected)
+                self.assertEqual(code, 4403)
+        connected, code = await self._communicator(f'/ws/collaboration/projects/{foreign.pk}/').connect()
+        self.assertEqual((connected, code), (False, 4403))
@@ -16,6 +16,8 @@ export interface ProjectImagesResponse {
   project: string;
   images: StoredImage[];
   count: number;
+  next: string | null;
+  previous: string | null;
 }
 
 // Cache for storing image metadata
@@ -33,17 +35,24 @@ export async function fetchProjectImages(projectId: string): Promise<StoredImage
   }
   
   try {
-    const response = await fetch(`/api/assets/project-images/?project=${projectId}`, {
-      credentials: 'include',
-    });
-    
-    if (!response.ok) {
-      throw new Error(`Failed to fetch images: ${response.statusText}`);
+    // The listing is paginated: follow the next links to get every image
+    const images: StoredImage[] = [];
+    let url: string | null = `/api/assets/project-images/?project=${projectId}&page_size=500`;
+    while (url) {
+      const response = await fetch(url, {
+        credentials: 'include',
+      });
+
+      if (!response.ok) {
+        throw new Error(`Failed to fetch images: ${response.statusText}`);
+      }
+
+      const data: ProjectImagesResponse = await response.json();
+      images.push(...data.images);
+      url = data.next;
     }
-    
-    const data: ProjectImagesResponse = await response.json();
-    imageCache.set(cacheKey, data.images);
-    return data.images;
+    imageCache.set(cacheKey, images);
+    return images;
   } catch (error) {
     console.error('Error fetching project images:', error);
     return [];
@@ -64,6 +73,34 @@ export function getAssetThumbnailUrl(assetId: number): string {
   return `/api/assets/${assetId}/thumbnail/`;
 }
 
+export interface SimilarImage {
+  id: number;
+  name: string;
+  similarity: number;
+  thumbnail_url: string;
+}
+
+/**
+ * Fetch the images of the same project that look most like an asset ("show me images like this one")
+ */
+export async function fetchVisuallySimilarImages(assetId: number, k = 20): Promise<SimilarImage[]> {
+  try {
+    const response = await fetch(`/api/assets/project-images/visually-similar/?asset=${assetId}&k=${k}`, {
+      credentials: 'include',
+    });
+
+    if (!response.ok) {
+      throw new Error(`Failed to fetch similar images: ${response.statusText}`);
+    }
+
+    const data: { results: SimilarImage[] } = await response.json();
+    return data.results;
+  } catch (error) {
+    console.error('Error fetching similar images:', error);
+    return [];
+  }
+}
+
 /**
  * Find an image by name in the project images
  */
@@ -0,0 +1,228 @@
+""" Streaming export of a project's versions as a zip or tar package.
+
+The archive is produced by a generator, block by block, so it is never
+staged on disk or in memory: the zip writer sees an unseekable stream (and
+writes data descriptors after each member), the tar members are framed by
+hand (header, data, padding). Each member is one selected version of an
+asset, stored under <asset name>/<asset name>_v<number><extension>; a
+manifest.json listing every member comes first.
+
+Media formats that are already compressed (JPEG, PNG, video, ...) are
+stored as is in a zip; everything else is deflated.
+"""
+
+import json
+import os
+import tarfile
+import time
+import zipfile
+from pathlib import PurePosixPath
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from versions.constants import STATUS_VALUES
+from versions.models import Version
+from versions.storage import digest_from_name
+
+BLOCK_SIZE = 64 * 1024
+FORMATS = {
+    'zip': ('application/zip', 'zip'),
+    'tar': ('application/x-tar', 'tar'),
+}
+MANIFEST_NAME = 'manifest.json'
+
+# Statuses a version has once approved
+APPROVED_STATUSES = ('approved', 'published')
+SELECTIONS = ['latest', 'approved'] + STATUS_VALUES
+
+# Extensions of formats that deflate cannot shrink: stored as is in a zip
+STORED_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'avif', 'jp2',
+    'mp4', 'm4v', 'mov', 'mkv', 'webm', 'avi', 'mxf', 'mpg', 'mpeg',
+    'mp3', 'aac', 'm4a', 'ogg', 'opus', 'flac',
+    'zip', 'gz', 'tgz', 'bz2', 'xz', 'zst', '7z', 'rar', 'usdz', 'glb',
+}
+
+
+def select_versions(project, selection='latest'):
+    """
+    Return the selected version of each asset of project, by asset name:
+      - latest: the highest numbered version
+      - approved: the highest numbered approved (or published) version
+      - a status of versions.constants: the highest numbered one with it
+    Assets without such a version are left out.
+    """
+    if selection not in SELECTIONS:
+        raise ValueError(f"selection must be one of {', '.join(SELECTIONS)}")
+    candidates = Version.objects.filter(asset=OuterRef('asset'))
+    if selection == 'approved':
+        candidates = candidates.filter(status__in=APPROVED_STATUSES)
+    elif selection != 'latest':
+        candidates = candidates.filter(status=selection)
+    return (
+        Version.objects
+        .filter(asset__project=project, pk=Subquery(candidates.order_by('-number').values('pk')[:1]))
+        .select_related('asset')
+        .order_by('asset__name', 'asset_id')
+    )
+
+
+def _safe_parts(name):
+    parts = [part.strip() for part in name.replace('\\', '/').split('/')]
+    return [part for part in parts if part and part not in ('.', '..')] or ['unnamed']
+
+
+def plan(project, selection='latest'):
+    """
+    Return (members, manifest): members is a list of (archive path, file
+    path, size, compress) for the versions whose file is stored, manifest
+    the dict written as manifest.json.
+    """
+    members, entries, missing = [], [], []
+    used = set()
+    for version in select_versions(project, selection):
+        asset = version.asset
+        try:
+            path = version.file.path
+            size = os.stat(path).st_size
+        except (ValueError, OSError):
+            missing.append({'asset': asset.pk, 'name': asset.name, 'version': version.number})
+            continue
+
+        parts = _safe_parts(asset.name)
+        extension = PurePosixPath(version.original_name or version.file.name).suffix.lower()
+        name = '/'.join(parts + [f'{parts[-1]}_v{version.number:03d}{extension}'])
+        if name in used:
+            name = '/'.join(parts + [f'{parts[-1]}_{asset.pk}_v{version.number:03d}{extension}'])
+        used.add(name)
+
+        compress = extension.lstrip('.') not in STORED_EXTENSIONS
+        members.append((name, path, size, compress))
+        entries.append({
+            'path': name,
+            'asset': asset.pk,
+            'name': asset.name,
+            'asset_type': asset.asset_type,
+            'version': version.number,
+            'status': version.status,
+            'original_name': version.original_name,
+            'size': size,
+            'sha256': digest_from_name(version.file.name),
+        })
+
+    manifest = {
+        'project': {'id': project.pk, 'name': project.name},
+        'selection': selection,
+        'exported_at': timezone.now().isoformat(),
+        'files': entries,
+        'missing': missing,
+    }
+    return members, manifest
+
+
+def _read_blocks(path):
+    with open(path, 'rb') as f:
+        while block := f.read(BLOCK_SIZE):
+            yield block
+
+
+class _Sink:
+    """ Unseekable file-like object collecting what the zip writer writes, drained by the generator. """
+
+    def __init__(self):
+        self.parts = []
+        self.offset = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_zip(members, manifest):
+    """ Yield the bytes of a zip holding manifest.json and members. """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+        for name, path, size, compress in members:
+            # Zip timestamps start in 1980
+            date_time = max(time.localtime(os.stat(path).st_mtime)[:6], (1980, 1, 1, 0, 0, 0))
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            info.external_attr = 0o644 << 16
+            # Known up front, so zipfile switches to zip64 for large members
+            info.file_size = size
+            with archive.open(info, 'w') as member:
+                for block in _read_blocks(path):
+                    member.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _tar_header(name, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    return info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+
+
+def _tar_padding(size):
+    return b'\0' * (-size % tarfile.BLOCKSIZE)
+
+
+def stream_tar(members, manifest):
+    """ Yield the bytes of an uncompressed (pax) tar holding manifest.json and members. """
+    data = json.dumps(manifest, indent=2).encode()
+    header = _tar_header(MANIFEST_NAME, len(data), time.time())
+    yield header + data + _tar_padding(len(data))
+    length = len(header) + len(data) + len(_tar_padding(len(data)))
+    for name, path, size, _ in members:
+        header = _tar_header(name, size, os.stat(path).st_mtime)
+        yield header
+        sent = 0
+        for block in _read_blocks(path):
+            # The header announced size bytes: never send more, even if the file grew
+            block = block[:size - sent]
+            sent += len(block)
+            yield block
+            if sent == size:
+                break
+        if sent < size:
+            raise OSError(f'{path} shrank while being exported')
+        yield _tar_padding(size)
+        length += len(header) + size + len(_tar_padding(size))
+    # End of archive: two zero blocks, padded to a whole record
+    length += tarfile.BLOCKSIZE * 2
+    yield b'\0' * (tarfile.BLOCKSIZE * 2 + -length % tarfile.RECORDSIZE)
+
+
+def stream(project, selection='latest', archive_format='zip'):
+    """ Return (generator of the archive bytes, manifest) for a project export. """
+    if archive_format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    members, manifest = plan(project, selection)
+    writer = stream_zip if archive_format == 'zip' else stream_tar
+    return writer(members, manifest), manifest
+
+
+def filename(project, archive_format):
+    """ Download file name of an export. """
+    stem = '_'.join(_safe_parts(project.name)).replace(' ', '_')
+    return f'{stem}.{FORMATS[archive_format][1]}'
@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import export
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = ("Write a zip or tar package of a project's selected versions (latest, approved or a status), "
+            "with a manifest; the archive is streamed to the output, never staged")
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int, help='Project id')
+        parser.add_argument('output', help='Archive path, or - for stdout')
+        parser.add_argument('--format', dest='archive_format', choices=list(export.FORMATS),
+                            help='Archive format (default: from the output extension, else zip)')
+        parser.add_argument('--select', choices=export.SELECTIONS, default='latest',
+                            help='Version of each asset to export (default: latest)')
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(pk=options['project']).first()
+        if project is None:
+            raise CommandError(f"Project {options['project']} does not exist")
+        output = options['output']
+        archive_format = options['archive_format'] or ('tar' if output.endswith('.tar') else 'zip')
+
+        started = time.perf_counter()
+        chunks, manifest = export.stream(project, options['select'], archive_format)
+        written = 0
+        target = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+
+        elapsed = time.perf_counter() - started
+        # Keep stdout clean when it carries the archive
+        log = self.stderr if output == '-' else self.stdout
+        log.write(f"Exported {len(manifest['files'])} files ({written / 1024 ** 2:.1f} MB) in {elapsed:.2f}s, "
+                  f"{len(manifest['missing'])} missing from storage")
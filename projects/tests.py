@@ -4,12 +4,28 @@ This module contains tests for the Project API endpoints.
 It uses Django's test framework and the Django REST Framework's APITestCase
 to ensure that the API behaves as expected.
 """
+import hashlib
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
 from django.contrib.auth import get_user_model  # <-- IMPORTANT: Import this function
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
+from assets.models import Asset
+from stratopipe.testing import IN_PROCESS_BACKENDS
+from versions.models import Version
+from versions.storage import blob_name, blob_storage
 from .models import Project
 
+@override_settings(**IN_PROCESS_BACKENDS)
 class ProjectAPITests(APITestCase):
     """
     Tests for the Project API endpoints.
@@ -96,3 +112,72 @@ class ProjectAPITests(APITestCase):
         # Pick one based on your policy; if you intentionally hide existence, keep 404.
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Project.objects.filter(id=self.project.id).exists())
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class ProjectExportTests(APITestCase):
+    """ Tests for the streaming project export. """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = get_user_model().objects.create_user(username='exporter', password='testpass')
+        self.project = Project.objects.create(name='Vendor Handoff', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+        self.plate = Asset.objects.create(project=self.project, owner=self.user, name='plate')
+        self._version(self.plate, 1, b'plate v1', 'plate.jpg', 'approved')
+        self._version(self.plate, 2, b'plate v2', 'plate.jpg', 'work_in_progress')
+        self.chair = Asset.objects.create(project=self.project, owner=self.user, name='props/chair',
+                                          asset_type='geometry')
+        self._version(self.chair, 1, b'v 0 0 0\n' * 100, 'chair.obj', 'published')
+
+    def _version(self, asset, number, content, original_name, status_value):
+        digest = hashlib.sha256(content).hexdigest()
+        blob_storage.save(blob_name(digest), ContentFile(content))
+        Version.objects.create(asset=asset, number=number, user=self.user, file=blob_name(digest),
+                               original_name=original_name, status=status_value)
+
+    def _export(self, **params):
+        return self.client.get(f'/api/projects/{self.project.pk}/export/', params)
+
+    def test_zip_of_latest_versions(self):
+        response = self._export()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('Vendor_Handoff.zip', response['Content-Disposition'])
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(),
+                             ['manifest.json', 'plate/plate_v002.jpg', 'props/chair/chair_v001.obj'])
+            self.assertEqual(archive.read('plate/plate_v002.jpg'), b'plate v2')
+            # Already compressed media is stored, the rest deflated
+            self.assertEqual(archive.getinfo('plate/plate_v002.jpg').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.getinfo('props/chair/chair_v001.obj').compress_type, zipfile.ZIP_DEFLATED)
+            manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual(manifest['selection'], 'latest')
+        self.assertEqual([f['version'] for f in manifest['files']], [2, 1])
+        self.assertEqual(manifest['files'][0]['sha256'], hashlib.sha256(b'plate v2').hexdigest())
+
+    def test_approved_selection_as_tar(self):
+        path = f'{self.media_root}/handoff.tar'
+        call_command('export_project', self.project.pk, path, select='approved', stdout=io.StringIO())
+        with tarfile.open(path) as archive:
+            self.assertEqual(archive.getnames(),
+                             ['manifest.json', 'plate/plate_v001.jpg', 'props/chair/chair_v001.obj'])
+            self.assertEqual(archive.extractfile('plate/plate_v001.jpg').read(), b'plate v1')
+
+        response = self._export(archive='tar', select='kickback')
+        with tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.getnames(), ['manifest.json'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self._export(select='final').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._export(archive='rar').status_code, status.HTTP_400_BAD_REQUEST)
+        other = Project.objects.create(name='Other', owner=get_user_model().objects.create_user(username='o'))
+        response = self.client.get(f'/api/projects/{other.pk}/export/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
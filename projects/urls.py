@@ -13,9 +13,10 @@
 
 # projects/urls.py
 from django.urls import path
-from .views import ProjectListCreateView, ProjectDetailView
+from .views import ProjectListCreateView, ProjectDetailView, ProjectExportView
 
 urlpatterns = [
     path('', ProjectListCreateView.as_view(), name='project-list-create'),
     path('<int:pk>/', ProjectDetailView.as_view(), name='project-detail'),
+    path('<int:pk>/export/', ProjectExportView.as_view(), name='project-export'),
 ]
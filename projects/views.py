@@ -8,7 +8,15 @@ It also includes custom permissions to ensure that users can only
 access and modify their own projects.
 """
 
+from functools import partial
+
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from rest_framework import generics, permissions
+from rest_framework import status as drf_status
+from rest_framework.response import Response
+from stratopipe import response_cache
+from . import export
 from .models import Project
 from .serializers import ProjectSerializer
 
@@ -34,6 +42,13 @@ class ProjectListCreateView(generics.ListCreateAPIView):
         # Users can only see their own active projects
         return Project.objects.filter(owner=self.request.user, active=True)
 
+    def list(self, request, *args, **kwargs):
+        # Served from the response cache until one of the user's projects changes
+        return response_cache.cached_response(
+            request, 'project-list', [('projects', request.user.pk)],
+            partial(super().list, request, *args, **kwargs),
+        )
+
     def perform_create(self, serializer):
         # Assign the current user as the owner of the new project and ensure it's active
         serializer.save(owner=self.request.user, active=True)
@@ -48,4 +63,33 @@ class ProjectDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         # Users can only see their own active projects
-        return Project.objects.filter(owner=self.request.user, active=True)
\ No newline at end of file
+        return Project.objects.filter(owner=self.request.user, active=True)
+
+
+class ProjectExportView(generics.GenericAPIView):
+    """
+    Stream a zip or tar of the project's selected versions, with a manifest.
+
+    Query parameters:
+      - archive: zip (default) or tar (not "format", which DRF reserves)
+      - select: latest (default), approved, or a version status
+    The archive is generated while it is sent, never staged on disk.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Project.objects.filter(owner=self.request.user, active=True)
+
+    def get(self, request, *args, **kwargs):
+        project = self.get_object()
+        archive_format = request.query_params.get('archive', 'zip')
+        selection = request.query_params.get('select', 'latest')
+        try:
+            chunks, manifest = export.stream(project, selection, archive_format)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=drf_status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(chunks, content_type=export.FORMATS[archive_format][0])
+        response['Content-Disposition'] = content_disposition_header(True, export.filename(project, archive_format))
+        response['X-Export-Files'] = str(len(manifest['files']))
+        return response
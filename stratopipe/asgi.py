@@ -1,12 +1,21 @@
-""" ASGI entrypoint file for default Channels application. """
+""" ASGI entrypoint: HTTP through Django, WebSockets through Channels. """
 
 import os
-import django
-from channels.routing import get_default_application
 
-# Set default settings module and initialize Django
+from django.core.asgi import get_asgi_application
+
+# Set default settings module and initialize Django before importing consumers
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stratopipe.settings')
-django.setup()
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from collaboration.routing import websocket_urlpatterns  # noqa: E402
 
-# Get the default Channels application
-application = get_default_application()
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # Session authentication, as for the REST API
+    'websocket': AllowedHostsOriginValidator(AuthMiddlewareStack(URLRouter(websocket_urlpatterns))),
+})
@@ -0,0 +1,135 @@
+""" Versioned response cache for the list endpoints polled by the dashboard.
+
+Cached responses are keyed by the requesting user, the request URL and the
+current generation of each scope the response depends on: ('user', id)
+for a user's assets, ('projects', id) for a user's projects, ('project', id)
+or ('asset', id). Writes to Asset, Version, Project and
+Comment bump the generations of the scopes they touch (see
+assets/signals.py), so an entry is never served once its data has changed,
+and a hit is answered without touching the ORM. Stale entries are simply
+never read again and age out of the cache.
+
+A bump stores a fresh random token rather than incrementing a counter, so
+two concurrent bumps cannot collapse into one on backends without an atomic
+incr (such as the file cache).
+
+The backend is the RESPONSE_CACHE_ALIAS entry of CACHES (see settings.py).
+Hit and miss counts (stats) are kept in the memory of each process.
+"""
+
+import hashlib
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+DEFAULT_ALIAS = 'responses'
+# Seconds a cached response is kept (it may be orphaned by a bump long before)
+DEFAULT_TIMEOUT = 300
+
+# (endpoint name or '*', 'hit' or 'miss') -> count, for this process
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', DEFAULT_ALIAS)]
+
+
+def _generation_key(scope):
+    kind, pk = scope
+    return f'gen:{kind}:{pk}'
+
+
+def generations(scopes):
+    """ Return the current generation token of each scope, creating missing ones. """
+    cache = _cache()
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    tokens = []
+    for key in keys:
+        token = found.get(key)
+        if token is None:
+            # A fresh token (never a reused one) if the generation was evicted
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            token = cache.get(key)
+        tokens.append(token)
+    return tokens
+
+
+def bump(*scopes):
+    """
+    Invalidate every cached response depending on scopes. Inside a
+    transaction the bump is repeated on commit, so a response cached from a
+    read made before the commit is dropped too.
+    """
+    scopes = {scope for scope in scopes if scope[1] is not None}
+    if not scopes:
+        return
+
+    def apply():
+        _cache().set_many({_generation_key(scope): uuid.uuid4().hex for scope in scopes}, timeout=None)
+
+    apply()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(apply)
+
+
+def asset_scopes(owner_id, project_id, asset_id):
+    """ Scopes touched by a write to an asset (or to its versions and comments). """
+    return [('user', owner_id), ('project', project_id), ('asset', asset_id)]
+
+
+def _record(name, outcome):
+    # In process memory: counting in the shared cache would cost a hit a disk write
+    with _counts_lock:
+        _counts[name, outcome] += 1
+        _counts['*', outcome] += 1
+
+
+def stats(names):
+    """
+    Return {name: {'hits', 'misses', 'hit_rate'}} for names and the total
+    ('*'), as counted by this process since it started.
+    """
+    with _counts_lock:
+        counts = dict(_counts)
+    result = {}
+    for name in [*names, '*']:
+        hits = counts.get((name, 'hit'), 0)
+        misses = counts.get((name, 'miss'), 0)
+        total = hits + misses
+        result['total' if name == '*' else name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+    return result
+
+
+def cached_response(request, name, scopes, build):
+    """
+    Return the cached response of endpoint name for request, or call build()
+    and cache its data when it is a 200. scopes lists the (kind, id) the
+    response depends on. The X-Cache header tells HIT from MISS.
+    """
+    url = f'{request.get_host()}{request.get_full_path()}'
+    digest = hashlib.sha256(url.encode()).hexdigest()[:32]
+    key = f"resp:{name}:{request.user.pk}:{':'.join(generations(scopes))}:{digest}"
+
+    cache = _cache()
+    data = cache.get(key)
+    if data is not None:
+        _record(name, 'hit')
+        return Response(data, headers={'X-Cache': 'HIT'})
+
+    _record(name, 'miss')
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, response.data, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    response['X-Cache'] = 'MISS'
+    return response
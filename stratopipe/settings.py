@@ -79,14 +79,44 @@ TEMPLATES[0]["DIRS"] = list(TEMPLATES[0].get("DIRS", [])) + [BASE_DIR / "fronten
 # WSGI application settings
 WSGI_APPLICATION = 'stratopipe.wsgi.application'
 
+# ASGI application (HTTP + WebSockets) and channel layer. Celery workers publish processing
+# progress through the channel layer, so it must be shared between processes: Redis
+# (channels-redis) by default; CHANNEL_LAYER=memory for a single process. Tests override it
+# with the in-memory layer (stratopipe/testing.py).
+ASGI_APPLICATION = 'stratopipe.asgi.application'
+if os.getenv("CHANNEL_LAYER", "redis").lower() == "memory":
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv("CHANNEL_REDIS_URL", "redis://localhost:6379/2")]},
+        },
+    }
+
 # Database configuration
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # File-backed test database: the shared-cache in-memory one fails concurrent
+        # writers with "table is locked" instead of waiting, which breaks the
+        # concurrency tests.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Opt-in production SQLite profile: WAL, tuned pragmas on every connection,
+# BEGIN IMMEDIATE write transactions and persistent connections (stratopipe/sqlite.py).
+if os.getenv("STRATOPIPE_SQLITE_PRODUCTION", "false").lower() == "true":
+    from stratopipe import sqlite as sqlite_profile
+
+    DATABASES['default']['OPTIONS'] = sqlite_profile.production_options()
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv("DB_CONN_MAX_AGE", "600"))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 # Password validation settings
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -119,6 +149,54 @@ STATICFILES_DIRS = [
 # Define the directory where static files will be collected
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Caches. 'responses' backs the versioned list-response cache (stratopipe/response_cache.py).
+# The file cache is shared by every process on the host, so generation bumps made by Celery
+# workers reach the web workers; RESPONSE_CACHE_BACKEND=locmem keeps it in-process (fine for a
+# single process). Tests override it with locmem (stratopipe/testing.py).
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "file").lower()
+if RESPONSE_CACHE_BACKEND == "locmem":
+    _response_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+else:
+    _response_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv("RESPONSE_CACHE_DIR", str(BASE_DIR / 'cache' / 'responses')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': _response_cache,
+}
+
+# Celery. The processing pipeline (assets/processing.py) uses chords, which need a result backend.
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_EXPIRES = 3600
+# Periodic tasks, run by `celery -A stratopipe beat`
+CELERY_BEAT_SCHEDULE = {
+    # Chunked uploads left idle for ASSET_UPLOAD_SESSION_TTL seconds (default: a day)
+    'expire-upload-sessions': {
+        'task': 'assets.tasks.expire_upload_sessions',
+        'schedule': 3600,
+    },
+}
+
+# Disk budget of the render result cache (assets/render_cache.py), evicted least recently used first
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+# Memory-mapped per-project image embeddings for visual similarity search (assets/embeddings.py);
+# defaults to MEDIA_ROOT/embeddings
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR")
+
+# Batch uploads (/api/assets/upload/batch/) carry hundreds of files per request
+DATA_UPLOAD_MAX_NUMBER_FILES = 1000
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,33 @@
+""" Production profile for the SQLite database.
+
+Enabled with STRATOPIPE_SQLITE_PRODUCTION=true (see settings.py). WAL lets
+readers run alongside the single writer, and write transactions start with
+BEGIN IMMEDIATE so they queue on the busy timeout instead of failing with
+"database is locked" when a read lock cannot be upgraded.
+"""
+
+# Applied on every new connection, in this order
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    # Durable across application crashes; only an OS crash can lose the last commits
+    ('synchronous', 'NORMAL'),
+    # Negative: KiB, i.e. a 64 MiB page cache per connection
+    ('cache_size', -64 * 1024),
+    ('mmap_size', 256 * 1024 * 1024),
+    # Milliseconds a connection waits for the write lock
+    ('busy_timeout', 5000),
+    ('temp_store', 'MEMORY'),
+)
+
+
+def init_command(pragmas=PRAGMAS):
+    """ Return the SQL run on each new connection for pragmas. """
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas)
+
+
+def production_options():
+    """ Return the DATABASES OPTIONS of the production profile. """
+    return {
+        'init_command': init_command(),
+        'transaction_mode': 'IMMEDIATE',
+    }
@@ -0,0 +1,31 @@
+""" Settings overrides shared by the test suites.
+
+settings.py picks the channel layer and the response cache backend from the
+environment only (Redis and the file cache by default). Tests that write
+models, call the API or publish progress run with in-process backends
+instead, so they need no Redis and no entry of the response cache survives
+the run:
+
+    @override_settings(**IN_PROCESS_BACKENDS)
+    class MyTests(APITestCase): ...
+"""
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+IN_PROCESS_BACKENDS = {
+    'CACHES': LOCMEM_CACHES,
+    'CHANNEL_LAYERS': IN_MEMORY_CHANNEL_LAYERS,
+}
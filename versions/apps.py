@@ -0,0 +1,12 @@
+""" This module contains the configuration of the versions app. """
+
+from django.apps import AppConfig
+
+
+class VersionsConfig(AppConfig):
+    """ Configuration for the versions app. """
+    name = 'versions'
+
+    def ready(self):
+        # Keep Blob reference counts in step with Version rows
+        from . import signals  # noqa: F401
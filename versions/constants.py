@@ -8,4 +8,23 @@ STATUS_CHOICES = [
     ('approved', 'approved'),
     ('published', 'published'),
 ]
-STATUS_VALUES = [key for key, _ in STATUS_CHOICES]
\ No newline at end of file
+STATUS_VALUES = [key for key, _ in STATUS_CHOICES]
+
+# Processing pipeline state of a Version (see assets/processing.py)
+PROCESSING_CHOICES = [
+    ('pending', 'pending'),
+    ('processing', 'processing'),
+    ('completed', 'completed'),
+    ('failed', 'failed'),
+]
+
+# Allowed Version.status transitions (bulk_update_status), from -> to
+STATUS_TRANSITIONS = {
+    'placeholder': {'ready_to_start', 'work_in_progress'},
+    'ready_to_start': {'work_in_progress'},
+    'work_in_progress': {'ready_for_review'},
+    'kickback': {'work_in_progress', 'ready_for_review'},
+    'ready_for_review': {'approved', 'kickback'},
+    'approved': {'published', 'kickback'},
+    'published': set(),
+}
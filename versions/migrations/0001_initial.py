@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('assets', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Version',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('number', models.PositiveIntegerField()),
+                ('file', models.FileField(upload_to='asset_versions/')),
+                ('description', models.TextField(blank=True, default='uploaded by the user')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('placeholder', 'placeholder'), ('ready_to_start', 'ready to start'), ('work_in_progress', 'work in progress'), ('kickback', 'kickback'), ('ready_for_review', 'ready for review'), ('approved', 'approved'), ('published', 'published')], default='placeholder', max_length=32)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='assets.asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asset_versions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-number'],
+                'unique_together': {('asset', 'number')},
+            },
+        ),
+    ]
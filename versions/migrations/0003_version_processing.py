@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('versions', '0002_blob_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='version',
+            name='processing_results',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='version',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('completed', 'completed'), ('failed', 'failed')], default='pending', max_length=16),
+        ),
+    ]
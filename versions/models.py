@@ -1,17 +1,117 @@
 import uuid
-from django.db import models
-from .constants import STATUS_CHOICES
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from .constants import PROCESSING_CHOICES, STATUS_CHOICES
+from .storage import blob_name, blob_storage
+
+
+class Blob(models.Model):
+    """ One stored file content, shared by every Version with the same bytes. """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    # Number of Versions pointing at this content
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def acquire(cls, digest, size):
+        """ Add a reference to the blob, creating its row on first use. """
+        if cls.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(sha256=digest, size=size, ref_count=1)
+        except IntegrityError:
+            # Created concurrently by another upload of the same bytes
+            cls.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1)
+
+    @classmethod
+    def acquire_many(cls, counts, sizes):
+        """
+        Add counts[digest] references to each blob in one UPDATE, creating
+        missing rows first. Used for bulk-created Versions (no signals).
+        """
+        if not counts:
+            return
+        existing = set(cls.objects.filter(pk__in=counts).values_list('pk', flat=True))
+        cls.objects.bulk_create(
+            [cls(sha256=digest, size=sizes[digest], ref_count=0) for digest in counts if digest not in existing],
+            ignore_conflicts=True,
+        )
+        increment = Case(*[When(pk=digest, then=Value(n)) for digest, n in counts.items()], default=Value(0))
+        cls.objects.filter(pk__in=counts).update(ref_count=F('ref_count') + increment)
+
+    @classmethod
+    def adopt(cls, path, digest, size):
+        """
+        Publish a staged file (see BlobStorage.stage) as the blob for digest,
+        taking a reference to it first, in one transaction: the reference
+        (and the row lock it holds) keeps a concurrent release of the last
+        reference from deleting the stored file in between. Returns the blob name.
+        """
+        with transaction.atomic():
+            cls.acquire(digest, size)
+            return blob_storage.adopt(path, digest)
+
+    @classmethod
+    def acquire_stored(cls, digest, size):
+        """
+        Add a reference to content that should already be stored. Returns
+        False, taking no reference, if its file is gone.
+        """
+        try:
+            with transaction.atomic():
+                cls.acquire(digest, size)
+                if not blob_storage.exists(blob_name(digest)):
+                    raise cls.DoesNotExist(digest)
+        except cls.DoesNotExist:
+            return False
+        return True
+
+    @classmethod
+    def release(cls, digest):
+        """
+        Drop a reference. The content is deleted once the transaction
+        commits, if no reference was taken again meanwhile.
+        """
+        cls.objects.filter(pk=digest, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        transaction.on_commit(lambda: cls.collect(digest))
+
+    @classmethod
+    def collect(cls, digest):
+        """
+        Delete an unreferenced blob: the row first, conditionally, then the
+        file, in one transaction so a concurrent acquire waits for it.
+        """
+        with transaction.atomic():
+            deleted, _ = cls.objects.filter(pk=digest, ref_count=0).delete()
+            if deleted:
+                blob_storage.delete(blob_name(digest))
+
+    def __str__(self):
+        return self.sha256
+
 
 class Version(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     asset = models.ForeignKey('assets.Asset', on_delete=models.CASCADE, related_name='versions')
     number = models.PositiveIntegerField()
-    file = models.FileField(upload_to='asset_versions/')
+    # Content-addressed: the stored name is blobs/<aa>/<bb>/<sha256>
+    file = models.FileField(upload_to='asset_versions/', storage=blob_storage)
+    # File name as uploaded (the stored name no longer carries it)
+    original_name = models.CharField(max_length=255, blank=True)
     description = models.TextField(blank=True, default='uploaded by the user')
     user = models.ForeignKey('authentication.CustomUser', on_delete=models.CASCADE, related_name='asset_versions')
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=32, choices=STATUS_CHOICES, default='placeholder')
+    # Processing pipeline: overall state and each processor's result, by processor name
+    processing_status = models.CharField(max_length=16, choices=PROCESSING_CHOICES, default='pending')
+    processing_results = models.JSONField(default=dict, blank=True)
+
+    # True when the blob reference of a new version was taken before its insert
+    # (Blob.adopt, Blob.acquire_stored), so post_save does not take another one
+    blob_acquired = False
 
     class Meta:
         unique_together = ('asset', 'number')
-        ordering = ['-number']
\ No newline at end of file
+        ordering = ['-number']
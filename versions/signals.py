@@ -0,0 +1,23 @@
+""" Signal handlers keeping Blob reference counts in step with Versions. """
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Blob, Version
+from .storage import blob_storage, digest_from_name
+
+
+@receiver(post_save, sender=Version)
+def acquire_version_blob(sender, instance, created, **kwargs):
+    if not created or instance.blob_acquired:
+        return
+    digest = digest_from_name(instance.file.name)
+    if digest:
+        Blob.acquire(digest, blob_storage.size(instance.file.name))
+
+
+@receiver(post_delete, sender=Version)
+def release_version_blob(sender, instance, **kwargs):
+    digest = digest_from_name(instance.file.name)
+    if digest:
+        Blob.release(digest)
@@ -0,0 +1,113 @@
+""" Content-addressed storage for Version files.
+
+Files are stored once per distinct content under
+MEDIA_ROOT/blobs/<aa>/<bb>/<sha256>, where <aa> and <bb> are the first two
+byte pairs of the digest. Saving bytes that are already stored only
+discards the temporary copy, and the name of a file never collides with
+another one, so no available-name probing is needed.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+BLOB_PREFIX = 'blobs'
+# Temporary files live on the same volume so publishing a blob is a rename
+TMP_DIR = f'{BLOB_PREFIX}/tmp'
+READ_BLOCK_SIZE = 64 * 1024
+
+_BLOB_NAME_RE = re.compile(rf'^{BLOB_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})$')
+
+
+def blob_name(digest):
+    """ Return the storage name of the blob with the given sha256 hex digest. """
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+def digest_from_name(name):
+    """ Return the sha256 digest encoded in a blob name, or None for other files. """
+    match = _BLOB_NAME_RE.match(name or '')
+    return match.group('digest') if match else None
+
+
+class BlobStorage(FileSystemStorage):
+    """
+    FileSystemStorage keyed by content hash.
+    The name passed to save() is ignored; the returned name is the blob name.
+    """
+
+    @cached_property
+    def base_location(self):
+        # Same fallback as the upload views when MEDIA_ROOT is not configured
+        return self._value_or_setting(self._location, settings.MEDIA_ROOT) or str(Path(settings.BASE_DIR) / 'media')
+
+    def get_available_name(self, name, max_length=None):
+        # Content addresses are unique by construction
+        return name
+
+    def temp_dir(self):
+        """ Return the directory for files that are not yet published. """
+        path = self.path(TMP_DIR)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def stage(self, content):
+        """
+        Hash content into an unpublished temporary file. Returns (path, sha256, size);
+        publish it with Blob.adopt, which takes the reference first.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir(), suffix='.part')
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for block in content.chunks(READ_BLOCK_SIZE):
+                    f.write(block)
+                    hasher.update(block)
+                    size += len(block)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+        return tmp_path, hasher.hexdigest(), size
+
+    def discard(self, path):
+        """ Remove an unpublished temporary file, if still there. """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _save(self, name, content):
+        # Publishes without a reference: Version uploads go through stage() and Blob.adopt
+        tmp_path, digest, _ = self.stage(content)
+        try:
+            return self.adopt(tmp_path, digest)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+
+    def adopt(self, path, digest):
+        """
+        Publish an already hashed file (on the same volume) as the blob for digest.
+        The file at path is moved or, if the blob is already stored, removed.
+        Returns the blob name.
+        """
+        name = blob_name(digest)
+        target = self.path(name)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            if self.file_permissions_mode is not None:
+                os.chmod(target, self.file_permissions_mode)
+        return name
+
+
+blob_storage = BlobStorage()
@@ -0,0 +1,95 @@
+""" Tests for the versions app. """
+
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from assets.models import Asset
+from projects.models import Project
+from stratopipe.testing import IN_PROCESS_BACKENDS
+from .models import Version
+
+User = get_user_model()
+
+
+@override_settings(**IN_PROCESS_BACKENDS)
+class BulkStatusTests(APITestCase):
+    """ Test bulk Version status transitions """
+    def setUp(self):
+        self.user = User.objects.create_user(username='supervisor', password='testpass')
+        project = Project.objects.create(owner=self.user, name='Dailies')
+        self.asset = Asset.objects.create(project=project, owner=self.user, name='Shot 010')
+        self.client.force_authenticate(user=self.user)
+
+    def _versions(self, statuses, asset=None):
+        asset = asset or self.asset
+        start = asset.versions.count() + 1
+        return Version.objects.bulk_create([
+            Version(asset=asset, number=start + i, user=asset.owner, file=f'legacy/{asset.pk}-{i}.exr', status=s)
+            for i, s in enumerate(statuses)
+        ])
+
+    def _post(self, ids, target):
+        return self.client.post('/api/versions/status/bulk/', {'ids': ids, 'status': target}, format='json')
+
+    def test_per_item_results(self):
+        review, wip, approved = self._versions(['ready_for_review', 'work_in_progress', 'approved'])
+        other_user = User.objects.create_user(username='other', password='testpass')
+        other_asset = Asset.objects.create(project=Project.objects.create(owner=other_user, name='Other'),
+                                           owner=other_user, name='Theirs')
+        (theirs,) = self._versions(['ready_for_review'], other_asset)
+
+        response = self._post([str(review.pk), str(wip.pk), str(approved.pk), str(theirs.pk), 'nope'], 'approved')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([r['result'] for r in response.data['results']],
+                         ['updated', 'invalid_transition', 'unchanged', 'not_found', 'not_found'])
+        self.assertEqual(response.data['results'][1]['from'], 'work_in_progress')
+        statuses = dict(Version.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[review.pk], 'approved')
+        self.assertEqual(statuses[wip.pk], 'work_in_progress')
+        self.assertEqual(statuses[theirs.pk], 'ready_for_review')
+
+    def test_results_follow_the_rows_the_update_matched(self):
+        moved, published, gone = self._versions(['ready_for_review'] * 3)
+        original_filter = Version.objects.filter
+
+        def concurrent_writes(*args, **kwargs):
+            if 'status__in' in kwargs:
+                # Another request gets in between the read and the guarded UPDATE
+                original_filter(pk=published.pk).update(status='published')
+                original_filter(pk=gone.pk).delete()
+            return original_filter(*args, **kwargs)
+
+        with mock.patch.object(Version.objects, 'filter', side_effect=concurrent_writes):
+            response = self._post([str(moved.pk), str(published.pk), str(gone.pk)], 'approved')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([r['result'] for r in response.data['results']],
+                         ['updated', 'invalid_transition', 'not_found'])
+        self.assertEqual(response.data['results'][1]['from'], 'published')
+
+    def test_thousand_approvals_in_one_update(self):
+        versions = self._versions(['ready_for_review'] * 1000)
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post([str(v.pk) for v in versions], 'approved')
+        self.assertEqual(response.data['updated'], 1000)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Version.objects.filter(status='approved').count(), 1000)
+
+    def test_invalidates_cached_version_list(self):
+        (version,) = self._versions(['ready_for_review'])
+        url = f'/api/assets/{self.asset.pk}/versions/'
+        self.client.get(url)
+        self._post([str(version.pk)], 'kickback')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_validation(self):
+        self.assertEqual(self._post([], 'approved').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._post([str(uuid.uuid4())], 'done').status_code, status.HTTP_400_BAD_REQUEST)
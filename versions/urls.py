@@ -1,7 +1,8 @@
 # Python
 from django.urls import path
-from .views import list_statuses
+from .views import bulk_update_status, list_statuses
 
 urlpatterns = [
     path('statuses/', list_statuses, name='version-statuses'),
-]
\ No newline at end of file
+    path('status/bulk/', bulk_update_status, name='version-status-bulk'),
+]
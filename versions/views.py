@@ -1,8 +1,18 @@
 # Python
+import uuid
+
+from django.db import transaction
+from rest_framework import status as drf_status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .constants import STATUS_CHOICES, STATUS_VALUES
+from stratopipe import response_cache
+from .constants import STATUS_CHOICES, STATUS_TRANSITIONS, STATUS_VALUES
+from .models import Version
+
+# Most versions moved by one bulk status request
+MAX_BULK_STATUS_ITEMS = 5000
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -10,4 +20,84 @@ def list_statuses(request):
     return Response({
         'choices': [{'key': k, 'label': v} for k, v in STATUS_CHOICES],
         'values': STATUS_VALUES,
-    })
\ No newline at end of file
+        'transitions': {k: sorted(v) for k, v in STATUS_TRANSITIONS.items()},
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_update_status(request):
+    """
+    Move many of the user's versions to one status, in one transaction.
+    JSON body: {"ids": [version ids], "status": one of STATUS_VALUES}
+
+    Each version must be allowed to move to status from its current one
+    (STATUS_TRANSITIONS); the others are left unchanged. All allowed versions
+    are updated with a single UPDATE. Returns the result of every id, in
+    order: 'updated', 'unchanged' (already in status), 'invalid_transition'
+    or 'not_found'. Versions the UPDATE did not match because they changed
+    meanwhile are reported from their status after it.
+    """
+    ids = request.data.get('ids')
+    target = request.data.get('status')
+    if not isinstance(ids, list) or not ids:
+        return Response({'error': 'ids must be a non-empty list.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+    if len(ids) > MAX_BULK_STATUS_ITEMS:
+        return Response({'error': f'at most {MAX_BULK_STATUS_ITEMS} ids per request.'},
+                        status=drf_status.HTTP_400_BAD_REQUEST)
+    if target not in STATUS_VALUES:
+        return Response({'error': 'invalid status.'}, status=drf_status.HTTP_400_BAD_REQUEST)
+
+    keys = list(dict.fromkeys(str(i) for i in ids))
+    parsed = {}
+    for key in keys:
+        try:
+            parsed[key] = uuid.UUID(key)
+        except ValueError:
+            pass
+    sources = [s for s, allowed in STATUS_TRANSITIONS.items() if target in allowed]
+
+    with transaction.atomic():
+        rows = {
+            str(pk): (current, asset_id, project_id)
+            for pk, current, asset_id, project_id in Version.objects.select_for_update()
+            .filter(pk__in=parsed.values(), asset__owner=request.user)
+            .values_list('pk', 'status', 'asset_id', 'asset__project_id')
+        }
+        allowed = [pk for pk, (current, _, _) in rows.items() if current in sources]
+        updated = 0
+        if allowed:
+            # status__in guards the transition even without row locks (SQLite)
+            updated = Version.objects.filter(pk__in=allowed, status__in=sources).update(status=target)
+            if updated < len(allowed):
+                # Some rows changed or went away since they were read: report them from
+                # their status now, the UPDATE did not match them
+                current = {
+                    str(pk): value
+                    for pk, value in Version.objects.filter(pk__in=allowed).values_list('pk', 'status')
+                }
+                for pk in allowed:
+                    if pk not in current:
+                        del rows[pk]
+                    elif current[pk] != target:
+                        rows[pk] = (current[pk],) + rows[pk][1:]
+                allowed = [pk for pk in allowed if pk in rows and rows[pk][0] in sources]
+            # QuerySet.update sends no signals: invalidate the cached version lists here
+            response_cache.bump(*{
+                scope
+                for pk in allowed
+                for scope in response_cache.asset_scopes(request.user.pk, rows[pk][2], rows[pk][1])
+            })
+
+    results = []
+    for key in keys:
+        row = rows.get(str(parsed[key])) if key in parsed else None
+        if row is None:
+            results.append({'id': key, 'result': 'not_found'})
+        elif row[0] == target:
+            results.append({'id': key, 'result': 'unchanged', 'from': row[0]})
+        elif row[0] in sources:
+            results.append({'id': key, 'result': 'updated', 'from': row[0]})
+        else:
+            results.append({'id': key, 'result': 'invalid_transition', 'from': row[0]})
+    return Response({'status': target, 'updated': updated, 'results': results})